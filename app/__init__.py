@@ -1,26 +1,63 @@
 from flask import Flask
+import logging
 import os
 from .storage import init_db
+from .timing import init_timing
+from .profiling import init_profiling
 from .utils import init_cache 
-from prometheus_flask_exporter import PrometheusMetrics
-from prometheus_client import CollectorRegistry
+from .upstream import init_upstream
+from .prefetch import init_prefetcher
+from .warmer import init_warmer
+from .snapshot import init_snapshot
+from .page_cache import init_page_cache
+from .compression import init_compression
+from .assets import init_assets
+from .cache_stats import init_cache_stats
+from .sql_metrics import init_sql_metrics
+from .memory import init_memory
+
+def create_app(testing=False, preload=False):
+    # loaded before the config class reads the environment
+    from dotenv import load_dotenv
+    load_dotenv()
 
-def create_app(testing=False):
     app = Flask(__name__)
     app.config.from_object("app.config.Config")
+    if not testing:
+        # a no-op when gunicorn or the host already configured the root logger
+        logging.basicConfig(level=app.config["LOG_LEVEL"], format="%(asctime)s %(levelname)s %(name)s %(message)s")
 
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
         "DATABASE_URL",
         "sqlite:///recipes.db"
     )
 
+    # first, so its after_request runs last and the total covers the other hooks
+    init_timing(app)
+    init_profiling(app)
     init_cache(app)
+    init_upstream(app)
+    init_prefetcher(app)
+    init_warmer(app)
+    init_snapshot(app)
+    init_page_cache(app)
+    init_cache_stats(app)
+    init_memory(app)
+    init_compression(app)
+    init_assets(app)
+    init_sql_metrics(app)
     init_db(app)
     from .routes import bp as routes_bp, health_bp
     app.register_blueprint(routes_bp)
     app.register_blueprint(health_bp)
 
     if testing:
+        # no background upstream traffic from tests unless a test turns it back on
+        app.config["PREFETCH_TOP_N"] = 0
+        app.config["CACHE_REFRESH_INTERVAL"] = 0
+        app.config["QUERY_STATS_ENABLED"] = False
+        app.config["SAMPLING_PROFILER_HZ"] = 0
+
         from prometheus_client import CollectorRegistry
         from prometheus_flask_exporter import PrometheusMetrics
         registry = CollectorRegistry()
@@ -31,4 +68,9 @@ def create_app(testing=False):
 
     metrics.info('app_info', 'Application info', version='1.0')
 
+    if preload:
+        # gunicorn --preload: heavy one-off work happens here, before the workers are forked
+        from .preload import preload_app
+        preload_app(app)
+
     return app
\ No newline at end of file
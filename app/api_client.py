@@ -1,35 +1,84 @@
-import requests
+import hashlib
 import json
+import logging
 from flask import current_app
+from .lazy import lazy_import
 from .utils import( 
     normalize_ingredient, clean_instructions,prepare_ingredient_query, 
     get_recipes_from_cache, fetch_recipes_from_api, save_recipes_to_cache, 
     save_cached_response, fetch_recipe_details, fetch_ingredient_suggestions_from_api,
-    get_ingredient_suggestions_from_cache)
+    get_ingredient_suggestions_from_cache, save_negative_cache_entry,
+    get_recipe_details_from_cache, save_recipe_details_to_cache,
+    get_ingredient_suggestions_from_db_cache, save_ingredient_suggestions_to_cache, wrap_cache_entry)
 from .storage import get_common_ingredients_from_db
+from .timing import span
+from .cache_stats import cache_lookup, record_stale_serve, L1, L2, RESULTS, DETAILS, SUGGESTIONS
+from .upstream import (
+    UpstreamError, UpstreamUnavailable, DeadlineExceeded, upstream_degraded, mark_stale,
+    PRIORITY_USER, PRIORITY_BACKGROUND)
 
-from dotenv import load_dotenv
-load_dotenv()
+requests = lazy_import("requests")
+logger = logging.getLogger(__name__)
 
 
-def search_recipes(user_ingredients, limit=10, config=None):
+def search_recipes(user_ingredients, limit=10, config=None, deadline=None):
     """
     searching recipes based on user-provided ingredients
     first checking local cache, then falling back to API if needed
+    while the upstream circuit breaker is open only the cache is used
+    results cut short by the deadline (optional) are returned but not cached
     """
     config = config or current_app.config
     ingredients_str = prepare_ingredient_query(user_ingredients)
 
-    recipes = get_recipes_from_cache(ingredients_str)
-    if recipes:
+    degraded = upstream_degraded()
+    if degraded:
+        mark_stale()
+
+    max_age = None if degraded else config.get("RESULTS_CACHE_TTL", 604800)
+    recipes = get_recipes_from_cache(ingredients_str, max_age)
+    if recipes is not None:
+        if degraded and recipes:
+            record_stale_serve(L2, RESULTS)
+        return recipes
+    if degraded:
+        # an expired copy is still better than nothing while upstream is down
+        return get_recipes_from_cache(ingredients_str) or []
+
+    try:
+        return fetch_and_cache_recipes(ingredients_str, limit, config, deadline=deadline)
+    except DeadlineExceeded:
+        deadline.truncated = True
+        return []
+    except UpstreamUnavailable:
+        # the breaker opened mid-request or the quota is spent: an expired copy beats an empty page
+        mark_stale()
+        recipes = get_recipes_from_cache(ingredients_str) or []
+        if recipes:
+            record_stale_serve(L2, RESULTS)
         return recipes
+    except UpstreamError as e:
+        ttl = save_negative_cache_entry(ingredients_str, e.status_code, config)
+        logger.warning("recipe search failed query=%r status=%s retry_in_s=%s error=%s",
+                       ingredients_str, e.status_code, ttl, e,
+                       extra={"query": ingredients_str, "status": e.status_code, "retry_in_s": ttl})
+        return []
+
+
+def fetch_and_cache_recipes(ingredients_str, limit, config, deadline=None, priority=PRIORITY_USER):
+    """
+    fetching recipes for an already prepared ingredient query and caching the best `limit` of them
+    used by search_recipes on a miss and by the cache warmer to refresh popular queries
+    """
+    # the details fetched for the search go to the detail cache, so opening or prefetching a recipe reuses them
+    recipes = fetch_recipes_from_api(ingredients_str, limit, config, deadline=deadline, priority=priority,
+                                     on_details=save_recipe_details_to_cache)
 
-    recipes = fetch_recipes_from_api(ingredients_str, limit, config)
-    
     recipes.sort(key=lambda r: r["missing_ingredients"])
     final_recipes = recipes[:limit]
 
-    save_recipes_to_cache(ingredients_str, final_recipes)
+    if not (deadline and deadline.truncated):
+        save_recipes_to_cache(ingredients_str, final_recipes)
 
     return final_recipes
 
@@ -37,12 +86,32 @@ def search_recipes(user_ingredients, limit=10, config=None):
 def get_recipe_details(recipe_id, config=None, requester=requests):
     """
     fetching full details for a single recipe by ID 
+    cached details are used while fresh, or at any age while the circuit breaker is open
     """
     config = config or current_app.config
-    details = fetch_recipe_details(recipe_id, config, requester)
+
+    degraded = upstream_degraded()
+    max_age = None if degraded else config.get("DETAIL_CACHE_TTL", 86400)
+    details = get_recipe_details_from_cache(recipe_id, max_age)
+
+    if degraded:
+        mark_stale()
+        if details:
+            record_stale_serve(L2, DETAILS)
+    elif details is None:
+        details = fetch_recipe_details(recipe_id, config, requester)
+        if details:
+            save_recipe_details_to_cache(recipe_id, details)
+        else:
+            # upstream failed or the quota is spent, an expired copy beats a 404
+            details = get_recipe_details_from_cache(recipe_id)
+            if details:
+                mark_stale()
+                record_stale_serve(L2, DETAILS)
 
     if not details:
-        print(f"Failed to fetch recipe {recipe_id}")
+        logger.warning("recipe details unavailable recipe_id=%s degraded=%s", recipe_id, degraded,
+                       extra={"recipe_id": recipe_id, "degraded": degraded})
         return None
     
     image = details.get("image")
@@ -60,6 +129,24 @@ def get_recipe_details(recipe_id, config=None, requester=requests):
     }
 
 
+def prefetch_recipe_details(recipe_id, config=None):
+    """
+    warming the detail cache for a recipe at background priority
+    ids with a fresh cached copy are skipped, returns True if details were fetched
+    """
+    config = config or current_app.config
+    if upstream_degraded():
+        return False
+    if get_recipe_details_from_cache(recipe_id, config.get("DETAIL_CACHE_TTL", 86400)) is not None:
+        return False
+
+    details = fetch_recipe_details(recipe_id, config, priority=PRIORITY_BACKGROUND)
+    if not details:
+        return False
+    save_recipe_details_to_cache(recipe_id, details)
+    return True
+
+
 def get_ingredient_suggestions(query, config=None):
     """
     fetching ingredient suggestions based on user input
@@ -71,17 +158,49 @@ def get_ingredient_suggestions(query, config=None):
     if query == "":
         return get_common_ingredients_from_db()
 
-    if query in current_app.ingredient_cache:
-        return current_app.ingredient_cache[query]
-
-    cached = get_ingredient_suggestions_from_cache(query, current_app.ingredient_cache)
+    with cache_lookup("l1_suggestions", L1, SUGGESTIONS) as lookup:
+        cached = get_ingredient_suggestions_from_cache(query, current_app.ingredient_cache)
+        if cached:
+            lookup.outcome = "hit"
     if cached:
         return cached
-    
-    suggestions = [s for s in get_common_ingredients_from_db() if s.startswith(query)]
 
-    if not suggestions:
-        suggestions = fetch_ingredient_suggestions_from_api(query, config)
-        save_cached_response(f"ingredient_suggestions:{query}", json.dumps(suggestions))
+    with span("vocabulary"):
+        suggestions = [s for s in get_common_ingredients_from_db() if s.startswith(query)]
+
+    if not suggestions and upstream_degraded():
+        mark_stale()
+        suggestions = get_ingredient_suggestions_from_db_cache(query) or []
+        if suggestions:
+            record_stale_serve(L2, SUGGESTIONS)
+    elif not suggestions:
+        suggestions = get_ingredient_suggestions_from_db_cache(query, config.get("SUGGESTIONS_CACHE_TTL", 2592000))
+        if suggestions is None:
+            suggestions = fetch_and_cache_ingredient_suggestions(query, config)
+        if suggestions:
+            save_ingredient_suggestions_to_cache(query, suggestions, current_app.ingredient_cache)
 
     return suggestions
+
+
+def get_ingredient_vocabulary():
+    """
+    the common ingredients as a JSON body plus a content hash used as its version
+    built once per process (the ingredients table is seed data) and matched in the browser by the autocomplete
+    """
+    payload = getattr(current_app, "ingredient_vocabulary_payload", None)
+    if payload is None:
+        words = sorted(set(get_common_ingredients_from_db()))
+        body = json.dumps(words, separators=(",", ":")).encode("utf-8")
+        payload = (hashlib.sha256(body).hexdigest()[:12], body)
+        current_app.ingredient_vocabulary_payload = payload
+    return payload
+
+
+def fetch_and_cache_ingredient_suggestions(query, config, priority=PRIORITY_USER):
+    """ fetching suggestions for a normalized query from the API and saving them to the db cache"""
+    suggestions = fetch_ingredient_suggestions_from_api(query, config, priority=priority)
+    # failures come back as [], so only real answers are cached
+    if suggestions:
+        save_cached_response(f"ingredient_suggestions:{query}", wrap_cache_entry(suggestions))
+    return suggestions
@@ -0,0 +1,75 @@
+# ---------- FINGERPRINTED STATIC ASSETS ----------
+import hashlib
+import mimetypes
+import os
+
+from flask import Blueprint, abort, current_app, request, url_for
+
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+assets_bp = Blueprint("assets", __name__)
+
+
+class AssetManifest:
+    """
+    content hashes of the files under the static folder, read once at startup
+    css/shelfchef.css is served as /assets/css/shelfchef.<hash>.css, so the url changes whenever the
+    file does and browsers may cache every url forever
+    """
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self._files = {}     # logical name -> (digest, bytes)
+        self._by_url = {}    # fingerprinted name -> logical name
+        if static_folder and os.path.isdir(static_folder):
+            for root, _, names in os.walk(static_folder):
+                for name in names:
+                    path = os.path.join(root, name)
+                    self.add(os.path.relpath(path, static_folder).replace(os.sep, "/"), path)
+
+    def add(self, filename, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        base, ext = os.path.splitext(filename)
+        self._files[filename] = (digest, data)
+        self._by_url[f"{base}.{digest}{ext}"] = filename
+
+    def fingerprinted(self, filename):
+        """css/shelfchef.css -> css/shelfchef.<hash>.css"""
+        digest, _ = self._files[filename]
+        base, ext = os.path.splitext(filename)
+        return f"{base}.{digest}{ext}"
+
+    def lookup(self, fingerprinted):
+        """(logical name, digest, bytes) for a fingerprinted name, None for unknown or outdated hashes"""
+        filename = self._by_url.get(fingerprinted)
+        if filename is None:
+            return None
+        digest, data = self._files[filename]
+        return filename, digest, data
+
+
+def asset_url(filename):
+    """url_for for static assets: the fingerprinted, long-cached url of a file under app/static"""
+    return url_for("assets.asset", fingerprinted=current_app.assets.fingerprinted(filename))
+
+
+@assets_bp.route("/assets/<path:fingerprinted>")
+def asset(fingerprinted):
+    found = current_app.assets.lookup(fingerprinted)
+    if found is None:
+        abort(404)
+    filename, digest, data = found
+    response = current_app.response_class(data, mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+    response.set_etag(digest)
+    response.headers["Cache-Control"] = ASSET_CACHE_CONTROL
+    return response.make_conditional(request)
+
+
+def init_assets(app):
+    """ fingerprinting the static files and exposing asset_url() to templates """
+    if not hasattr(app, "assets"):
+        app.assets = AssetManifest(app.static_folder)
+    app.jinja_env.globals["asset_url"] = asset_url
+    app.register_blueprint(assets_bp)
@@ -0,0 +1,252 @@
+# ---------- CACHE EFFECTIVENESS METRICS ----------
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import Blueprint, current_app, jsonify
+
+from .metrics import (
+    CACHE_LOOKUPS, CACHE_STALE_SERVES, CACHE_EVICTIONS, CACHE_ENTRIES, CACHE_BYTES, CACHE_AGE_AT_HIT)
+from .timing import span
+
+logger = logging.getLogger(__name__)
+
+# layers, from the outside in
+PAGE, L1, L2 = "page", "l1", "l2"
+# namespaces of the data caches
+RESULTS, DETAILS, SUGGESTIONS = "results", "details", "suggestions"
+
+SIZE_REFRESH_SECONDS = 30
+BYTES_SAMPLE = 100
+L2_BYTES_SAMPLE = 200
+# cached_responses keys of each namespace, as a WHERE clause
+L2_NAMESPACES = {
+    DETAILS: "query LIKE 'recipe_details:%'",
+    SUGGESTIONS: "query LIKE 'ingredient_suggestions:%'",
+    RESULTS: "query NOT LIKE 'recipe_details:%' AND query NOT LIKE 'ingredient_suggestions:%'",
+}
+
+cache_stats_bp = Blueprint("cache_stats", __name__)
+
+
+class CacheStats:
+    """per-process lookup counts behind /cache/stats (the Prometheus counters hold the same numbers)"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, layer, namespace, kind, n=1):
+        with self._lock:
+            self._counts[(layer, namespace, kind)] += n
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        out = {}
+        for (layer, namespace, kind), n in counts.items():
+            out.setdefault(layer, {}).setdefault(namespace, {})[kind] = n
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def record_lookup(layer, namespace, result, age=None):
+    """counting one cache lookup; result is hit, miss, expired or negative, age (seconds) is recorded for hits"""
+    CACHE_LOOKUPS.labels(layer, namespace, result).inc()
+    stats.add(layer, namespace, result)
+    if age is not None and result == "hit":
+        CACHE_AGE_AT_HIT.labels(layer, namespace).observe(max(age, 0))
+
+
+class Lookup:
+    __slots__ = ("outcome", "age")
+
+    def __init__(self):
+        self.outcome = "miss"
+        self.age = None
+
+
+@contextmanager
+def cache_lookup(stage, layer, namespace):
+    """
+    a timing span (see timing.py) that also counts the lookup; the block sets .outcome when it
+    finds something (default miss) and .age in seconds when the entry is timestamped:
+
+        with cache_lookup("l2", L2, RESULTS) as lookup:
+            ...
+            lookup.outcome, lookup.age = "hit", age
+    """
+    lookup = Lookup()
+    try:
+        with span(stage) as s:
+            try:
+                yield lookup
+            finally:
+                s.outcome = lookup.outcome
+    finally:
+        record_lookup(layer, namespace, lookup.outcome, lookup.age)
+
+
+def record_stale_serve(layer, namespace):
+    """counting an expired entry served because upstream is down"""
+    CACHE_STALE_SERVES.labels(layer, namespace).inc()
+    stats.add(layer, namespace, "stale_serves")
+
+
+def record_evictions(layer, namespace, count=1):
+    if count:
+        CACHE_EVICTIONS.labels(layer, namespace).inc(count)
+        stats.add(layer, namespace, "evictions", count)
+
+
+# ---------- sizes ----------
+
+def _estimate_bytes(cache):
+    """serialized size of an in-process dict cache, extrapolated from a sample of its values"""
+    try:
+        sample = list(itertools.islice(cache.values(), BYTES_SAMPLE))
+    except RuntimeError:
+        return None  # resized by another thread mid-iteration, the next refresh will catch it
+    if not sample:
+        return 0
+    sampled = sum(len(json.dumps(value, separators=(",", ":"))) for value in sample)
+    return int(sampled / len(sample) * len(cache))
+
+
+def l1_sizes(app):
+    sizes = {}
+    for namespace, cache in ((RESULTS, app.recipe_cache), (SUGGESTIONS, app.ingredient_cache)):
+        size = getattr(cache, "bytes_used", None)
+        sizes[namespace] = (len(cache), size if size is not None else _estimate_bytes(cache))
+    return sizes
+
+
+def l2_sizes():
+    """
+    entries and payload bytes of cached_responses, split by key prefix
+    the table can grow to GBs, so entries are counted on the keys alone and bytes are extrapolated
+    from the newest L2_BYTES_SAMPLE payloads of each namespace instead of reading every payload
+    """
+    from .db_utils import db_connection
+
+    sizes = {}
+    with db_connection() as conn:
+        for namespace, where in L2_NAMESPACES.items():
+            entries = conn.execute(f"SELECT COUNT(query) FROM cached_responses WHERE {where}").fetchone()[0]
+            sample = conn.execute(f"""
+                SELECT AVG(LENGTH(response)) FROM (
+                    SELECT response FROM cached_responses WHERE {where} ORDER BY rowid DESC LIMIT ?
+                )
+            """, (L2_BYTES_SAMPLE,)).fetchone()[0]
+            sizes[namespace] = (entries, int((sample or 0) * entries))
+    return sizes
+
+
+def measure_l2(app):
+    try:
+        with app.app_context():
+            return l2_sizes()
+    except Exception as e:
+        logger.warning("could not measure the L2 cache error=%s", e, extra={"error": str(e)})
+        return {}
+
+
+def page_sizes(app):
+    cache = getattr(app, "page_cache", None)
+    return cache.sizes() if cache is not None else {}
+
+
+def cache_sizes(app):
+    """{layer: {namespace: (entries, bytes)}}; bytes may be None when it could not be measured"""
+    gauges = getattr(app, "cache_size_gauges", None)
+    return {L1: l1_sizes(app), PAGE: page_sizes(app), L2: gauges.l2_sizes() if gauges is not None else measure_l2(app)}
+
+
+class SizeGauges:
+    """entry and byte gauges, measured at most every SIZE_REFRESH_SECONDS when Prometheus scrapes"""
+
+    def __init__(self, app, clock=time.monotonic):
+        self.app = app
+        self._clock = clock
+        self._sizes = {}
+        self._measured_at = None
+        self._lock = threading.Lock()
+        self._l2 = {}
+        self._l2_measured_at = None
+        self._l2_lock = threading.Lock()
+
+    def l2_sizes(self):
+        """the L2 part, also used by /cache/stats: measured at most every SIZE_REFRESH_SECONDS per worker"""
+        with self._l2_lock:
+            if self._l2_measured_at is None or self._clock() - self._l2_measured_at > SIZE_REFRESH_SECONDS:
+                self._l2 = measure_l2(self.app)
+                self._l2_measured_at = self._clock()
+            return self._l2
+
+    def get(self, layer, namespace, index):
+        with self._lock:
+            if self._measured_at is None or self._clock() - self._measured_at > SIZE_REFRESH_SECONDS:
+                self._sizes = cache_sizes(self.app)
+                self._measured_at = self._clock()
+            value = self._sizes.get(layer, {}).get(namespace, (0, 0))[index]
+        return value if value is not None else float("nan")
+
+    def bind(self):
+        layers = {L1: (RESULTS, SUGGESTIONS), L2: (RESULTS, DETAILS, SUGGESTIONS), PAGE: (RESULTS, "recipe_detail")}
+        for layer, namespaces in layers.items():
+            for namespace in namespaces:
+                CACHE_ENTRIES.labels(layer, namespace).set_function(lambda l=layer, n=namespace: self.get(l, n, 0))
+                CACHE_BYTES.labels(layer, namespace).set_function(lambda l=layer, n=namespace: self.get(l, n, 1))
+
+
+# ---------- /cache/stats ----------
+
+@cache_stats_bp.route("/cache/stats")
+def cache_stats():
+    """hit ratios, stale serves, evictions and sizes per cache layer and namespace, for this worker"""
+    counts = stats.snapshot()
+    sizes = cache_sizes(current_app._get_current_object())
+
+    layers = {}
+    for layer in (PAGE, L1, L2):
+        namespaces = set(counts.get(layer, {})) | set(sizes.get(layer, {}))
+        for namespace in sorted(namespaces):
+            entry = {"hit": 0, "miss": 0, "expired": 0, "negative": 0, "stale_serves": 0, "evictions": 0}
+            entry.update(counts.get(layer, {}).get(namespace, {}))
+            served = entry["hit"] + entry["negative"]
+            lookups = served + entry["miss"] + entry["expired"]
+            entry["hit_ratio"] = round(served / lookups, 4) if lookups else None
+            entry["entries"], entry["bytes"] = sizes.get(layer, {}).get(namespace, (0, 0))
+            layers.setdefault(layer, {})[namespace] = entry
+
+    return jsonify({"pid": os.getpid(), "layers": layers})
+
+
+def init_cache_stats(app):
+    """ eviction hooks on the caches that evict, size gauges for Prometheus and the /cache/stats endpoint """
+    for namespace, cache in ((RESULTS, app.recipe_cache), (SUGGESTIONS, app.ingredient_cache)):
+        if hasattr(cache, "on_evict"):
+            cache.on_evict = lambda count, n=namespace: record_evictions(L1, n, count)
+    page_cache = getattr(app, "page_cache", None)
+    if page_cache is not None:
+        page_cache.on_evict = lambda key: record_evictions(PAGE, page_namespace(key[0]))
+
+    app.cache_size_gauges = SizeGauges(app)
+    app.cache_size_gauges.bind()
+    app.register_blueprint(cache_stats_bp)
+
+
+def page_namespace(endpoint):
+    """main.results -> results"""
+    return (endpoint or "").rpartition(".")[2]
@@ -0,0 +1,111 @@
+# ---------- RESPONSE COMPRESSION (GZIP, BROTLI WHEN INSTALLED) ----------
+import gzip
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from flask import request
+
+DEFAULT_MIMETYPES = (
+    "text/html", "text/css", "text/plain", "text/javascript",
+    "application/javascript", "application/json", "image/svg+xml",
+)
+
+
+@lru_cache(maxsize=None)
+def _brotli():
+    """the brotli module if one is installed (brotli or brotlicffi), else None"""
+    for name in ("brotli", "brotlicffi"):
+        try:
+            return __import__(name)
+        except ImportError:
+            continue
+    return None
+
+
+def compress(body, encoding, gzip_level=6, brotli_quality=5):
+    if encoding == "br":
+        return _brotli().compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class CompressedBodyCache:
+    """compressed bodies of pages with a strong etag, keyed by (etag, encoding), so a cached page is compressed once"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag, encoding):
+        with self._lock:
+            body = self._bodies.get((etag, encoding))
+            if body is not None:
+                self._bodies.move_to_end((etag, encoding))
+            return body
+
+    def put(self, etag, encoding, body):
+        with self._lock:
+            self._bodies[(etag, encoding)] = body
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+    def __len__(self):
+        return len(self._bodies)
+
+
+def encoded_etag(etag, encoding):
+    """the strong etag of a page's compressed bytes: the page's etag tagged with the encoding"""
+    return f"{etag}-{encoding}"
+
+
+def choose_encoding(accept_encodings):
+    """brotli if the client takes it and it is installed, then gzip, else None"""
+    if _brotli() is not None and accept_encodings.quality("br") > 0:
+        return "br"
+    if accept_encodings.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def init_compression(app):
+    """ compressing text responses above a size threshold for clients that accept it """
+    if not hasattr(app, "compressed_cache"):
+        app.compressed_cache = CompressedBodyCache(app.config.get("COMPRESS_CACHE_MAX_ENTRIES", 256))
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if not config.get("COMPRESS_ENABLED", True):
+            return response
+        if response.mimetype not in config.get("COMPRESS_MIMETYPES", DEFAULT_MIMETYPES):
+            return response
+        response.vary.add("Accept-Encoding")
+        if (response.status_code < 200 or response.status_code >= 300 or response.direct_passthrough
+                or response.is_streamed or "Content-Encoding" in response.headers):
+            return response
+        body = response.get_data()
+        if len(body) < config.get("COMPRESS_MIN_SIZE", 500):
+            return response
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        strong = etag and not weak
+        if strong:
+            # each encoding is a representation of its own, so it gets a strong etag of its own
+            response.set_etag(encoded_etag(etag, encoding))
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+
+        compressed = app.compressed_cache.get(etag, encoding) if strong else None
+        if compressed is None:
+            compressed = compress(body, encoding, config.get("COMPRESS_GZIP_LEVEL", 6), config.get("COMPRESS_BROTLI_QUALITY", 5))
+            if strong:
+                app.compressed_cache.put(etag, encoding, compressed)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        return response
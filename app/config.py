@@ -7,8 +7,113 @@ class Config:
         "sqlite:///shelfchef.db"  # fallback for local development
     )
 
+    # raw sqlite3 connections (cache, quota, query stats), see db_utils.py
+    DATABASE_PATH = os.getenv("DATABASE_PATH", "recipes.db")
+
     API_KEY = os.getenv("API_KEY", "demo-key")  
-    API_URL = "https://api.spoonacular.com/recipes/findByIngredients"
-    RECIPE_DETAILS_URL = "https://api.spoonacular.com/recipes/{id}/information"
-    INGREDIENT_AUTOCOMPLETE_URL = "https://api.spoonacular.com/food/ingredients/autocomplete"
+    # pointed at a local fake by benchmarks/bench_app.py
+    SPOONACULAR_BASE_URL = os.getenv("SPOONACULAR_BASE_URL", "https://api.spoonacular.com").rstrip("/")
+    API_URL = f"{SPOONACULAR_BASE_URL}/recipes/findByIngredients"
+    RECIPE_DETAILS_URL = SPOONACULAR_BASE_URL + "/recipes/{id}/information"
+    INGREDIENT_AUTOCOMPLETE_URL = f"{SPOONACULAR_BASE_URL}/food/ingredients/autocomplete"
+
+    # negative cache: upstream failures are memoized per query with exponential backoff
+    NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", 30))
+    NEGATIVE_CACHE_MAX_TTL = int(os.getenv("NEGATIVE_CACHE_MAX_TTL", 900))
+    DETAIL_CACHE_TTL = int(os.getenv("DETAIL_CACHE_TTL", 86400))
+    RESULTS_CACHE_TTL = int(os.getenv("RESULTS_CACHE_TTL", 604800))
+    SUGGESTIONS_CACHE_TTL = int(os.getenv("SUGGESTIONS_CACHE_TTL", 2592000))
+
+    # L1 cache: "local" is a dict per worker, "shared" is one mmap file per node read by every worker
+    # shared trades hit latency (~5 us against ~0.1 us for the dict and ~25 us for the sqlite L2, see
+    # benchmarks/bench_l1_cache.py) for paying each miss once per node instead of once per worker
+    L1_CACHE_BACKEND = os.getenv("L1_CACHE_BACKEND", "local")
+    SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR")  # defaults to /dev/shm
+    SHARED_CACHE_SIZE_MB = int(os.getenv("SHARED_CACHE_SIZE_MB", 64))
+    SHARED_CACHE_SLOTS = 65536
+    SHARED_CACHE_MEMO_ENTRIES = 1024  # decoded values each worker keeps, so repeated hits skip json
+
+    # rendered /results and /recipe/<id> pages, per worker, with ETag/304 (see page_cache.py)
+    PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true"
+    PAGE_CACHE_MAX_ENTRIES = 512
+    PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", 300))
+
+    # gzip (brotli when the brotli package is installed) for text responses of at least COMPRESS_MIN_SIZE bytes
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() == "true"
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_MIMETYPES = (
+        "text/html", "text/css", "text/plain", "text/javascript",
+        "application/javascript", "application/json", "image/svg+xml",
+    )
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 5
+    COMPRESS_CACHE_MAX_ENTRIES = 256
+
+    # root log level; upstream calls are logged at INFO with their timing, failures at WARNING
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+    # statements at least this slow are logged (normalized, without values) by sql_metrics.py; 0 turns the log off
+    SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", 100))
+
+    # on-demand request profiling (see profiling.py), off unless a token is set
+    PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+    PROFILING_MIN_INTERVAL = int(os.getenv("PROFILING_MIN_INTERVAL", 10))  # seconds between profiled requests per worker
+    PROFILING_SAMPLE_INTERVAL = 0.001
+    PROFILE_DIR = os.getenv("PROFILE_DIR")
+    PROFILE_KEEP = 20
+    # continuous per-worker stack sampling of request threads, reported on /profiling/hot; 0 turns it off
+    SAMPLING_PROFILER_HZ = int(os.getenv("SAMPLING_PROFILER_HZ", 100))
+    SAMPLING_PROFILER_BUDGET = 0.01  # share of wall time sampling may take before the rate is halved
+
+    # memory accounting (see memory.py): a worker whose RSS passes MAX_RSS_MB is restarted gracefully, 0 disables it
+    MAX_RSS_MB = int(os.getenv("MAX_RSS_MB", 0))
+    RSS_CHECK_EVERY = 50  # requests between RSS checks
+    TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", 1))
+
+    # per-stage timings (cache, sqlite, upstream, sort, render) in a Server-Timing header; see timing.py
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+
+    # gunicorn preload: this many popular L2 entries per cache are copied into L1 before the fork
+    PRELOAD_WARM_TOP = int(os.getenv("PRELOAD_WARM_TOP", 200))
+
+    # popular keys are counted per request and refreshed in the background before they expire
+    QUERY_STATS_ENABLED = True
+    CACHE_REFRESH_INTERVAL = int(os.getenv("CACHE_REFRESH_INTERVAL", 600))  # 0 disables the scheduler
+    CACHE_REFRESH_TOP_K = int(os.getenv("CACHE_REFRESH_TOP_K", 50))
+    CACHE_REFRESH_AHEAD = 0.8  # refresh once an entry is 80% through its TTL
+    CACHE_REFRESH_WINDOW = 7 * 86400  # only keys requested in the last week count as popular
+
+    # after /results is served, the top recipes' details are fetched in the background
+    PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", 3))
+    PREFETCH_WORKERS = 2
+    PREFETCH_MAX_PENDING = 50
+
+    # upstream client: request timeout and circuit breaker (open -> cache-only degraded mode)
+    UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", 5))
+    RESULTS_DEADLINE = float(os.getenv("RESULTS_DEADLINE", 10))  # total upstream time for one /results, below gunicorn's 30s
+    CIRCUIT_BREAKER_WINDOW = 20
+    CIRCUIT_BREAKER_MIN_CALLS = 5
+    CIRCUIT_BREAKER_ERROR_RATE = 0.5
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS = 3.0
+    CIRCUIT_BREAKER_SLOW_CALL_RATE = 0.5
+    CIRCUIT_BREAKER_OPEN_SECONDS = 30
+
+    # retries for transient failures (429/502/503/504, connection errors), backoff with full jitter
+    UPSTREAM_RETRY_ATTEMPTS = 3
+    UPSTREAM_RETRY_BASE_DELAY = 0.2
+    UPSTREAM_RETRY_MAX_DELAY = 2.0  # a longer Retry-After is not waited for
+
+    # hedging: duplicate a search/detail call still running after the observed p95 latency
+    UPSTREAM_HEDGING = os.getenv("UPSTREAM_HEDGING", "false").lower() == "true"
+    UPSTREAM_HEDGE_ENDPOINTS = ("search", "details")
+    UPSTREAM_HEDGE_QUANTILE = 0.95
+    UPSTREAM_HEDGE_MIN_SAMPLES = 20
+    UPSTREAM_HEDGE_MAX_RATE = 0.05  # at most 5% of calls hedged, so quota use stays bounded
 
+    # spoonacular quota, shared by all workers through the sqlite db (see quota.py)
+    UPSTREAM_RATE_PER_SECOND = float(os.getenv("UPSTREAM_RATE_PER_SECOND", 5))
+    UPSTREAM_RATE_BURST = int(os.getenv("UPSTREAM_RATE_BURST", 10))
+    RATE_LIMIT_MAX_WAIT = 0.5
+    DAILY_POINT_BUDGET = float(os.getenv("DAILY_POINT_BUDGET", 150))  # 0 disables the budget
+    QUOTA_POINT_COSTS = {"search": 1.0, "details": 1.0, "autocomplete": 1.0}
+    QUOTA_RESERVES = {"user": 0.0, "detail": 0.2, "background": 0.5}
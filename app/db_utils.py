@@ -1,16 +1,20 @@
 import sqlite3
 from contextlib import contextmanager
 from flask import current_app
+from .timing import span
+from .sql_metrics import connection_factory, slow_query_seconds
 
 def _get_connection():
-    conn = sqlite3.connect(current_app.config.get("DATABASE_PATH", "recipes.db"))
+    conn = sqlite3.connect(current_app.config.get("DATABASE_PATH", "recipes.db"),
+                           factory=connection_factory("sqlite3", slow_query_seconds()))
     conn.row_factory = sqlite3.Row
     return conn
 
 @contextmanager
 def db_connection():
-    conn = _get_connection()
-    try:
-        yield conn
-    finally:
-        conn.close()
\ No newline at end of file
+    with span("sqlite"):
+        conn = _get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
\ No newline at end of file
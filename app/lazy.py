@@ -0,0 +1,61 @@
+# ---------- LAZY IMPORTS FOR HEAVY DEPENDENCIES ----------
+import importlib.util
+import sys
+import threading
+import types
+
+_load_lock = threading.RLock()  # reentrant: executing one lazy module may touch another
+
+
+class _LazyModule(types.ModuleType):
+    """
+    the stdlib lazy module with its first load behind a lock (what python 3.12 does)
+    the 3.11 one swaps its class before executing the module, so a second thread reads attributes off
+    the half-executed module; here the class is swapped once the module is loaded and other threads wait
+    """
+
+    def __getattribute__(self, attr):
+        with _load_lock:
+            if type(self) is _LazyModule:
+                spec = object.__getattribute__(self, "__spec__")
+                if spec.loader_state.get("loading"):
+                    # the loading thread itself, while the module executes
+                    return object.__getattribute__(self, attr)
+                _load(self, spec)
+        return getattr(self, attr)
+
+
+def _load(module, spec):
+    # attributes set on the lazy module before its load win over the module's own, as in the stdlib
+    attrs_then = spec.loader_state["__dict__"]
+    attrs_now = object.__getattribute__(module, "__dict__")
+    attrs_updated = {key: value for key, value in attrs_now.items()
+                     if key not in attrs_then or value is not attrs_then[key]}
+    spec.loader_state["loading"] = True
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        spec.loader_state["loading"] = False
+    attrs_now.update(attrs_updated)
+    module.__class__ = types.ModuleType
+
+
+def lazy_import(name):
+    """
+    returning a module that is only executed on first attribute access
+    keeps `import app` cheap for workers, tests and CLI scripts that never touch it
+    (stdlib LazyLoader recipe; an already imported module is returned as is)
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    if sys.version_info < (3, 12):
+        module.__class__ = _LazyModule
+    return module
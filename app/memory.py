@@ -0,0 +1,262 @@
+# ---------- MEMORY ACCOUNTING: RSS, CACHE SIZES, TRACEMALLOC ----------
+import itertools
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+
+from flask import Blueprint, abort, current_app, jsonify, request
+
+from .metrics import WORKER_RSS, CACHE_MEMORY, WORKER_RECYCLES
+from .profiling import token_matches
+
+logger = logging.getLogger(__name__)
+
+SIZE_REFRESH_SECONDS = 60
+SIZE_SAMPLE = 200
+TRACE_GROUPS = ("lineno", "filename", "traceback")
+
+memory_bp = Blueprint("memory", __name__)
+
+
+# ---------- process ----------
+
+def current_rss():
+    """resident set size of this process in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+# ---------- deep sizes ----------
+
+def deep_sizeof(obj, seen=None):
+    """bytes held by obj and everything reachable through containers, namedtuples and __dict__, each object once"""
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(vars(item))
+    return size
+
+
+def estimate_mapping_size(mapping, sample=SIZE_SAMPLE):
+    """deep size of a dict-like cache, extrapolated from `sample` entries when it holds more"""
+    try:
+        items = list(itertools.islice(mapping.items(), sample))
+    except RuntimeError:
+        return None  # resized by another thread mid-iteration
+    count = len(mapping)
+    if not items:
+        return sys.getsizeof(mapping)
+    seen = set()
+    sampled = sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in items)
+    return sys.getsizeof(mapping) + int(sampled * count / len(items))
+
+
+def cache_memory(app):
+    """{cache name: estimated bytes} for the caches each worker holds in its own heap"""
+    sizes = {}
+    for name in ("recipe_cache", "ingredient_cache"):
+        cache = getattr(app, name, None)
+        if isinstance(cache, dict):
+            sizes[name] = estimate_mapping_size(cache)
+        elif cache is not None:
+            sizes[name] = 0  # the shared-memory backend lives in /dev/shm, outside the worker heap
+    # both are bounded (PAGE_CACHE_MAX_ENTRIES, COMPRESS_CACHE_MAX_ENTRIES), so they are measured in full
+    for name in ("page_cache", "compressed_cache"):
+        cache = getattr(app, name, None)
+        if cache is not None:
+            sizes[name] = deep_sizeof(cache)
+    return sizes
+
+
+class MemoryGauges:
+    """cache deep sizes for Prometheus, measured at most every SIZE_REFRESH_SECONDS when scraped"""
+
+    CACHES = ("recipe_cache", "ingredient_cache", "page_cache", "compressed_cache")
+
+    def __init__(self, app, clock=time.monotonic):
+        self.app = app
+        self._clock = clock
+        self._sizes = {}
+        self._measured_at = None
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            if self._measured_at is None or self._clock() - self._measured_at > SIZE_REFRESH_SECONDS:
+                self._sizes = cache_memory(self.app)
+                self._measured_at = self._clock()
+            value = self._sizes.get(name)
+        return value if value is not None else float("nan")
+
+    def bind(self):
+        WORKER_RSS.set_function(current_rss)
+        for name in self.CACHES:
+            CACHE_MEMORY.labels(name).set_function(lambda n=name: self.get(n))
+
+
+# ---------- tracemalloc ----------
+
+def _filtered(snapshot):
+    return snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def _site(trace):
+    return [f"{frame.filename}:{frame.lineno}" for frame in trace.traceback]
+
+
+class AllocationTracker:
+    """on-demand tracemalloc: the first call starts tracing, later calls report top sites and growth since the last call"""
+
+    def __init__(self, frames=1):
+        self.frames = frames
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, limit=20, group_by="lineno"):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._previous = None
+                return {"tracing": True, "started": True, "top": [], "growth": []}
+
+            snapshot = _filtered(tracemalloc.take_snapshot())
+            current, peak = tracemalloc.get_traced_memory()
+            report = {
+                "tracing": True,
+                "started": False,
+                "traced_bytes": current,
+                "peak_bytes": peak,
+                "top": [{"site": _site(stat), "bytes": stat.size, "count": stat.count}
+                        for stat in snapshot.statistics(group_by)[:limit]],
+                "growth": [],
+            }
+            if self._previous is not None:
+                report["growth"] = [
+                    {"site": _site(diff), "bytes": diff.size, "bytes_diff": diff.size_diff, "count_diff": diff.count_diff}
+                    for diff in snapshot.compare_to(self._previous, group_by)[:limit] if diff.size_diff > 0]
+            self._previous = snapshot
+            return report
+
+    def stop(self):
+        with self._lock:
+            tracemalloc.stop()
+            self._previous = None
+
+
+# ---------- worker recycling ----------
+
+class RssGuard:
+    """
+    asking the worker to restart once its RSS passes max_bytes, checked every `every` requests
+    under gunicorn a SIGTERM to ourselves is a graceful stop: the current response is finished and
+    the arbiter forks a fresh worker; other servers only get a warning
+    """
+
+    def __init__(self, max_bytes, every=50, rss=current_rss):
+        self.max_bytes = max_bytes
+        self.every = every
+        self._rss = rss
+        self._requests = 0
+        self.triggered = False
+        self._lock = threading.Lock()
+
+    def over_limit(self):
+        """True once per worker, on the first check that finds RSS above the limit"""
+        if not self.max_bytes or self.triggered:
+            return False
+        with self._lock:
+            self._requests += 1
+            if self._requests % self.every:
+                return False
+        rss = self._rss()
+        if rss <= self.max_bytes:
+            return False
+        self.triggered = True
+        logger.warning("worker over memory limit pid=%s rss_mb=%.1f max_rss_mb=%.1f",
+                       os.getpid(), rss / 2**20, self.max_bytes / 2**20,
+                       extra={"pid": os.getpid(), "rss": rss, "max_rss": self.max_bytes})
+        return True
+
+
+def _recycle_worker():
+    WORKER_RECYCLES.inc()
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+# ---------- endpoints ----------
+
+@memory_bp.route("/memory/stats")
+def memory_stats():
+    """this worker's RSS and the estimated size of each in-process cache"""
+    if not token_matches(request.headers.get("X-Profile")):
+        abort(404)
+    app = current_app._get_current_object()
+    return jsonify({"pid": os.getpid(), "rss_bytes": current_rss(), "caches": cache_memory(app),
+                    "tracing": tracemalloc.is_tracing()})
+
+
+@memory_bp.route("/memory/allocations")
+def memory_allocations():
+    """
+    tracemalloc for this worker: the first call starts tracing, later ones list the top allocation
+    sites (?limit=, ?group_by=lineno|filename|traceback) and what grew since the previous call; ?stop=1 ends tracing
+    """
+    if not token_matches(request.headers.get("X-Profile")):
+        abort(404)
+    tracker = current_app.allocation_tracker
+    if request.args.get("stop") == "1":
+        tracker.stop()
+        return jsonify({"tracing": False})
+    group_by = request.args.get("group_by", "lineno")
+    if group_by not in TRACE_GROUPS:
+        group_by = "lineno"
+    return jsonify(tracker.snapshot(request.args.get("limit", 20, type=int), group_by))
+
+
+def init_memory(app):
+    """ memory gauges, the admin endpoints and the optional MAX_RSS_MB worker recycle """
+    if not hasattr(app, "allocation_tracker"):
+        app.allocation_tracker = AllocationTracker(app.config.get("TRACEMALLOC_FRAMES", 1))
+    if not hasattr(app, "rss_guard"):
+        app.rss_guard = RssGuard(app.config.get("MAX_RSS_MB", 0) * 2**20, app.config.get("RSS_CHECK_EVERY", 50))
+    app.memory_gauges = MemoryGauges(app)
+    app.memory_gauges.bind()
+
+    @app.after_request
+    def recycle_bloated_worker(response):
+        if app.rss_guard.over_limit():
+            if request.environ.get("SERVER_SOFTWARE", "").startswith("gunicorn"):
+                response.call_on_close(_recycle_worker)
+            else:
+                logger.warning("not running under gunicorn, MAX_RSS_MB only logs")
+        return response
+
+    app.register_blueprint(memory_bp)
@@ -0,0 +1,130 @@
+# ---------- PROMETHEUS METRICS ----------
+# app-level metrics live in the default registry, which PrometheusMetrics serves on /metrics
+from prometheus_client import Counter, Gauge, Histogram
+
+UPSTREAM_BUDGET_REMAINING = Gauge(
+    "spoonacular_budget_remaining_points",
+    "Spoonacular points left in today's budget"
+)
+UPSTREAM_RATE_LIMITED = Counter(
+    "spoonacular_calls_rejected_total",
+    "Upstream calls skipped by the rate limiter or the daily budget",
+    ["priority", "reason"]
+)
+UPSTREAM_HEDGES_FIRED = Counter(
+    "spoonacular_hedges_fired_total",
+    "Duplicate upstream requests sent because the first one outlived the usual latency",
+    ["endpoint"]
+)
+UPSTREAM_HEDGES_WON = Counter(
+    "spoonacular_hedges_won_total",
+    "Hedged upstream requests where the duplicate answered first",
+    ["endpoint"]
+)
+UPSTREAM_RETRIES = Counter(
+    "spoonacular_retries_total",
+    "Upstream requests retried, by endpoint and the status (or 'error') that caused the retry",
+    ["endpoint", "reason"]
+)
+STAGE_SECONDS = Histogram(
+    "shelfchef_stage_seconds",
+    "Time spent in one stage of a request (cache lookups, sqlite, upstream calls, sorting, rendering)",
+    ["stage", "outcome"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+CACHE_LOOKUPS = Counter(
+    "shelfchef_cache_lookups_total",
+    "Cache lookups by layer (page, l1, l2), namespace and result (hit, miss, expired, negative)",
+    ["layer", "namespace", "result"]
+)
+CACHE_STALE_SERVES = Counter(
+    "shelfchef_cache_stale_serves_total",
+    "Expired cache entries served because the upstream API was unavailable",
+    ["layer", "namespace"]
+)
+CACHE_EVICTIONS = Counter(
+    "shelfchef_cache_evictions_total",
+    "Entries dropped to make room or because they outlived the cache TTL",
+    ["layer", "namespace"]
+)
+CACHE_ENTRIES = Gauge(
+    "shelfchef_cache_entries",
+    "Entries currently held, per layer and namespace",
+    ["layer", "namespace"]
+)
+CACHE_BYTES = Gauge(
+    "shelfchef_cache_bytes",
+    "Approximate size of the cached payloads, per layer and namespace",
+    ["layer", "namespace"]
+)
+CACHE_AGE_AT_HIT = Histogram(
+    "shelfchef_cache_age_at_hit_seconds",
+    "Age of cache entries when they were served",
+    ["layer", "namespace"],
+    buckets=(60, 300, 900, 3600, 6 * 3600, 86400, 3 * 86400, 7 * 86400, 30 * 86400)
+)
+UPSTREAM_LATENCY = Histogram(
+    "spoonacular_request_seconds",
+    "Latency of single upstream HTTP requests (each retry and hedge counts), by endpoint",
+    ["endpoint"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+)
+UPSTREAM_RESPONSES = Counter(
+    "spoonacular_responses_total",
+    "Upstream requests by endpoint and HTTP status ('error' when no response came back)",
+    ["endpoint", "status"]
+)
+UPSTREAM_RESPONSE_BYTES = Histogram(
+    "spoonacular_response_bytes",
+    "Size of upstream response bodies, by endpoint",
+    ["endpoint"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576)
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "spoonacular_requests_in_flight",
+    "Upstream requests currently waiting for an answer, by endpoint",
+    ["endpoint"]
+)
+UPSTREAM_QUOTA_USED = Gauge(
+    "spoonacular_quota_points_used",
+    "Points used today according to the X-API-Quota-Used header of the last response"
+)
+UPSTREAM_QUOTA_LEFT = Gauge(
+    "spoonacular_quota_points_left",
+    "Points left today according to the X-API-Quota-Left header of the last response"
+)
+UPSTREAM_POINTS_CHARGED = Counter(
+    "spoonacular_points_charged_total",
+    "Points charged per request according to the X-API-Quota-Request header, by endpoint",
+    ["endpoint"]
+)
+SQL_SECONDS = Histogram(
+    "shelfchef_sql_seconds",
+    "Time per SQL statement (execute plus fetching its rows), by database path, operation and table",
+    ["db", "operation", "table"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+SQL_ROWS = Histogram(
+    "shelfchef_sql_rows",
+    "Rows returned by queries (or changed by writes), by database path, operation and table",
+    ["db", "operation", "table"],
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 10000)
+)
+SQL_SLOW_QUERIES = Counter(
+    "shelfchef_sql_slow_queries_total",
+    "Statements slower than SLOW_QUERY_MS",
+    ["db", "operation", "table"]
+)
+WORKER_RSS = Gauge(
+    "shelfchef_worker_rss_bytes",
+    "Resident set size of this worker process"
+)
+CACHE_MEMORY = Gauge(
+    "shelfchef_cache_memory_bytes",
+    "Estimated deep in-memory size of each per-worker cache",
+    ["cache"]
+)
+WORKER_RECYCLES = Counter(
+    "shelfchef_worker_recycles_total",
+    "Workers asked to restart gracefully because their RSS passed MAX_RSS_MB"
+)
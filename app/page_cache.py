@@ -0,0 +1,180 @@
+# ---------- FULL-PAGE RESPONSE CACHE (ETAG / 304) ----------
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, g, has_app_context, make_response, request
+
+from .cache_stats import PAGE, page_namespace, record_lookup
+from .timing import span
+
+PageEntry = namedtuple("PageEntry", "body etag mimetype stored_at data_keys")
+
+
+class PageCache:
+    """
+    rendered pages keyed by endpoint + canonical query parameters (LRU, bounded by size and age)
+    each page records the data cache keys it was rendered from and is dropped when one of them is rewritten
+    the cache is per worker, so ttl bounds how long another worker's refresh can go unnoticed
+    """
+
+    def __init__(self, max_entries=512, ttl=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._pages = OrderedDict()
+        self._by_data_key = {}
+        self._lock = threading.Lock()
+        self.on_evict = None  # called with the key of each page dropped for space or age
+
+    def get(self, key):
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                return None
+            if self._clock() - entry.stored_at > self.ttl:
+                self._drop(key)
+                self._evicted(key)
+                return None
+            self._pages.move_to_end(key)
+            return entry
+
+    def put(self, key, body, mimetype, data_keys=()):
+        entry = PageEntry(body, _strong_etag(body), mimetype, self._clock(), tuple(data_keys))
+        with self._lock:
+            if key in self._pages:
+                self._drop(key)
+            self._pages[key] = entry
+            for data_key in entry.data_keys:
+                self._by_data_key.setdefault(data_key, set()).add(key)
+            while len(self._pages) > self.max_entries:
+                oldest = next(iter(self._pages))
+                self._drop(oldest)
+                self._evicted(oldest)
+        return entry
+
+    def invalidate(self, data_key):
+        with self._lock:
+            for key in list(self._by_data_key.get(data_key, ())):
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._by_data_key.clear()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def sizes(self):
+        """{endpoint namespace: (pages, body bytes)}"""
+        sizes = {}
+        with self._lock:
+            for key, entry in self._pages.items():
+                pages, size = sizes.get(page_namespace(key[0]), (0, 0))
+                sizes[page_namespace(key[0])] = (pages + 1, size + len(entry.body))
+        return sizes
+
+    def age(self, entry):
+        return self._clock() - entry.stored_at
+
+    def _evicted(self, key):
+        if self.on_evict is not None:
+            self.on_evict(key)
+
+    def _drop(self, key):
+        entry = self._pages.pop(key, None)
+        if entry is None:
+            return
+        for data_key in entry.data_keys:
+            keys = self._by_data_key.get(data_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_data_key[data_key]
+
+
+def _strong_etag(body):
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def page_depends_on(data_key):
+    """marking the page being rendered as built from a data cache entry (see invalidate_pages)"""
+    g.setdefault("page_data_keys", []).append(data_key)
+
+
+def skip_page_cache():
+    """keeping the page being rendered out of the page cache (partial or otherwise one-off output)"""
+    g.page_cache_skip = True
+
+
+def invalidate_pages(data_key):
+    """dropping cached pages rendered from a data cache entry that was just rewritten"""
+    if has_app_context():
+        cache = getattr(current_app, "page_cache", None)
+        if cache is not None:
+            cache.invalidate(data_key)
+
+
+def _respond(entry, max_age):
+    response = make_response(entry.body)
+    response.mimetype = entry.mimetype
+    response.set_etag(entry.etag)
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    # If-None-Match matching the etag turns this into an empty 304
+    return response.make_conditional(request)
+
+
+def cached_page(*params, max_age=60, canonical=None, **defaults):
+    """
+    serving a GET view from the page cache, keyed by its url arguments and the query params listed
+    params missing from the request take their default, anything not listed is ignored
+    canonical maps a param to a function turning its value into the key part (default: stripped), so
+    spellings rendering the same page share one entry
+    stale (upstream unavailable), skipped and non-200 responses are never stored, and while the
+    circuit breaker is open pages are rebuilt from the data caches so they carry the stale marker
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            from .upstream import upstream_degraded
+
+            cache = getattr(current_app, "page_cache", None)
+            # profiled requests rebuild the page, a cache hit would leave nothing to look at
+            if (cache is None or not current_app.config.get("PAGE_CACHE_ENABLED", True) or upstream_degraded()
+                    or "profiler" in g):
+                response = make_response(view(**view_args))
+                if g.get("upstream_stale"):
+                    response.headers.setdefault("Cache-Control", "no-store")
+                return response
+
+            key = (
+                request.endpoint,
+                tuple(sorted(view_args.items())),
+                tuple((name, (canonical or {}).get(name, str.strip)(request.args.get(name, defaults.get(name, ""))))
+                      for name in params),
+            )
+            with span("page_cache") as s:
+                entry = cache.get(key)
+                s.outcome = "miss" if entry is None else "hit"
+            record_lookup(PAGE, page_namespace(request.endpoint), s.outcome,
+                          None if entry is None else cache.age(entry))
+            if entry is not None:
+                return _respond(entry, max_age)
+
+            response = make_response(view(**view_args))
+            if response.status_code != 200 or g.get("upstream_stale") or g.get("page_cache_skip"):
+                response.headers.setdefault("Cache-Control", "no-store")
+                return response
+            entry = cache.put(key, response.get_data(), response.mimetype, g.get("page_data_keys", ()))
+            return _respond(entry, max_age)
+        return wrapper
+    return decorator
+
+
+def init_page_cache(app):
+    """ attaching the rendered-page cache to the app """
+    if not hasattr(app, "page_cache"):
+        app.page_cache = PageCache(app.config.get("PAGE_CACHE_MAX_ENTRIES", 512), app.config.get("PAGE_CACHE_TTL", 300))
@@ -0,0 +1,79 @@
+# ---------- BACKGROUND DETAIL PREFETCH ----------
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from flask import after_this_request, current_app
+
+from .upstream import redact
+
+logger = logging.getLogger(__name__)
+
+
+class DetailPrefetcher:
+    """
+    small background pool warming the recipe-detail cache for recipes a user is likely to open
+    the pool is created on first use so it is never inherited across a fork
+    """
+
+    def __init__(self, app, max_workers=2, max_pending=50):
+        self.app = app
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def schedule(self, recipe_ids):
+        """queueing ids that aren't already queued, dropping the rest once the queue is full"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="detail-prefetch")
+            for recipe_id in recipe_ids:
+                if recipe_id in self._pending or len(self._pending) >= self.max_pending:
+                    continue
+                self._pending[recipe_id] = self._executor.submit(self._prefetch, recipe_id)
+
+    def _prefetch(self, recipe_id):
+        from .api_client import prefetch_recipe_details
+
+        try:
+            with self.app.app_context():
+                prefetch_recipe_details(recipe_id)
+        except Exception as e:
+            # requests errors quote the url, api key included
+            logger.warning("prefetch failed recipe_id=%s error=%s", recipe_id, redact(e),
+                           extra={"recipe_id": recipe_id, "error": redact(e)})
+        finally:
+            with self._lock:
+                self._pending.pop(recipe_id, None)
+
+    def wait_idle(self, timeout=None):
+        """blocking until queued prefetches are done (tests, shutdown)"""
+        with self._lock:
+            futures = list(self._pending.values())
+        wait(futures, timeout=timeout)
+
+
+def init_prefetcher(app):
+    """ attaching the detail prefetcher to the app, like the in-memory caches """
+    if not hasattr(app, "prefetcher"):
+        app.prefetcher = DetailPrefetcher(
+            app,
+            max_workers=app.config.get("PREFETCH_WORKERS", 2),
+            max_pending=app.config.get("PREFETCH_MAX_PENDING", 50),
+        )
+
+
+def prefetch_after_response(recipes):
+    """queueing detail prefetch for the top recipes, to start once the current response is sent"""
+    top_n = current_app.config.get("PREFETCH_TOP_N", 3)
+    prefetcher = getattr(current_app, "prefetcher", None)
+    recipe_ids = [r["id"] for r in recipes[:top_n] if r.get("id") is not None]
+    if prefetcher is None or not recipe_ids:
+        return
+
+    @after_this_request
+    def schedule_prefetch(response):
+        response.call_on_close(lambda: prefetcher.schedule(recipe_ids))
+        return response
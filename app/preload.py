@@ -0,0 +1,87 @@
+# ---------- PRELOAD: ONE-OFF BOOT WORK DONE IN THE GUNICORN MASTER ----------
+import gc
+import logging
+import os
+import time
+
+from .storage import db, get_common_ingredients_from_db
+from .utils import (
+    build_cache_key, get_ingredient_suggestions_from_db_cache, get_recipes_from_cache,
+    matching_missing_for_recipe, normalize_ingredient, prepare_ingredient_query,
+)
+from .warmer import RESULTS, SUGGESTIONS
+
+logger = logging.getLogger(__name__)
+
+# words every pantry search normalizes, so inflect's lexicon is built before the fork
+COMMON_WORDS = (
+    "eggs", "tomatoes", "potatoes", "onions", "carrots", "peppers", "apples", "bananas",
+    "beans", "mushrooms", "noodles", "lemons", "limes", "berries", "leaves", "cloves",
+)
+
+
+def warm_l1_from_l2(app, top_k):
+    """copying the most requested fresh L2 entries into the in-memory caches, returns how many were loaded"""
+    loaded = 0
+    for key in app.query_stats.top(RESULTS, top_k):
+        user_ingredients = key.split(",")
+        recipes = get_recipes_from_cache(prepare_ingredient_query(user_ingredients), app.config.get("RESULTS_CACHE_TTL", 604800))
+        if recipes:
+            app.recipe_cache[build_cache_key(user_ingredients)] = matching_missing_for_recipe(user_ingredients, recipes)
+            loaded += 1
+    for key in app.query_stats.top(SUGGESTIONS, top_k):
+        query = normalize_ingredient(key)
+        suggestions = get_ingredient_suggestions_from_db_cache(query, app.config.get("SUGGESTIONS_CACHE_TTL", 2592000))
+        if suggestions:
+            app.ingredient_cache[query] = suggestions
+            loaded += 1
+    return loaded
+
+
+def _import_heavy_modules():
+    """loading the lazily imported dependencies here, once, instead of on the first request of every worker"""
+    import bs4  # noqa: F401
+    import requests
+    requests.RequestException  # noqa: B018 - attribute access executes the lazy module
+    normalize_ingredient("eggs")  # imports inflect
+
+
+def preload_app(app):
+    """
+    doing the work every worker would repeat at boot once in the master process:
+    loading the ingredient vocabulary, building the normalization lexicon and warming the L1 caches
+    forked workers then share those pages copy-on-write
+    """
+    started = time.perf_counter()
+    _import_heavy_modules()
+    with app.app_context():
+        app.ingredient_vocabulary = tuple(get_common_ingredients_from_db())
+        for word in app.ingredient_vocabulary + COMMON_WORDS:
+            normalize_ingredient(word)
+        try:
+            warmed = warm_l1_from_l2(app, app.config.get("PRELOAD_WARM_TOP", 200))
+        except Exception as e:
+            # a missing or locked db must not stop the server from booting, workers just start cold
+            logger.warning("preload cache warming skipped error=%s", e, extra={"error": str(e)})
+            warmed = 0
+        # connections opened here must not be shared with the workers
+        db.engine.dispose()
+
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=lambda: _after_fork(app))
+
+    # objects alive now stay out of the gc's reach, so collections in workers don't touch (and copy) their pages
+    gc.collect()
+    gc.freeze()
+    logger.info("preloaded %d ingredients and %d cache entries in %.2fs",
+                len(app.ingredient_vocabulary), warmed, time.perf_counter() - started)
+
+
+def _after_fork(app):
+    with app.app_context():
+        db.engine.dispose(close=False)
+    # a shared L1 cache opened in the master needs a file description of the worker's own
+    for name in ("recipe_cache", "ingredient_cache"):
+        reopen = getattr(getattr(app, name, None), "reopen", None)
+        if reopen is not None:
+            reopen()
@@ -0,0 +1,339 @@
+# ---------- REQUEST PROFILING: ON DEMAND + CONTINUOUS SAMPLING ----------
+import cProfile
+import hmac
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from flask import Blueprint, abort, current_app, g, has_app_context, jsonify, request, send_from_directory
+
+PSTATS, COLLAPSED = "pstats", "collapsed"
+EXTENSIONS = {PSTATS: ".prof", COLLAPSED: ".collapsed"}
+PROFILE_NAME = re.compile(r"^\d+-\d+\.(?:prof|collapsed)$")
+
+profiling_bp = Blueprint("profiling", __name__)
+
+
+# ---------- stacks ----------
+
+def frame_name(frame):
+    """module.qualname of a frame, e.g. app.utils.normalize_ingredient"""
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse_stack(frame):
+    """a frame and its callers as one collapsed-stack line (outermost first, ';'-separated) for flamegraphs"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def write_collapsed(counts, path):
+    with open(path, "w") as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+class StackSampler:
+    """samples the stack of one thread every `interval` seconds from a helper thread"""
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.counts[collapse_stack(frame)] += 1
+
+
+class RequestProfiler:
+    """cProfile (deterministic, pstats output) or stack sampling (collapsed output) around one request"""
+
+    def __init__(self, fmt=PSTATS, interval=0.001):
+        self.format = fmt
+        self._profile = None
+        self._sampler = None
+        self._interval = interval
+
+    def start(self):
+        if self.format == COLLAPSED:
+            self._sampler = StackSampler(threading.get_ident(), self._interval)
+            self._sampler.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+
+    def dump(self, path):
+        if self._sampler is not None:
+            write_collapsed(self._sampler.counts, path)
+        else:
+            self._profile.dump_stats(path)
+
+
+class ProfileRateLimiter:
+    """at most one profiled request per `min_interval` seconds in this worker"""
+
+    def __init__(self, min_interval=10, clock=time.monotonic):
+        self.min_interval = min_interval
+        self._clock = clock
+        self._last = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            now = self._clock()
+            if self._last is not None and now - self._last < self.min_interval:
+                return False
+            self._last = now
+            return True
+
+
+# ---------- continuous sampling ----------
+
+class SamplingProfiler:
+    """
+    a background thread sampling the stacks of threads that are serving a request, `hz` times a second
+    stacks are aggregated as collapsed-stack counts for the life of the worker (or until reset)
+    when sampling takes more than `overhead_budget` of wall time the rate is halved, down to 1 Hz
+    """
+    OTHER = "[other]"
+
+    def __init__(self, app, max_stacks=10000, overhead_budget=0.01, clock=time.perf_counter):
+        self.app = app
+        self.max_stacks = max_stacks
+        self.overhead_budget = overhead_budget
+        self._clock = clock
+        self._threads = set()
+        self._counts = Counter()
+        self._samples = 0
+        self._sampling_time = 0.0
+        self._started_at = None
+        self._interval = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def hz(self):
+        # read at start time so tests can switch the sampler off after create_app
+        return self.app.config.get("SAMPLING_PROFILER_HZ", 100)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None or not self.hz:
+                return
+            self._interval = 1.0 / self.hz
+            self._started_at = self._clock()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def track(self, thread_id):
+        with self._lock:
+            self._threads.add(thread_id)
+
+    def untrack(self, thread_id):
+        with self._lock:
+            self._threads.discard(thread_id)
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            start = self._clock()
+            self.sample_once()
+            self._sampling_time += self._clock() - start
+            elapsed = self._clock() - self._started_at
+            if elapsed > 1 and self._sampling_time / elapsed > self.overhead_budget and self._interval < 1:
+                self._interval = min(1.0, self._interval * 2)
+
+    def sample_once(self):
+        with self._lock:
+            threads = tuple(self._threads)
+        if not threads:
+            return
+        frames = sys._current_frames()
+        stacks = [collapse_stack(frames[t]) for t in threads if t in frames]
+        with self._lock:
+            for stack in stacks:
+                if stack not in self._counts and len(self._counts) >= self.max_stacks:
+                    stack = self.OTHER
+                self._counts[stack] += 1
+            self._samples += len(stacks)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._samples = 0
+
+    def collapsed(self):
+        with self._lock:
+            counts = Counter(self._counts)
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+    def report(self, limit=30):
+        """the functions found most often on top of a stack (self) and anywhere in it (total)"""
+        with self._lock:
+            counts = Counter(self._counts)
+            samples = self._samples
+        own, total = Counter(), Counter()
+        for stack, count in counts.items():
+            names = stack.split(";")
+            own[names[-1]] += count
+            for name in set(names):
+                total[name] += count
+
+        def rows(counter):
+            return [{"function": name, "samples": n, "percent": round(100.0 * n / samples, 2)}
+                    for name, n in counter.most_common(limit)]
+
+        elapsed = self._clock() - self._started_at if self._started_at is not None else 0
+        return {
+            "pid": os.getpid(),
+            "samples": samples,
+            "hz": round(1 / self._interval, 2) if self._interval else 0,
+            "overhead": round(self._sampling_time / elapsed, 5) if elapsed else 0,
+            "top_self": rows(own),
+            "top_total": rows(total),
+        }
+
+
+# ---------- storage ----------
+
+def profile_dir(config):
+    return config.get("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "shelfchef-profiles")
+
+
+def save_profile(profiler, config):
+    """writing the profile and keeping only the newest PROFILE_KEEP files, returns the file name"""
+    directory = profile_dir(config)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.time_ns()}-{os.getpid()}{EXTENSIONS[profiler.format]}"
+    profiler.dump(os.path.join(directory, name))
+
+    profiles = sorted(f for f in os.listdir(directory) if PROFILE_NAME.match(f))
+    for old in profiles[:-config.get("PROFILE_KEEP", 20)]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except OSError:
+            pass
+    return name
+
+
+def token_matches(supplied):
+    """checking an admin token (X-Profile header) against PROFILING_TOKEN; always False without a configured token"""
+    token = current_app.config.get("PROFILING_TOKEN")
+    return bool(token and supplied) and hmac.compare_digest(supplied.encode(), token.encode())
+
+
+@profiling_bp.route("/profiling/<name>")
+def download_profile(name):
+    """a stored profile, for the same token that requested it; unknown tokens get a 404 like unknown files"""
+    if not token_matches(request.headers.get("X-Profile")) or not PROFILE_NAME.match(name):
+        abort(404)
+    return send_from_directory(profile_dir(current_app.config), name, as_attachment=True)
+
+
+@profiling_bp.route("/profiling/hot")
+def hot_functions():
+    """this worker's sampled hot paths as JSON, ?limit=N functions per list, ?reset=1 starts over"""
+    if not token_matches(request.headers.get("X-Profile")):
+        abort(404)
+    sampler = current_app.sampling_profiler
+    report = sampler.report(request.args.get("limit", 30, type=int))
+    if request.args.get("reset") == "1":
+        sampler.reset()
+    return jsonify(report)
+
+
+@profiling_bp.route("/profiling/stacks")
+def sampled_stacks():
+    """this worker's sampled stacks in collapsed format, for flamegraph.pl or speedscope"""
+    if not token_matches(request.headers.get("X-Profile")):
+        abort(404)
+    return current_app.response_class(current_app.sampling_profiler.collapsed(), mimetype="text/plain")
+
+
+def init_profiling(app):
+    """
+    profiling single requests on demand: send `X-Profile: <PROFILING_TOKEN>` and the response carries
+    `X-Profile: <file>`, downloadable from /profiling/<file> with the same header
+    the token is only read from the header, a query string would leave it in access logs and Referer headers
+    `X-Profile-Format: collapsed` (or ?__profile_format=collapsed) samples stacks instead of running cProfile
+    nothing happens without a configured token, and each worker profiles at most one request per interval
+    """
+    if not hasattr(app, "profile_limiter"):
+        app.profile_limiter = ProfileRateLimiter(app.config.get("PROFILING_MIN_INTERVAL", 10))
+    if not hasattr(app, "sampling_profiler"):
+        app.sampling_profiler = SamplingProfiler(app, overhead_budget=app.config.get("SAMPLING_PROFILER_BUDGET", 0.01))
+
+    @app.before_request
+    def track_request_thread():
+        # started here rather than in create_app so each forked gunicorn worker runs its own sampler
+        app.sampling_profiler.start()
+        app.sampling_profiler.track(threading.get_ident())
+
+    @app.before_request
+    def start_profiler():
+        if not app.config.get("PROFILING_TOKEN") or request.blueprint == "profiling":
+            return
+        if not token_matches(request.headers.get("X-Profile")):
+            return
+        if not app.profile_limiter.allow():
+            g.profile_status = "rate-limited"
+            return
+        fmt = request.headers.get("X-Profile-Format") or request.args.get("__profile_format") or PSTATS
+        g.profiler = RequestProfiler(fmt if fmt in EXTENSIONS else PSTATS, app.config.get("PROFILING_SAMPLE_INTERVAL", 0.001))
+        g.profiler.start()
+
+    @app.after_request
+    def finish_profiler(response):
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop()
+            try:
+                g.profile_status = save_profile(profiler, app.config)
+            except OSError as e:
+                g.profile_status = "error"
+                app.logger.warning("could not save profile: %s", e)
+        if "profile_status" in g:
+            response.headers["X-Profile"] = g.profile_status
+            response.headers["Cache-Control"] = "no-store"
+        return response
+
+    @app.teardown_request
+    def stop_profiler(error=None):
+        app.sampling_profiler.untrack(threading.get_ident())
+        # exceptions propagated past after_request would otherwise leave cProfile running on this thread
+        profiler = g.pop("profiler", None) if has_app_context() else None
+        if profiler is not None:
+            profiler.stop()
+
+    app.register_blueprint(profiling_bp)
@@ -0,0 +1,155 @@
+# ---------- SPOONACULAR QUOTA: RATE LIMIT + DAILY POINT BUDGET ----------
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+
+from .db_utils import db_connection
+from .metrics import UPSTREAM_BUDGET_REMAINING, UPSTREAM_RATE_LIMITED
+from .upstream import UpstreamUnavailable, PRIORITY_USER, PRIORITY_DETAIL, PRIORITY_BACKGROUND
+
+# share of the bucket / budget each class must leave untouched for the classes above it
+DEFAULT_RESERVES = {PRIORITY_USER: 0.0, PRIORITY_DETAIL: 0.2, PRIORITY_BACKGROUND: 0.5}
+DEFAULT_POINT_COSTS = {"search": 1.0, "details": 1.0, "autocomplete": 1.0}
+
+
+class QuotaExceeded(UpstreamUnavailable):
+    """raised without calling upstream when the rate limit or the daily point budget is used up"""
+
+
+def _today():
+    """spoonacular resets the daily quota at midnight UTC"""
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class QuotaManager:
+    """
+    token bucket + daily point budget shared by every worker process through the sqlite db
+    state lives in two small tables so all gunicorn workers on a node draw from the same quota
+    """
+
+    def __init__(self, config, clock=time.time, sleep=time.sleep):
+        self.rate = config.get("UPSTREAM_RATE_PER_SECOND", 5)
+        self.burst = config.get("UPSTREAM_RATE_BURST", 10)
+        self.daily_budget = config.get("DAILY_POINT_BUDGET", 150)
+        self.max_wait = config.get("RATE_LIMIT_MAX_WAIT", 0.5)
+        self.reserves = config.get("QUOTA_RESERVES", DEFAULT_RESERVES)
+        self.costs = config.get("QUOTA_POINT_COSTS", DEFAULT_POINT_COSTS)
+        self._clock = clock
+        self._sleep = sleep
+        self._ready = set()  # databases whose quota tables exist, so calls don't pay for the DDL
+
+    def _ensure_tables(self, conn):
+        path = current_app.config.get("DATABASE_PATH", "recipes.db")
+        if path not in self._ready:
+            _ensure_tables(conn)
+            self._ready.add(path)
+
+    def export_budget(self, app):
+        """
+        reading the remaining budget from the shared db on every /metrics scrape, so the gauge is right
+        after a restart and across the UTC day rollover, not only after this worker's last call
+        """
+        if not self.daily_budget:
+            return
+
+        def remaining():
+            try:
+                with app.app_context():
+                    return self.remaining_budget()
+            except Exception:
+                # an unreadable db must not break the whole scrape
+                return float("nan")
+        UPSTREAM_BUDGET_REMAINING.set_function(remaining)
+
+    def cost(self, endpoint):
+        return self.costs.get(endpoint, 1.0)
+
+    def acquire(self, endpoint, priority=PRIORITY_USER, max_wait=None):
+        """
+        taking one token and the endpoint's points, waiting up to max_wait seconds for a token
+        raises QuotaExceeded when the call has to be skipped
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        reserve = self.reserves.get(priority, 0.0)
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(self.cost(endpoint), reserve, priority)
+            if wait == 0:
+                return
+            if waited + wait > max_wait:
+                UPSTREAM_RATE_LIMITED.labels(priority=priority, reason="rate").inc()
+                raise QuotaExceeded(f"rate limit reached for {priority} calls")
+            self._sleep(wait)
+            waited += wait
+
+    def _try_acquire(self, cost, reserve, priority):
+        """one atomic check-and-debit, returns 0 on success or the seconds until a token frees up"""
+        now = self._clock()
+        day = _today()
+        with db_connection() as conn:
+            self._ensure_tables(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated_at FROM upstream_rate_limit WHERE name = 'spoonacular'").fetchone()
+                tokens = self.burst if row is None else min(self.burst, row["tokens"] + (now - row["updated_at"]) * self.rate)
+
+                row = conn.execute("SELECT points_used FROM upstream_budget WHERE day = ?", (day,)).fetchone()
+                points_used = row["points_used"] if row else 0.0
+
+                if self.daily_budget:
+                    remaining = self.daily_budget - points_used
+                    if remaining - cost < reserve * self.daily_budget:
+                        conn.rollback()
+                        UPSTREAM_RATE_LIMITED.labels(priority=priority, reason="budget").inc()
+                        raise QuotaExceeded(f"daily point budget reached for {priority} calls")
+
+                if tokens - 1 < reserve * self.burst:
+                    conn.rollback()
+                    return (reserve * self.burst + 1 - tokens) / self.rate
+
+                conn.execute("""
+                    INSERT INTO upstream_rate_limit (name, tokens, updated_at) VALUES ('spoonacular', ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET tokens=excluded.tokens, updated_at=excluded.updated_at
+                """, (tokens - 1, now))
+                conn.execute("""
+                    INSERT INTO upstream_budget (day, points_used) VALUES (?, ?)
+                    ON CONFLICT(day) DO UPDATE SET points_used=upstream_budget.points_used + excluded.points_used
+                """, (day, cost))
+                conn.commit()
+            except QuotaExceeded:
+                raise
+            except Exception:
+                conn.rollback()
+                raise
+        return 0
+
+    def remaining_budget(self):
+        """points left in today's budget, None when the budget is disabled"""
+        if not self.daily_budget:
+            return None
+        # read-only, metrics scrapes call this: no table yet means nothing was spent
+        with db_connection() as conn:
+            try:
+                row = conn.execute("SELECT points_used FROM upstream_budget WHERE day = ?", (_today(),)).fetchone()
+            except sqlite3.OperationalError:
+                row = None
+        return self.daily_budget - (row["points_used"] if row else 0.0)
+
+
+def _ensure_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS upstream_rate_limit (
+            name TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS upstream_budget (
+            day TEXT PRIMARY KEY,
+            points_used REAL NOT NULL
+        )
+    """)
+    conn.commit()
@@ -1,41 +1,83 @@
-from flask import render_template, request, redirect, url_for, jsonify, flash, current_app, Blueprint
-from .api_client import get_ingredient_suggestions
+from flask import render_template, request, redirect, url_for, jsonify, flash, current_app, Blueprint, g
+from .api_client import get_ingredient_suggestions, get_ingredient_vocabulary
+from .upstream import Deadline
+from .prefetch import prefetch_after_response
+from .warmer import record_query, tracking_queries, RESULTS, SUGGESTIONS
+from .page_cache import cached_page, page_depends_on, skip_page_cache
 from .storage import RecipeStorage, db
+from .timing import span
 
 from .utils import (
-    normalize_ingredients,get_processed_recipes, 
-    fetch_recipe_or_404, process_new_recipe_form, extract_api_recipe_form
+    normalize_ingredients,get_processed_recipes, prepare_ingredient_query,
+    fetch_recipe_or_404, process_new_recipe_form, extract_api_recipe_form, ingredients_page_key
     )
 
 bp = Blueprint("main", __name__)
 
+# pages are shared by every spelling of an ingredient list, so they render its normalized form, never the raw input
+PAGE_KEY = {"ingredients": ingredients_page_key}
+
+
+@bp.before_request
+def record_popularity():
+    """ counting popular keys before the page cache can answer, so cached pages count too"""
+    if not tracking_queries():
+        return
+    if request.endpoint == "main.results":
+        raw_input = request.args.get("ingredients", "")
+        if raw_input:
+            record_query(RESULTS, ",".join(normalize_ingredients(raw_input)))
+    elif request.endpoint == "main.ingredient_suggestions":
+        query = request.args.get("query", "").strip()
+        if query:
+            record_query(SUGGESTIONS, query.lower())
+
+
+@bp.after_request
+def add_stale_warning(response):
+    """ flagging responses served from cache while the upstream API is unavailable"""
+    if g.get("upstream_stale"):
+        response.headers["Warning"] = '110 - "Response is Stale"'
+    return response
+
 
 @bp.route('/')
 def home():
     return render_template("index.html")
 
 @bp.route('/results')
+@cached_page("ingredients", "sort_by", sort_by="weighted", max_age=60, canonical=PAGE_KEY)
 def results():
     """ 
     displays recipe search results based on user ingredients and sort preference
     """
     raw_input = request.args.get("ingredients", "")
     sort_by = request.args.get("sort_by", "weighted")
+    deadline = Deadline(current_app.config.get("RESULTS_DEADLINE", 10))
 
-    if raw_input:
-        user_ingredients = normalize_ingredients(raw_input)
-        recipes = get_processed_recipes(user_ingredients, sort_by, current_app.recipe_cache)
+    user_ingredients = normalize_ingredients(raw_input) if raw_input else []
+    if user_ingredients:
+        recipes = get_processed_recipes(user_ingredients, sort_by, current_app.recipe_cache, deadline=deadline)
+        prefetch_after_response(recipes)
+        page_depends_on(prepare_ingredient_query(user_ingredients))
     else:
         recipes = []
 
-    return render_template(
-        "results.html",
-        recipes=recipes,
-        ingredients=raw_input,
-        sort_by=sort_by
-    )
+    # same rule as the recipe cache: empty and deadline-truncated results are not kept
+    if not recipes or deadline.truncated:
+        skip_page_cache()
+
+    with span("render"):
+        return render_template(
+            "results.html",
+            recipes=recipes,
+            ingredients=", ".join(user_ingredients),
+            sort_by=sort_by,
+            partial=deadline.truncated
+        )
 
 @bp.route('/recipe/<int:recipe_id>')
+@cached_page("ingredients", "sort_by", sort_by="weighted", max_age=300, canonical=PAGE_KEY)
 def recipe_detail(recipe_id):
     """
     fetches and displays recipe steps about a specific recipe
@@ -44,16 +86,18 @@ def recipe_detail(recipe_id):
         recipe = fetch_recipe_or_404(recipe_id)
     except ValueError:
         return "Recipe not found", 404
+    page_depends_on(f"recipe_details:{recipe_id}")
 
-    ingredients = request.args.get("ingredients", "")
+    ingredients = ",".join(normalize_ingredients(request.args.get("ingredients", "")))
     sort_by = request.args.get("sort_by", "weighted")
 
-    return render_template(
-        "recipe_detail.html",
-        recipe=recipe,
-        ingredients=ingredients,
-        sort_by=sort_by
-    )
+    with span("render"):
+        return render_template(
+            "recipe_detail.html",
+            recipe=recipe,
+            ingredients=ingredients,
+            sort_by=sort_by
+        )
 
 # ---------- MY RECIPES CRUD ----------
 
@@ -138,6 +182,25 @@ def ingredient_suggestions():
     suggestions = get_ingredient_suggestions(query)
     return jsonify(suggestions)
 
+@bp.route("/ingredient_vocabulary/<version>.json")
+def ingredient_vocabulary(version):
+    """
+    the common ingredients for client-side autocomplete; the url carries the content hash,
+    so a matching version is cached forever and an outdated one redirects to the current file
+    """
+    current, body = get_ingredient_vocabulary()
+    if version != current:
+        return redirect(url_for("main.ingredient_vocabulary", version=current))
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(current)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response.make_conditional(request)
+
+
+@bp.app_template_global()
+def ingredient_vocabulary_url():
+    return url_for("main.ingredient_vocabulary", version=get_ingredient_vocabulary()[0])
+
 # ---------- health check ----------
 from sqlalchemy import text
 
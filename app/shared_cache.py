@@ -0,0 +1,231 @@
+# ---------- SHARED L1 CACHE: ONE MMAP FILE FOR ALL WORKERS ON A NODE ----------
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+MAGIC = b"SCCACHE2"
+# magic, sequence number (odd while a write is in progress), slot count, data region size,
+# next free data offset, number of entries, generation (bumped by every reset)
+HEADER = struct.Struct("<8sQQQQQQ")
+# key hash (0 = empty), data offset, key length, value length
+SLOT = struct.Struct("<QQII")
+SEQ_OFFSET = 8
+MAX_LOAD = 0.7
+READ_RETRIES = 3
+_MISSING = object()
+
+
+def _encode_key(key):
+    # recipe_cache is keyed by tuples of ingredients (build_cache_key)
+    if isinstance(key, tuple):
+        key = "\x1f".join(key)
+    return key.encode("utf-8")
+
+
+def _hash(key):
+    # hash() is salted per process, so every worker would probe different slots
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryCache:
+    """
+    dict-like cache kept in a memory-mapped file so every worker on the node sees the same entries
+    layout: header | open-addressing hash index | append-only data region
+    writers serialize on a file lock; readers take no lock and retry if a write raced them (seqlock)
+    when the index or data region fills up, the whole cache is reset (cheap, and entries are only an L1)
+    bytes in the data region never change until the next reset, so each worker keeps the values it decoded
+    keyed by (generation, offset): a repeated hit reads the index through a memoryview and skips json,
+    and like the dict backend every hit on an entry returns the same object
+    """
+
+    def __init__(self, path, size=64 * 1024 * 1024, slots=65536, memo_entries=1024):
+        self.path = path
+        self.slots = slots
+        self._index_offset = HEADER.size
+        self._data_offset = HEADER.size + slots * SLOT.size
+        self._data_size = size - self._data_offset
+        if self._data_size <= 0:
+            raise ValueError("shared cache size is too small for the slot table")
+        self._size = size
+        self.memo_entries = memo_entries
+        self._memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self.resets = 0
+        self.on_evict = None  # called with the number of entries a reset dropped
+        self._open()
+
+    def _open(self):
+        self._lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            if os.fstat(self._fd).st_size != self._size:
+                os.ftruncate(self._fd, self._size)
+            self._mm = mmap.mmap(self._fd, self._size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            self._view = memoryview(self._mm)
+            magic, _, n_slots, data_size, _, _, _ = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or n_slots != self.slots or data_size != self._data_size:
+                self._reset()
+
+    def reopen(self):
+        """
+        opening the file again in a forked worker: flock locks belong to the open file description,
+        so a description inherited from the master locks nothing against the other workers
+        """
+        self.close()
+        self._open()
+
+    # ---------- locking ----------
+
+    @contextmanager
+    def _locked(self):
+        # flock only excludes other processes, threads of this worker share the fd
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _seq(self):
+        return struct.unpack_from("<Q", self._mm, SEQ_OFFSET)[0]
+
+    def _set_seq(self, value):
+        struct.pack_into("<Q", self._mm, SEQ_OFFSET, value)
+
+    def _reset(self):
+        """wiping the index and data region, called with the write lock held"""
+        seq, generation = (self._seq(), self._generation()) if self._mm[:8] == MAGIC else (0, 0)
+        self._set_seq(seq | 1)
+        self._mm[self._index_offset:self._data_offset] = bytes(self._data_offset - self._index_offset)
+        HEADER.pack_into(self._mm, 0, MAGIC, (seq | 1) + 1, self.slots, self._data_size, 0, 0, generation + 1)
+
+    def _generation(self):
+        return HEADER.unpack_from(self._mm, 0)[6]
+
+    # ---------- index ----------
+
+    def _probe(self, key_bytes, key_hash):
+        """slot position holding the key, or the first empty slot on its probe sequence"""
+        start = key_hash % self.slots
+        for i in range(self.slots):
+            pos = (start + i) % self.slots
+            slot_hash, offset, key_len, _ = SLOT.unpack_from(self._mm, self._index_offset + pos * SLOT.size)
+            if slot_hash == 0:
+                return pos, False
+            if slot_hash == key_hash and key_len == len(key_bytes):
+                start_at = self._data_offset + offset
+                if self._view[start_at:start_at + key_len] == key_bytes:
+                    return pos, True
+        return None, False
+
+    def _read(self, key, decode=True):
+        """(found, value); the value is copied out of the map and decoded only the first time this worker reads it"""
+        key_bytes = _encode_key(key)
+        key_hash = _hash(key_bytes)
+        for _ in range(READ_RETRIES):
+            before = self._seq()
+            if before & 1:
+                continue
+            pos, found = self._probe(key_bytes, key_hash)
+            where, value, raw = None, _MISSING, None
+            if found and decode:
+                _, offset, key_len, value_len = SLOT.unpack_from(self._mm, self._index_offset + pos * SLOT.size)
+                where = (self._generation(), offset)
+                with self._memo_lock:
+                    value = self._memo.get(where, _MISSING)
+                if value is _MISSING:
+                    start_at = self._data_offset + offset + key_len
+                    raw = bytes(self._view[start_at:start_at + value_len])
+            if self._seq() == before:
+                if value is _MISSING and raw is not None:
+                    value = self._remember(where, json.loads(raw))
+                return found, None if value is _MISSING else value
+        # writes kept racing the read, treat it as a miss rather than spin
+        return False, None
+
+    def _remember(self, where, value):
+        if self.memo_entries:
+            with self._memo_lock:
+                self._memo[where] = value
+                if len(self._memo) > self.memo_entries:
+                    self._memo.popitem(last=False)
+        return value
+
+    # ---------- mapping API ----------
+
+    def get(self, key, default=None):
+        found, value = self._read(key)
+        return value if found else default
+
+    def __getitem__(self, key):
+        found, value = self._read(key)
+        if not found:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._read(key, decode=False)[0]
+
+    def __setitem__(self, key, value):
+        key_bytes = _encode_key(key)
+        value_bytes = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        needed = len(key_bytes) + len(value_bytes)
+        if needed > self._data_size:
+            return  # never fits, skipping keeps the rest of the cache intact
+        key_hash = _hash(key_bytes)
+
+        with self._locked():
+            _, seq, _, _, used, count, generation = HEADER.unpack_from(self._mm, 0)
+            pos, found = self._probe(key_bytes, key_hash)
+            if used + needed > self._data_size or pos is None or (not found and count >= self.slots * MAX_LOAD):
+                self._reset()
+                self.resets += 1
+                if self.on_evict is not None:
+                    self.on_evict(count)
+                _, seq, _, _, used, count, generation = HEADER.unpack_from(self._mm, 0)
+                pos, found = self._probe(key_bytes, key_hash)
+
+            self._set_seq(seq + 1)
+            start_at = self._data_offset + used
+            self._mm[start_at:start_at + needed] = key_bytes + value_bytes
+            SLOT.pack_into(self._mm, self._index_offset + pos * SLOT.size, key_hash, used, len(key_bytes), len(value_bytes))
+            count += 0 if found else 1
+            HEADER.pack_into(self._mm, 0, MAGIC, seq + 2, self.slots, self._data_size, used + needed, count, generation)
+
+    def __len__(self):
+        return HEADER.unpack_from(self._mm, 0)[5]
+
+    def clear(self):
+        with self._locked():
+            self._reset()
+
+    @property
+    def bytes_used(self):
+        return HEADER.unpack_from(self._mm, 0)[4]
+
+    def close(self):
+        self._view.release()
+        self._mm.close()
+        os.close(self._fd)
+
+
+def shared_cache_path(config, name):
+    directory = config.get("SHARED_CACHE_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+    return os.path.join(directory, f"shelfchef-{name}.cache")
+
+
+def create_shared_cache(config, name):
+    """ opening (or creating) the node-wide cache file for one of the app's L1 caches """
+    return SharedMemoryCache(
+        shared_cache_path(config, name),
+        size=config.get("SHARED_CACHE_SIZE_MB", 64) * 1024 * 1024,
+        slots=config.get("SHARED_CACHE_SLOTS", 65536),
+        memo_entries=config.get("SHARED_CACHE_MEMO_ENTRIES", 1024),
+    )
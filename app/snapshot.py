@@ -0,0 +1,147 @@
+# ---------- CACHE SNAPSHOTS: EXPORT / IMPORT ----------
+import gzip
+import json
+import time
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+
+from .db_utils import db_connection
+
+SNAPSHOT_VERSION = 1
+BATCH_SIZE = 1000
+
+# one json array per line, tagged by table: ["c", query, response] or ["i", name]
+CACHED_RESPONSE = "c"
+INGREDIENT = "i"
+
+
+def _open(path, mode):
+    """snapshots ending in .gz are gzip compressed, anything else is plain json lines"""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def _ensure_tables(conn):
+    """same schema as create_db.py, so a snapshot can be loaded into an empty db"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cached_responses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            query TEXT UNIQUE NOT NULL,
+            response TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingredients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        )
+    """)
+
+
+def _iter_rows(conn, sql):
+    """reading a table in fixed-size batches so exports never hold a whole table in memory"""
+    cursor = conn.execute(sql)
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+
+def export_snapshot(path):
+    """
+    writing cached responses (search results, recipe details, suggestions) and the ingredient
+    vocabulary to a snapshot file, returns the number of rows written
+    """
+    count = 0
+    with db_connection() as conn, _open(path, "w") as out:
+        out.write(json.dumps({"snapshot": SNAPSHOT_VERSION, "created_at": time.time()}) + "\n")
+        if _table_exists(conn, "cached_responses"):
+            for row in _iter_rows(conn, "SELECT query, response FROM cached_responses ORDER BY id"):
+                out.write(json.dumps([CACHED_RESPONSE, row["query"], row["response"]], separators=(",", ":")) + "\n")
+                count += 1
+        if _table_exists(conn, "ingredients"):
+            for row in _iter_rows(conn, "SELECT name FROM ingredients ORDER BY id"):
+                out.write(json.dumps([INGREDIENT, row["name"]], separators=(",", ":")) + "\n")
+                count += 1
+    return count
+
+
+def _read_snapshot(path):
+    """yielding snapshot rows one line at a time after checking the header"""
+    with _open(path, "r") as f:
+        header = json.loads(f.readline() or "{}")
+        if not isinstance(header, dict) or header.get("snapshot") != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} cache snapshot")
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def import_snapshot(path, overwrite=True):
+    """
+    bulk loading a snapshot in a single transaction with batched executemany
+    existing cache entries are replaced unless overwrite is False, returns the number of rows read
+    """
+    cache_sql = (
+        "INSERT INTO cached_responses (query, response) VALUES (?, ?) "
+        "ON CONFLICT(query) DO UPDATE SET response=excluded.response"
+        if overwrite else
+        "INSERT OR IGNORE INTO cached_responses (query, response) VALUES (?, ?)"
+    )
+    count = 0
+    rows = _read_snapshot(path)
+    with db_connection() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            _ensure_tables(conn)
+            while True:
+                batch = list(islice(rows, BATCH_SIZE))
+                if not batch:
+                    break
+                cached = [(row[1], row[2]) for row in batch if row[0] == CACHED_RESPONSE]
+                ingredients = [(row[1],) for row in batch if row[0] == INGREDIENT]
+                if cached:
+                    conn.executemany(cache_sql, cached)
+                if ingredients:
+                    conn.executemany("INSERT OR IGNORE INTO ingredients (name) VALUES (?)", ingredients)
+                count += len(batch)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return count
+
+
+# ---------- CLI ----------
+
+@click.command("cache-export")
+@click.argument("path", type=click.Path(dir_okay=False))
+@with_appcontext
+def cache_export_command(path):
+    """Export the response cache and ingredient list to PATH (.gz to compress)."""
+    count = export_snapshot(path)
+    click.echo(f"Exported {count} rows to {path}.")
+
+
+@click.command("cache-import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--keep-existing", is_flag=True, help="Do not replace cache entries already in the database.")
+@with_appcontext
+def cache_import_command(path, keep_existing):
+    """Load a snapshot written by cache-export into the database."""
+    count = import_snapshot(path, overwrite=not keep_existing)
+    click.echo(f"Imported {count} rows from {path}.")
+
+
+def init_snapshot(app):
+    """ registering the snapshot CLI commands """
+    app.cli.add_command(cache_export_command)
+    app.cli.add_command(cache_import_command)
@@ -0,0 +1,220 @@
+# ---------- SQL INSTRUMENTATION + SLOW-QUERY LOG ----------
+import logging
+import re
+import sqlite3
+import time
+from functools import lru_cache
+
+from flask import current_app, has_app_context
+
+from .metrics import SQL_SECONDS, SQL_ROWS, SQL_SLOW_QUERIES
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"(?:\?|%s|:\w+|%\(\w+\)s)")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN|TABLE(?:\s+IF\s+(?:NOT\s+)?EXISTS)?)\s+[\"`\[]?(\w+)", re.I)
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """
+    one line of SQL with literals and placeholders replaced by ?, so the same statement with
+    different values groups together (and values never reach the logs)
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _VALUE_LIST.sub("(?...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+@lru_cache(maxsize=1024)
+def statement_labels(sql):
+    """(operation, table) for metric labels: ("select", "cached_responses"), ("begin", "-")"""
+    words = sql.split(None, 1)
+    operation = words[0].lower() if words else "-"
+    match = _TABLE.search(sql)
+    return operation, match.group(1).lower() if match else "-"
+
+
+def record_statement(db, sql, duration, rows=None, slow_seconds=None):
+    operation, table = statement_labels(sql)
+    SQL_SECONDS.labels(db, operation, table).observe(duration)
+    if rows is not None and rows >= 0:
+        SQL_ROWS.labels(db, operation, table).observe(rows)
+    if slow_seconds is not None and duration >= slow_seconds:
+        SQL_SLOW_QUERIES.labels(db, operation, table).inc()
+        normalized = normalize_sql(sql)
+        logger.warning("slow query db=%s duration_ms=%.1f rows=%s sql=%s", db, duration * 1000, rows, normalized,
+                       extra={"db": db, "duration_ms": round(duration * 1000, 1), "rows": rows, "sql": normalized})
+
+
+def slow_query_seconds(config=None):
+    """SLOW_QUERY_MS as seconds, None (no slow-query log) when it is 0 or unset"""
+    if config is None:
+        config = current_app.config if has_app_context() else {}
+    ms = config.get("SLOW_QUERY_MS", 0)
+    return ms / 1000 if ms else None
+
+
+# ---------- sqlite3 ----------
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    a cursor that times each statement from execute until its rows are fetched
+    (sqlite does most of a query's work while stepping through rows, not in execute)
+    the statement is recorded once its rows run out, on the next execute, or when the cursor
+    or its connection is closed
+    """
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._sql = None
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def execute(self, sql, parameters=()):
+        self.finish()
+        self._sql, self._elapsed, self._rows = sql, 0.0, 0
+        self.connection._pending.add(self)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._elapsed += time.perf_counter() - start
+            if self.description is None:
+                self.finish()
+
+    def executemany(self, sql, seq_of_parameters):
+        self.finish()
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection._record(sql, time.perf_counter() - start, self.rowcount)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._elapsed += time.perf_counter() - start
+        if row is None:
+            self.finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._elapsed += time.perf_counter() - start
+        self._rows += len(rows)
+        if len(rows) < size:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._elapsed += time.perf_counter() - start
+        self._rows += len(rows)
+        self.finish()
+        return rows
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self.finish()
+        super().close()
+
+    def finish(self):
+        """recording the pending statement, if any"""
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        self.connection._pending.discard(self)
+        rows = self._rows if self.description is not None else self.rowcount
+        self.connection._record(sql, self._elapsed, rows)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors record every statement (see record_statement)"""
+    db_label = "sqlite3"
+    slow_query_seconds = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = set()
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute would run the statement on a cursor without going through its execute
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        for cursor in list(self._pending):
+            cursor.finish()
+        super().close()
+
+    def _record(self, sql, duration, rows):
+        record_statement(self.db_label, sql, duration, rows, self.slow_query_seconds)
+
+
+@lru_cache(maxsize=None)
+def connection_factory(db_label, slow_seconds=None):
+    """an InstrumentedConnection class for sqlite3.connect(factory=...) with its label and slow-query threshold"""
+    return type("InstrumentedConnection", (InstrumentedConnection,),
+                {"db_label": db_label, "slow_query_seconds": slow_seconds})
+
+
+# ---------- SQLAlchemy ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sql_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("sql_started")
+    if not started:
+        return
+    duration = time.perf_counter() - started.pop()
+    if isinstance(cursor, InstrumentedCursor):
+        return  # sqlite engines use InstrumentedConnection, which also counts the rows fetched
+    record_statement("sqlalchemy", statement, duration, cursor.rowcount, slow_query_seconds())
+
+
+def instrument_engine(engine):
+    """execution events for engines whose driver isn't sqlite3 (DATABASE_URL pointing elsewhere)"""
+    from sqlalchemy import event
+
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def init_sql_metrics(app):
+    """
+    timing the SQLAlchemy engine; called before init_db so sqlite engines are created with the
+    instrumented connection class (db_utils uses the same class for its raw connections)
+    """
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI", "")
+    if uri.startswith("sqlite"):
+        options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+        options.setdefault("connect_args", {}).setdefault(
+            "factory", connection_factory("sqlalchemy", slow_query_seconds(app.config)))
+    else:
+        from sqlalchemy.engine import Engine
+        instrument_engine(Engine)
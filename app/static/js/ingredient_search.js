@@ -0,0 +1,154 @@
+const input = document.getElementById("ingredient-input");
+const addBtn = document.getElementById("add-btn");
+const chipsContainer = document.getElementById("chips-container");
+const hiddenInput = document.getElementById("hidden-ingredients");
+const suggestions = document.getElementById("suggestions");
+
+let ingredients = [];
+
+function updateHiddenInput() {
+    hiddenInput.value = ingredients.join(",");
+}
+
+function addChip(ingredient) {
+    if(!ingredient || ingredients.includes(ingredient.toLowerCase())) return;
+    ingredients.push(ingredient.toLowerCase());
+    updateHiddenInput();
+
+    const chip = document.createElement("div");
+    chip.className = "chip";
+    chip.textContent = ingredient;
+
+    const removeBtn = document.createElement("button");
+    removeBtn.textContent = "x";
+    removeBtn.onclick = () => {
+        chipsContainer.removeChild(chip);
+        ingredients = ingredients.filter(i => i !== ingredient.toLowerCase());
+        updateHiddenInput();
+    };
+
+    chip.appendChild(removeBtn);
+    chipsContainer.appendChild(chip);
+    input.value = "";
+    suggestions.style.display = "none";
+}
+
+addBtn.addEventListener("click", () => {
+    addChip(input.value.trim());
+});
+
+input.addEventListener("keydown", e => {
+    if(e.key === "Enter") {
+        e.preventDefault();
+        addChip(input.value.trim());
+    }
+});
+
+// Suggestions: common ingredients are matched in the browser against the shipped vocabulary,
+// anything else goes to the server once and is remembered in a small LRU
+const form = document.getElementById("ingredient-form");
+const SUGGESTION_CACHE_SIZE = 100;
+const suggestionCache = new Map();
+let vocabulary = [];
+let inFlight = null;
+let timer;
+
+fetch(form.dataset.vocabularyUrl)
+    .then(res => res.ok ? res.json() : [])
+    .then(words => { vocabulary = words; })
+    .catch(err => console.error(err));
+
+function localMatches(query) {
+    return vocabulary.filter(word => word.startsWith(query));
+}
+
+function cacheGet(query) {
+    if(!suggestionCache.has(query)) return undefined;
+    const value = suggestionCache.get(query);
+    suggestionCache.delete(query);
+    suggestionCache.set(query, value);
+    return value;
+}
+
+function cacheSet(query, value) {
+    suggestionCache.delete(query);
+    suggestionCache.set(query, value);
+    if(suggestionCache.size > SUGGESTION_CACHE_SIZE) {
+        suggestionCache.delete(suggestionCache.keys().next().value);
+    }
+}
+
+function cancelInFlight() {
+    if(inFlight) {
+        inFlight.abort();
+        inFlight = null;
+    }
+}
+
+function renderSuggestions(items) {
+    suggestions.replaceChildren();
+    if(!items.length) {
+        suggestions.style.display = "none";
+        return;
+    }
+    for(const item of items) {
+        const li = document.createElement("li");
+        li.className = "suggestion-item";
+        li.textContent = item;
+        suggestions.appendChild(li);
+    }
+    suggestions.style.display = "block";
+}
+
+async function fetchSuggestions(query) {
+    cancelInFlight();
+    const controller = new AbortController();
+    inFlight = controller;
+    try {
+        const res = await fetch(`/ingredient_suggestions?query=${encodeURIComponent(query)}`, {signal: controller.signal});
+        const data = await res.json();
+        cacheSet(query, data);
+        if(input.value.trim().toLowerCase() === query) renderSuggestions(data);
+    } catch(err) {
+        if(err.name === "AbortError") return;
+        console.error(err);
+        suggestions.style.display = "none";
+    } finally {
+        if(inFlight === controller) inFlight = null;
+    }
+}
+
+input.addEventListener("input", () => {
+    clearTimeout(timer);
+    const query = input.value.trim().toLowerCase();
+    if(!query) {
+        cancelInFlight();
+        suggestions.style.display = "none";
+        return;
+    }
+    const local = localMatches(query);
+    if(local.length) {
+        cancelInFlight();
+        renderSuggestions(local);
+        return;
+    }
+    const cached = cacheGet(query);
+    if(cached !== undefined) {
+        cancelInFlight();
+        renderSuggestions(cached);
+        return;
+    }
+    timer = setTimeout(() => fetchSuggestions(query), 200);
+});
+
+suggestions.addEventListener("click", e => {
+    if(e.target.classList.contains("suggestion-item")){
+        addChip(e.target.textContent);
+    }
+});
+
+document.addEventListener("click", e => {
+    if(!suggestions.contains(e.target) && e.target !== input){
+        suggestions.style.display = "none";
+    }
+});
@@ -0,0 +1,81 @@
+const ingredientInput = document.getElementById('ingredient-input');
+const tagsContainer = document.getElementById('ingredient-tags');
+const hiddenIngredients = document.getElementById('ingredients-hidden');
+const instructionsContainer = document.getElementById('instructions-container');
+const addStepBtn = document.getElementById('add-step');
+const errorDiv = document.getElementById('ingredient-error');
+
+function updateHiddenIngredients() {
+    const tags = Array.from(tagsContainer.querySelectorAll('.tag')).map(tag => tag.firstChild.textContent);
+    hiddenIngredients.value = tags.join(',');
+}
+
+// Ingredient tag events
+tagsContainer.addEventListener('click', e => {
+    if (e.target.classList.contains('remove-tag')) {
+        e.target.parentElement.remove();
+        updateHiddenIngredients();
+    }
+});
+
+ingredientInput.addEventListener('keydown', e => {
+    if (e.key === 'Enter' && ingredientInput.value.trim() !== '') {
+        e.preventDefault();
+        const tag = document.createElement('span');
+        tag.className = 'tag';
+        tag.innerHTML = ingredientInput.value.trim() + '<span class="remove-tag">x</span>';
+        tagsContainer.insertBefore(tag, ingredientInput);
+        ingredientInput.value = '';
+        updateHiddenIngredients();
+    }
+});
+
+// Step helper
+function createStep(value = "") {
+    const div = document.createElement('div');
+    div.className = 'instruction-step';
+    div.innerHTML = `<input type="text" name="instructions[]" value="${value}" placeholder="Step" required>`;
+
+    const removeBtn = document.createElement('span');
+    removeBtn.className = 'remove-step';
+    removeBtn.textContent = 'x';
+    removeBtn.style.cursor = 'pointer';
+    removeBtn.style.color = 'red';
+    removeBtn.style.marginLeft = '8px';
+    div.appendChild(removeBtn);
+
+    removeBtn.addEventListener('click', function() {
+        if (instructionsContainer.querySelectorAll('.instruction-step').length > 2) {
+            div.remove();
+        } else {
+            alert('A recipe must have at least 2 steps.');
+        }
+    });
+
+    instructionsContainer.appendChild(div);
+}
+
+// Initialize existing steps
+document.querySelectorAll('#instructions-container .instruction-step input').forEach(input => {
+    const parentDiv = input.parentElement;
+    if (!parentDiv.querySelector('.remove-step')) {
+        createStep(input.value); // replaces old input with a new div including remove button
+        parentDiv.remove();       // remove original div
+    }
+});
+
+// Add new step
+addStepBtn.addEventListener('click', () => createStep());
+
+// Form submit validation
+document.getElementById('recipeForm').addEventListener('submit', e => {
+    updateHiddenIngredients();
+    document.getElementById('ingredient-check').value = hiddenIngredients.value;
+
+    if (hiddenIngredients.value.trim() === "") {
+        e.preventDefault();
+        errorDiv.textContent = "Please add at least one ingredient!";
+    }
+});
+
+updateHiddenIngredients();
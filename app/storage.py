@@ -1,6 +1,7 @@
 from typing import List, Optional, Dict, Any
 from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
 from .utils import normalize_ingredient
 
 db = SQLAlchemy()  
@@ -107,12 +108,14 @@ class RecipeStorage:
 
 # -------------------- CACHED RESPONSES --------------------
 def get_common_ingredients_from_db() -> List[str]:
-    """fetching common ingredients from local db"""
+    """fetching common ingredients from local db, or the copy loaded once at preload"""
+    vocabulary = getattr(current_app, "ingredient_vocabulary", None)
+    if vocabulary is not None:
+        return list(vocabulary)
     ingredients = []
     try:
-        conn = db.session.bind  
-        result = conn.execute("SELECT name FROM ingredients")
+        result = db.session.execute(text("SELECT name FROM ingredients"))
         ingredients = [normalize_ingredient(row[0]) for row in result.fetchall()]
     except Exception:
-        pass
+        db.session.rollback()
     return ingredients
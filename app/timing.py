@@ -0,0 +1,85 @@
+# ---------- PER-STAGE TIMING (SERVER-TIMING HEADER + PROMETHEUS) ----------
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+
+from .metrics import STAGE_SECONDS
+
+MAX_HEADER_ENTRIES = 32
+
+
+class Span:
+    """one timed stage; outcome (hit, miss, stale, 200, ...) may be set while the span is open"""
+    __slots__ = ("stage", "outcome", "duration")
+
+    def __init__(self, stage, outcome=None):
+        self.stage = stage
+        self.outcome = outcome
+        self.duration = 0.0
+
+
+@contextmanager
+def span(stage, outcome=None):
+    """
+    timing a block as a request stage:
+
+        with span("l2") as s:
+            ...
+            s.outcome = "hit"
+
+    every span is observed in the stage histogram; inside a request it is also reported in Server-Timing
+    spans may nest (sqlite inside l2), so the stages of a request don't add up to its total
+    """
+    s = Span(stage, outcome)
+    start = time.perf_counter()
+    try:
+        yield s
+    finally:
+        s.duration = time.perf_counter() - start
+        record_span(s)
+
+
+def record_span(s):
+    STAGE_SECONDS.labels(s.stage, s.outcome or "none").observe(s.duration)
+    spans = g.get("spans") if has_app_context() else None
+    if spans is not None:
+        spans.append(s)
+
+
+def server_timing_header(spans, total=None):
+    """Server-Timing value with one entry per (stage, outcome), repeated stages summed in first-seen order"""
+    totals = {}
+    for s in spans:
+        key = (s.stage, s.outcome)
+        duration, count = totals.get(key, (0.0, 0))
+        totals[key] = (duration + s.duration, count + 1)
+
+    entries = []
+    for (stage, outcome), (duration, count) in list(totals.items())[:MAX_HEADER_ENTRIES]:
+        entry = f"{stage};dur={duration * 1000:.2f}"
+        desc = str(outcome) if outcome is not None else ""
+        if count > 1:
+            desc = f"{desc} x{count}".strip()
+        if desc:
+            entry += f';desc="{desc}"'
+        entries.append(entry)
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def init_timing(app):
+    """ collecting the spans of each request and reporting them in a Server-Timing header """
+
+    @app.before_request
+    def start_spans():
+        g.spans = []
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def add_server_timing(response):
+        if app.config.get("SERVER_TIMING_ENABLED", True) and "request_started" in g:
+            response.headers["Server-Timing"] = server_timing_header(
+                g.get("spans", ()), time.perf_counter() - g.request_started)
+        return response
@@ -0,0 +1,528 @@
+# ---------- UPSTREAM (SPOONACULAR) CLIENT HELPERS ----------
+import logging
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+
+from flask import current_app, g, has_app_context
+
+from .lazy import lazy_import
+from .metrics import (
+    UPSTREAM_HEDGES_FIRED, UPSTREAM_HEDGES_WON, UPSTREAM_RETRIES, UPSTREAM_LATENCY, UPSTREAM_RESPONSES,
+    UPSTREAM_RESPONSE_BYTES, UPSTREAM_IN_FLIGHT, UPSTREAM_QUOTA_USED, UPSTREAM_QUOTA_LEFT, UPSTREAM_POINTS_CHARGED)
+
+requests = lazy_import("requests")
+logger = logging.getLogger(__name__)
+
+# priority classes for upstream calls, highest first (see quota.py)
+PRIORITY_USER = "user"              # searches and autocomplete a user is waiting on
+PRIORITY_DETAIL = "detail"          # recipe detail fetches
+PRIORITY_BACKGROUND = "background"  # prefetch and cache refresh
+
+
+class UpstreamError(Exception):
+    """raised when the upstream API can't be reached or answers with a non-200 status"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UpstreamUnavailable(UpstreamError):
+    """raised without calling upstream while the circuit breaker is open"""
+
+
+class DeadlineExceeded(UpstreamError):
+    """raised when the request's time budget ran out before or during an upstream call"""
+
+
+# ---------- DEADLINE ----------
+
+class Deadline:
+    """
+    per-request time budget passed down to every upstream call
+    `truncated` is set by whoever gives up on work because the budget ran out
+    """
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self._clock = clock
+        self.expires_at = clock() + seconds
+        self.truncated = False
+
+    def remaining(self):
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+
+# ---------- CIRCUIT BREAKER ----------
+
+class CircuitBreaker:
+    """
+    closed -> open when the error rate or slow-call rate over the last `window` calls crosses its threshold
+    open -> half-open after `open_seconds`, letting a single probe call through
+    half-open -> closed if the probe is fast and successful, otherwise back to open
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window=20, min_calls=5, error_rate=0.5, slow_call_seconds=3.0,
+                 slow_call_rate=0.5, open_seconds=30, clock=time.monotonic):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._outcomes = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+
+    def _close(self):
+        self._state = self.CLOSED
+        self._outcomes.clear()
+
+    def allow_request(self):
+        """checking if a call may go upstream, reserving the probe slot when half-open"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.OPEN:
+                return False
+            if self._state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def release(self):
+        """giving back the probe slot of a call that says nothing about upstream health (our own deadline ran out)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record(self, success, latency):
+        """recording the outcome of a call that was allowed through"""
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                if success and not slow:
+                    self._close()
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append((not success, slow))
+            if len(self._outcomes) < self.min_calls:
+                return
+            total = len(self._outcomes)
+            failures = sum(1 for failed, _ in self._outcomes if failed)
+            slow_calls = sum(1 for _, was_slow in self._outcomes if was_slow)
+            if failures / total >= self.error_rate or slow_calls / total >= self.slow_call_rate:
+                self._open()
+
+
+# ---------- RETRIES ----------
+
+class RetryPolicy:
+    """
+    retries for idempotent requests: exponential backoff with full jitter,
+    or the server's Retry-After when it sends one
+    """
+    IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+    RETRY_STATUSES = (429, 502, 503, 504)
+
+    def __init__(self, max_attempts=3, base_delay=0.2, max_delay=2.0, rand=random.uniform):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rand = rand
+
+    def can_retry(self, method, attempt):
+        """attempt counts from 1, so attempt == max_attempts means no retries are left"""
+        return method.upper() in self.IDEMPOTENT_METHODS and attempt < self.max_attempts
+
+    def backoff(self, attempt):
+        """full jitter: a random delay between 0 and base * 2^(attempt-1), capped at max_delay"""
+        return self._rand(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def delay(self, attempt, retry_after=None):
+        """the delay before the next attempt, None when Retry-After asks for longer than max_delay"""
+        wait_for = parse_retry_after(retry_after)
+        if wait_for is None:
+            return self.backoff(attempt)
+        return wait_for if wait_for <= self.max_delay else None
+
+
+def parse_retry_after(value):
+    """Retry-After as seconds, from either delta-seconds or an HTTP date"""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------- HEDGING ----------
+
+class Hedger:
+    """
+    tracks recent latencies per endpoint and caps how often a duplicate request may be fired
+    a call still running after the observed `quantile` latency gets one hedge, as long as
+    fewer than `max_rate` of the last `window` calls were hedged
+    """
+
+    def __init__(self, max_rate=0.05, quantile=0.95, min_samples=20, window=200, max_workers=8):
+        self.max_rate = max_rate
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._hedged = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._max_workers = max_workers
+        self._executor = None
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="upstream-hedge")
+            return self._executor
+
+    def record(self, endpoint, latency, hedged):
+        with self._lock:
+            self._latencies[endpoint].append(latency)
+            self._hedged.append(hedged)
+
+    def hedge_delay(self, endpoint):
+        """the observed quantile latency for the endpoint, None until there are enough samples"""
+        with self._lock:
+            samples = sorted(self._latencies[endpoint])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(self.quantile * len(samples)))]
+
+    def allow_hedge(self):
+        with self._lock:
+            return (sum(self._hedged) + 1) / (len(self._hedged) + 1) <= self.max_rate
+
+
+def _first_successful(primary, hedge):
+    """returns (response, hedge_won) from whichever future answers first without raising"""
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), future is hedge
+            error = future.exception()
+    raise error
+
+
+# ---------- INSTRUMENTATION ----------
+
+_API_KEY = re.compile(r"(apiKey=)[^&\s'\")]+")
+
+
+def redact(text):
+    """requests errors quote the full url, query string and api key included"""
+    return _API_KEY.sub(r"\1***", str(text))
+
+
+def _header_number(headers, name):
+    try:
+        value = headers.get(name)
+    except AttributeError:
+        return None
+    if not isinstance(value, (str, int, float)):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _body_size(response):
+    content = getattr(response, "content", None)
+    if isinstance(content, (bytes, bytearray)):
+        return len(content)
+    return _header_number(getattr(response, "headers", {}), "Content-Length")
+
+
+def observe_response(endpoint, response, duration):
+    """
+    recording one upstream answer: latency, status, body size and the quota headers spoonacular sends
+    (X-API-Quota-Request: points this call cost, X-API-Quota-Used / -Left: today's totals)
+    """
+    status = response.status_code
+    size = _body_size(response)
+    headers = getattr(response, "headers", {})
+    charged = _header_number(headers, "X-API-Quota-Request")
+    used = _header_number(headers, "X-API-Quota-Used")
+    left = _header_number(headers, "X-API-Quota-Left")
+
+    UPSTREAM_LATENCY.labels(endpoint).observe(duration)
+    UPSTREAM_RESPONSES.labels(endpoint, str(status)).inc()
+    if size is not None:
+        UPSTREAM_RESPONSE_BYTES.labels(endpoint).observe(size)
+    if charged is not None:
+        UPSTREAM_POINTS_CHARGED.labels(endpoint).inc(charged)
+    if used is not None:
+        UPSTREAM_QUOTA_USED.set(used)
+    if left is not None:
+        UPSTREAM_QUOTA_LEFT.set(left)
+
+    level = logging.INFO if isinstance(status, int) and status < 400 else logging.WARNING
+    logger.log(level, "upstream call endpoint=%s status=%s duration_ms=%.1f bytes=%s quota_left=%s",
+               endpoint, status, duration * 1000, size, left,
+               extra={"endpoint": endpoint, "status": status, "duration_ms": round(duration * 1000, 1),
+                      "bytes": size, "quota_used": used, "quota_left": left})
+
+
+def observe_error(endpoint, error, duration):
+    UPSTREAM_LATENCY.labels(endpoint).observe(duration)
+    UPSTREAM_RESPONSES.labels(endpoint, "error").inc()
+    error = redact(error)
+    logger.warning("upstream call endpoint=%s status=error duration_ms=%.1f error=%s",
+                   endpoint, duration * 1000, error,
+                   extra={"endpoint": endpoint, "status": "error", "duration_ms": round(duration * 1000, 1),
+                          "error": error})
+
+
+def timed_get(requester, url, params, timeout, endpoint):
+    """requester.get with latency, status, size, in-flight and quota metrics; the url is logged without params (they hold the api key)"""
+    in_flight = UPSTREAM_IN_FLIGHT.labels(endpoint)
+    in_flight.inc()
+    start = time.monotonic()
+    try:
+        response = requester.get(url, params=params, timeout=timeout)
+    except Exception as e:
+        observe_error(endpoint, e, time.monotonic() - start)
+        raise
+    finally:
+        in_flight.dec()
+    observe_response(endpoint, response, time.monotonic() - start)
+    return response
+
+
+# ---------- CLIENT ----------
+
+def is_failure_status(status_code):
+    """server errors and throttling count against the upstream, 4xx answers like 404 don't"""
+    return status_code >= 500 or status_code == 429
+
+
+class UpstreamClient:
+    """
+    per-app wrapper around requester.get adding a timeout, a circuit breaker
+    and, when a quota manager is given, rate limiting and point budgeting
+    """
+
+    def __init__(self, config, quota=None, sleep=time.sleep):
+        self.timeout = config.get("UPSTREAM_TIMEOUT", 5)
+        self.quota = quota
+        self._sleep = sleep
+        self.retry = RetryPolicy(
+            max_attempts=config.get("UPSTREAM_RETRY_ATTEMPTS", 3),
+            base_delay=config.get("UPSTREAM_RETRY_BASE_DELAY", 0.2),
+            max_delay=config.get("UPSTREAM_RETRY_MAX_DELAY", 2.0),
+        )
+        self.hedged_endpoints = config.get("UPSTREAM_HEDGE_ENDPOINTS", ("search", "details"))
+        self.hedger = None
+        if config.get("UPSTREAM_HEDGING", False):
+            self.hedger = Hedger(
+                max_rate=config.get("UPSTREAM_HEDGE_MAX_RATE", 0.05),
+                quantile=config.get("UPSTREAM_HEDGE_QUANTILE", 0.95),
+                min_samples=config.get("UPSTREAM_HEDGE_MIN_SAMPLES", 20),
+            )
+        self.breaker = CircuitBreaker(
+            window=config.get("CIRCUIT_BREAKER_WINDOW", 20),
+            min_calls=config.get("CIRCUIT_BREAKER_MIN_CALLS", 5),
+            error_rate=config.get("CIRCUIT_BREAKER_ERROR_RATE", 0.5),
+            slow_call_seconds=config.get("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", 3.0),
+            slow_call_rate=config.get("CIRCUIT_BREAKER_SLOW_CALL_RATE", 0.5),
+            open_seconds=config.get("CIRCUIT_BREAKER_OPEN_SECONDS", 30),
+        )
+
+    @property
+    def degraded(self):
+        return self.breaker.state == CircuitBreaker.OPEN
+
+    def get(self, url, params=None, requester=requests, endpoint="search", priority=PRIORITY_USER, deadline=None):
+        """
+        GET with retries on connection errors and transient statuses
+        every attempt goes through the breaker and the quota, and waits count against the deadline
+        """
+        attempt = 1
+        while True:
+            try:
+                response = self._attempt(url, params, requester, endpoint, priority, deadline)
+            except (UpstreamUnavailable, DeadlineExceeded):
+                raise
+            except UpstreamError:
+                if not self.retry.can_retry("GET", attempt):
+                    raise
+                delay, reason = self.retry.backoff(attempt), "error"
+                if deadline is not None and delay >= deadline.remaining():
+                    raise
+            else:
+                if response.status_code not in self.retry.RETRY_STATUSES or not self.retry.can_retry("GET", attempt):
+                    return response
+                delay = self.retry.delay(attempt, response.headers.get("Retry-After"))
+                reason = str(response.status_code)
+                if delay is None or (deadline is not None and delay >= deadline.remaining()):
+                    return response
+
+            UPSTREAM_RETRIES.labels(endpoint=endpoint, reason=reason).inc()
+            self._sleep(delay)
+            attempt += 1
+
+    def _attempt(self, url, params, requester, endpoint, priority, deadline):
+        if self.degraded:
+            raise UpstreamUnavailable(f"circuit breaker is open, not calling {url}")
+        if deadline is not None and deadline.expired:
+            raise DeadlineExceeded(f"no time left to call {url}")
+        if self.quota is not None:
+            max_wait = None if deadline is None else min(self.quota.max_wait, deadline.remaining())
+            self.quota.acquire(endpoint, priority, max_wait=max_wait)
+        if not self.breaker.allow_request():
+            raise UpstreamUnavailable(f"circuit breaker is open, not calling {url}")
+
+        start = time.monotonic()
+        success = False
+        try:
+            response = self._send(url, params, requester, request_timeout(self.timeout, deadline), endpoint, priority)
+            success = not is_failure_status(response.status_code)
+            return response
+        except requests.RequestException as e:
+            if deadline is not None and deadline.expired:
+                # our own budget cut the call short, that says nothing about upstream health: no outcome
+                success = None
+                raise DeadlineExceeded(f"request to {url} ran out of time") from e
+            raise UpstreamError(f"request to {url} failed: {redact(e)}") from e
+        finally:
+            if success is None:
+                self.breaker.release()
+            else:
+                self.breaker.record(success, time.monotonic() - start)
+
+    def _send(self, url, params, requester, timeout, endpoint, priority):
+        """one GET, hedged with a duplicate if it outlives the endpoint's usual latency"""
+        if self.hedger is None or endpoint not in self.hedged_endpoints:
+            return timed_get(requester, url, params, timeout, endpoint)
+
+        start = time.monotonic()
+        delay = self.hedger.hedge_delay(endpoint)
+        if delay is None or delay >= timeout:
+            response = timed_get(requester, url, params, timeout, endpoint)
+            self.hedger.record(endpoint, time.monotonic() - start, False)
+            return response
+
+        primary = self.hedger.executor.submit(timed_get, requester, url, params, timeout, endpoint)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.hedger.allow_hedge() or not self._take_hedge_quota(endpoint, priority):
+            response = primary.result()
+            self.hedger.record(endpoint, time.monotonic() - start, False)
+            return response
+
+        UPSTREAM_HEDGES_FIRED.labels(endpoint=endpoint).inc()
+        hedge = self.hedger.executor.submit(timed_get, requester, url, params, timeout - delay, endpoint)
+        response, hedge_won = _first_successful(primary, hedge)
+        if hedge_won:
+            UPSTREAM_HEDGES_WON.labels(endpoint=endpoint).inc()
+        self.hedger.record(endpoint, time.monotonic() - start, True)
+        return response
+
+    def _take_hedge_quota(self, endpoint, priority):
+        """a hedge is a real upstream call, so it has to fit in the quota without waiting"""
+        if self.quota is None:
+            return True
+        try:
+            self.quota.acquire(endpoint, priority, max_wait=0)
+        except UpstreamUnavailable:
+            return False
+        return True
+
+
+def request_timeout(timeout, deadline=None):
+    """the configured timeout, cut down to whatever is left of the deadline"""
+    if deadline is None:
+        return timeout
+    return min(timeout, deadline.remaining())
+
+
+def init_upstream(app):
+    """ attaching the upstream client to the app, like the in-memory caches """
+    from .quota import QuotaManager
+
+    if not hasattr(app, "upstream"):
+        quota = QuotaManager(app.config)
+        quota.export_budget(app)
+        app.upstream = UpstreamClient(app.config, quota=quota)
+
+
+def get_upstream():
+    """returns the current app's upstream client, or None outside an app context"""
+    if has_app_context():
+        return getattr(current_app, "upstream", None)
+    return None
+
+
+def upstream_get(url, params=None, requester=requests, endpoint="search", priority=PRIORITY_USER, deadline=None):
+    """
+    sending a GET to the upstream API through the app's client
+    outside an app context (scripts, bare unit tests) the request goes straight to requester
+    """
+    client = get_upstream()
+    if client is not None:
+        return client.get(url, params=params, requester=requester, endpoint=endpoint, priority=priority, deadline=deadline)
+    if deadline is not None and deadline.expired:
+        raise DeadlineExceeded(f"no time left to call {url}")
+    try:
+        return timed_get(requester, url, params, request_timeout(5, deadline), endpoint)
+    except requests.RequestException as e:
+        raise UpstreamError(f"request to {url} failed: {redact(e)}") from e
+
+
+# ---------- DEGRADED MODE ----------
+
+def upstream_degraded():
+    """checking if the circuit breaker is open, meaning answers should come from cache only"""
+    client = get_upstream()
+    return client is not None and client.degraded
+
+
+def mark_stale():
+    """flagging the current request as served from cache while upstream is unavailable"""
+    if has_app_context():
+        g.upstream_stale = True
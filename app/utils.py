@@ -1,6 +1,11 @@
 # ---------- CACHE HELPERS  ----------
 import json
+import logging
 from .db_utils import db_connection
+from .timing import span
+from .cache_stats import cache_lookup, record_stale_serve, L1, L2, RESULTS, DETAILS, SUGGESTIONS
+
+logger = logging.getLogger(__name__)
 from typing import List, Optional, Dict, Any
 
 def get_cached_response(query: str) -> Optional[str]:
@@ -34,6 +39,11 @@ def build_cache_key(ingredients_list):
     return tuple(ingredients_list)
 
 
+def ingredients_page_key(raw_ingredients: str):
+    """ the page cache key of an ingredients param: spellings normalizing alike render the same page"""
+    return build_cache_key(normalize_ingredients(raw_ingredients))
+
+
 def matching_missing_for_recipe(user_ingredients, recipes):
     """ adding matches and missing_count to each recipe dict"""
     enriched = []
@@ -77,21 +87,34 @@ def validate_recipe_form(name: str, raw_ingredients: str, steps: list):
 
     return True, "", ingredients, instructions
 
-def get_processed_recipes(user_ingredients, sort_by, cache):
+def get_processed_recipes(user_ingredients, sort_by, cache, deadline=None):
     # I decided to import here to avoid circular imports and not create an additional file for a singlular function
     from .api_client import search_recipes 
 
     """
     retrieving, processing, and sorting recipes based on user ingredients and sort preference
+    deadline (optional) bounds the time spent upstream, partial results are returned but not cached
     """
+    from .upstream import upstream_degraded, mark_stale
+
     key = build_cache_key(user_ingredients)
-    if key in cache:
-        recipes = cache[key]
-    else:
-        api_results = search_recipes(user_ingredients)
-        recipes = matching_missing_for_recipe(user_ingredients, api_results)
-        cache[key] = recipes
-    return sort_recipes(recipes.copy(), sort_by)
+    with cache_lookup("l1", L1, RESULTS) as lookup:
+        recipes = cache.get(key)
+        if recipes is not None:
+            lookup.outcome = "hit"
+    if recipes is not None and upstream_degraded():
+        # the copy in memory can't be refreshed either, so the page says so like one served from L2
+        mark_stale()
+        record_stale_serve(L1, RESULTS)
+    if recipes is None:
+        api_results = search_recipes(user_ingredients, deadline=deadline)
+        with span("match"):
+            recipes = matching_missing_for_recipe(user_ingredients, api_results)
+        # empty answers may be negative entries with a short TTL, so they stay out of the in-memory cache
+        if recipes and not (deadline and deadline.truncated):
+            cache[key] = recipes
+    with span("sort"):
+        return sort_recipes(recipes.copy(), sort_by)
 
 def fetch_recipe_or_404(recipe_id):
     from .api_client import get_recipe_details
@@ -153,18 +176,22 @@ def process_new_recipe_form(form_data):
 
     # ---------- FOR API_CLIENT.PY----------
 
-import inflect
 import re
-from bs4 import BeautifulSoup
+from functools import lru_cache
 
-p = inflect.engine()
+@lru_cache(maxsize=None)
+def _inflect_engine():
+    # inflect takes seconds to import (typeguard instruments it), so it loads on the first normalization
+    import inflect
+    return inflect.engine()
 
+@lru_cache(maxsize=8192)
 def normalize_ingredient(ingredient: str) -> str:
     """ normalizing ingredient names for consistency"""
     ing = ingredient.strip().lower()
     if not ing:
         return ""
-    ing = p.singular_noun(ing) or ing
+    ing = _inflect_engine().singular_noun(ing) or ing
     return ing
 
 
@@ -206,6 +233,7 @@ def clean_instructions(raw_instructions: str):
     if not raw_instructions:
         return []
 
+    from bs4 import BeautifulSoup
     text = BeautifulSoup(raw_instructions, "html.parser").get_text()
     steps = re.split(r'(?:\d+\.\s*|\n+)', text)
     steps = [re.sub(r'[^\w\s,.()/-]', '', step).strip() for step in steps if step.strip()]
@@ -214,56 +242,215 @@ def clean_instructions(raw_instructions: str):
 
 def prepare_ingredient_query(user_ingredients):
     """ preparing a normalized, comma-separated ingredient string for API queries"""
-    normalized = [normalize_ingredient(i) for i in user_ingredients if i.strip()]
+    with span("normalize"):
+        normalized = [normalize_ingredient(i) for i in user_ingredients if i.strip()]
     return ",".join(normalized)
 
 import json
-def get_recipes_from_cache(ingredients_str):
-    """ retrieving cached recipes for a given ingredient query"""
-    cached = get_cached_response(ingredients_str)
+import time
+def is_negative_entry(data):
+    """ checking if a decoded cache entry is a memoized upstream failure rather than real results"""
+    return isinstance(data, dict) and data.get("negative") is True
+
+def wrap_cache_entry(payload):
+    """ serializing a cache payload together with the time it was fetched"""
+    return json.dumps({"fetched_at": time.time(), "data": payload})
+
+def unwrap_cache_entry(data, max_age=None):
+    """
+    returning the payload of a decoded cache entry, or None if it is older than max_age seconds
+    entries saved before timestamps were added are bare payloads and count as infinitely old
+    """
+    if isinstance(data, dict) and "fetched_at" in data:
+        fetched_at, payload = data["fetched_at"], data.get("data")
+    else:
+        fetched_at, payload = None, data
+    if max_age is not None and (fetched_at is None or time.time() - fetched_at > max_age):
+        return None
+    return payload
+
+def get_cache_entry_age(query):
+    """
+    seconds since the cached entry for query was fetched, None if missing, inf for untimestamped entries
+    a negative entry counts as fresh until it expires, so its backoff holds for refreshes too
+    """
+    cached = get_cached_response(query)
     if not cached:
         return None
     try:
-        return json.loads(cached)
+        data = json.loads(cached)
     except Exception:
         return None
+    if is_negative_entry(data):
+        return 0.0 if data.get("expires_at", 0) > time.time() else float("inf")
+    if isinstance(data, dict) and "fetched_at" in data:
+        return time.time() - data["fetched_at"]
+    return float("inf")
+
+def get_recipes_from_cache(ingredients_str, max_age=None):
+    """
+    retrieving cached recipes for a given ingredient query, ignoring entries older than max_age (optional)
+    a live negative entry is served as [] so failing queries don't go upstream again
+    """
+    with cache_lookup("l2", L2, RESULTS) as lookup:
+        cached = get_cached_response(ingredients_str)
+        if not cached:
+            return None
+        try:
+            data = json.loads(cached)
+        except Exception:
+            return None
+        if is_negative_entry(data):
+            # the last good answer kept by the failure is served while young enough (any age when degraded),
+            # so a failed refresh-ahead doesn't hide results that were still fresh
+            stale = unwrap_cache_entry(data["stale"], max_age) if data.get("stale") else None
+            if stale:
+                lookup.outcome = "hit"
+                return stale
+            if data.get("expires_at", 0) > time.time():
+                lookup.outcome = "negative"
+                return []
+            return None
+        recipes = unwrap_cache_entry(data, max_age)
+        if recipes is None:
+            lookup.outcome = "expired"
+        else:
+            lookup.outcome = "hit"
+            if isinstance(data, dict) and "fetched_at" in data:
+                lookup.age = time.time() - data["fetched_at"]
+        return recipes
+
+def save_negative_cache_entry(ingredients_str, status_code, config):
+    """
+    memoizing an upstream failure for a query, doubling the TTL on each consecutive failure
+    the last good answer is kept inside the entry, so an expired copy can still be served while degraded
+    returns the TTL in seconds
+    """
+    failures = 1
+    stale = None
+    previous = get_cached_response(ingredients_str)
+    if previous:
+        try:
+            data = json.loads(previous)
+        except Exception:
+            data = None
+        if is_negative_entry(data):
+            failures = data.get("failures", 0) + 1
+            stale = data.get("stale")
+        elif data is not None:
+            # bare payloads from before timestamps stay bare, unwrap_cache_entry reads both
+            stale = data
+
+    base_ttl = config.get("NEGATIVE_CACHE_TTL", 30)
+    max_ttl = config.get("NEGATIVE_CACHE_MAX_TTL", 900)
+    ttl = min(base_ttl * 2 ** (failures - 1), max_ttl)
+
+    entry = {"negative": True, "status": status_code, "failures": failures, "expires_at": time.time() + ttl}
+    if stale is not None:
+        entry["stale"] = stale
+    save_cached_response(ingredients_str, json.dumps(entry))
+    return ttl
 
 def build_api_params(ingredients_str, limit, config):
     """ building parameters for API request"""
     return {"ingredients": ingredients_str, "number": limit*2, "apiKey": config["API_KEY"]}
 
-import requests
-def fetch_recipes_from_api(ingredients_str, limit, config, requester=requests):
-    """ fetching recipes from external API"""
-    response = requester.get(config["API_URL"], params={"ingredients": ingredients_str, "number": limit*2, "apiKey": config["API_KEY"]})
+from .lazy import lazy_import
+from .page_cache import invalidate_pages
+requests = lazy_import("requests")
+from .upstream import UpstreamError, DeadlineExceeded, upstream_get, PRIORITY_USER, PRIORITY_DETAIL, PRIORITY_BACKGROUND
+def fetch_recipes_from_api(ingredients_str, limit, config, requester=requests, deadline=None, priority=PRIORITY_USER,
+                           on_details=None):
+    """
+    fetching recipes from external API
+    raises UpstreamError when the search call fails so callers can tell it apart from an empty result
+    once the deadline (optional) runs out, remaining recipes are built without details and deadline.truncated is set
+    on_details (optional) is called with (recipe_id, details) for every details answer, so they can be cached
+    """
+    details_priority = PRIORITY_BACKGROUND if priority == PRIORITY_BACKGROUND else PRIORITY_DETAIL
+    with span("upstream_search") as s:
+        response = upstream_get(config["API_URL"], {"ingredients": ingredients_str, "number": limit*2, "apiKey": config["API_KEY"]}, requester,
+                                priority=priority, deadline=deadline)
+        s.outcome = response.status_code
     if response.status_code != 200:
-        return []
+        raise UpstreamError(f"recipe search returned {response.status_code}", response.status_code)
 
     recipes_data = response.json()
     recipes = []
     for recipe in recipes_data:
         recipe_id = recipe["id"]
-        details_resp = requester.get(config["RECIPE_DETAILS_URL"].format(id=recipe_id), params={"apiKey": config["API_KEY"]})
-        details = details_resp.json() if details_resp.status_code == 200 else None
+        details = None
+        if not (deadline and deadline.truncated):
+            with span("upstream_details") as s:
+                try:
+                    details_resp = upstream_get(config["RECIPE_DETAILS_URL"].format(id=recipe_id), {"apiKey": config["API_KEY"]}, requester,
+                                                endpoint="details", priority=details_priority, deadline=deadline)
+                    s.outcome = details_resp.status_code
+                    details = details_resp.json() if details_resp.status_code == 200 else None
+                    if details and on_details is not None:
+                        on_details(recipe_id, details)
+                except DeadlineExceeded:
+                    s.outcome = "deadline"
+                    deadline.truncated = True
+                except UpstreamError:
+                    s.outcome = "error"
+                    details = None
         recipes.append(build_recipe_dict(recipe, details))
     return recipes
 
 def save_recipes_to_cache(ingredients_str, recipes):
     """ saving fetched recipes to cache"""
-    save_cached_response(ingredients_str, json.dumps(recipes))
+    save_cached_response(ingredients_str, wrap_cache_entry(recipes))
+    invalidate_pages(ingredients_str)
 
-def fetch_recipe_details(recipe_id, config, requester=requests):
+def fetch_recipe_details(recipe_id, config, requester=requests, priority=PRIORITY_DETAIL):
     """
     fetching full details for a single recipe by ID
     """
-    response = requester.get(
-        config["RECIPE_DETAILS_URL"].format(id=recipe_id),
-        params={"apiKey": config["API_KEY"]}
-    )
+    with span("upstream_details") as s:
+        try:
+            response = upstream_get(
+                config["RECIPE_DETAILS_URL"].format(id=recipe_id),
+                {"apiKey": config["API_KEY"]},
+                requester,
+                endpoint="details",
+                priority=priority
+            )
+        except UpstreamError as e:
+            s.outcome = "error"
+            logger.warning("recipe details fetch failed recipe_id=%s error=%s", recipe_id, e,
+                           extra={"recipe_id": recipe_id, "status": e.status_code})
+            return None
+        s.outcome = response.status_code
     if response.status_code != 200:
         return None
     return response.json()
 
+def get_recipe_details_from_cache(recipe_id, max_age=None):
+    """
+    retrieving raw recipe details cached by a previous fetch
+    entries older than max_age seconds are ignored, max_age=None accepts any age
+    """
+    with cache_lookup("detail_cache", L2, DETAILS) as lookup:
+        cached = get_cached_response(f"recipe_details:{recipe_id}")
+        if not cached:
+            return None
+        try:
+            entry = json.loads(cached)
+        except Exception:
+            return None
+        age = time.time() - entry.get("fetched_at", 0)
+        if max_age is not None and age > max_age:
+            lookup.outcome = "expired"
+            return None
+        lookup.outcome, lookup.age = "hit", age
+        return entry.get("details")
+
+def save_recipe_details_to_cache(recipe_id, details):
+    """ saving raw recipe details with the time they were fetched"""
+    save_cached_response(f"recipe_details:{recipe_id}", json.dumps({"fetched_at": time.time(), "details": details}))
+    invalidate_pages(f"recipe_details:{recipe_id}")
+
 def build_recipe_details(recipe_id, details):
     """ building recipe details dict from API response"""
     if not details:
@@ -284,25 +471,51 @@ def build_recipe_details(recipe_id, details):
         "sourceUrl": details.get("sourceUrl", "")
     }
 
-def fetch_ingredient_suggestions_from_api(query, config, requester=requests):
+def fetch_ingredient_suggestions_from_api(query, config, requester=requests, priority=PRIORITY_USER):
     """
     fetching ingredient suggestions based on user input from external API
     """
-    try:
-        response = requester.get(
-            config["INGREDIENT_AUTOCOMPLETE_URL"],
-            params={"query": query, "number": 10, "apiKey": config["API_KEY"]}
-        )
-        if response.status_code == 200:
-            return [normalize_ingredient(item["name"]) for item in response.json()]
-    except Exception as e:
-        print(f"Error fetching ingredient suggestions from API: {e}")
+    with span("upstream_suggestions") as s:
+        try:
+            response = upstream_get(
+                config["INGREDIENT_AUTOCOMPLETE_URL"],
+                {"query": query, "number": 10, "apiKey": config["API_KEY"]},
+                requester,
+                endpoint="autocomplete",
+                priority=priority
+            )
+            s.outcome = response.status_code
+            if response.status_code == 200:
+                return [normalize_ingredient(item["name"]) for item in response.json()]
+        except Exception as e:
+            s.outcome = "error"
+            logger.warning("ingredient suggestions fetch failed query=%r error=%s", query, e,
+                           extra={"query": query})
     return []
 
 def get_ingredient_suggestions_from_cache(query, ingredient_cache):
     """ retrieving ingredient suggestions from in-memory cache"""
     return ingredient_cache.get(query)
 
+def get_ingredient_suggestions_from_db_cache(query, max_age=None):
+    """ retrieving ingredient suggestions saved in the db cache by a previous API call, ignoring entries older than max_age"""
+    with cache_lookup("suggestions_cache", L2, SUGGESTIONS) as lookup:
+        cached = get_cached_response(f"ingredient_suggestions:{query}")
+        if not cached:
+            return None
+        try:
+            data = json.loads(cached)
+            suggestions = unwrap_cache_entry(data, max_age)
+        except Exception:
+            return None
+        if suggestions is None:
+            lookup.outcome = "expired"
+        else:
+            lookup.outcome = "hit"
+            if isinstance(data, dict) and "fetched_at" in data:
+                lookup.age = time.time() - data["fetched_at"]
+        return suggestions
+
 def save_ingredient_suggestions_to_cache(query, suggestions, ingredient_cache):
     """ saving ingredient suggestions to in-memory cache"""
     ingredient_cache[query] = suggestions
@@ -311,12 +524,11 @@ def save_ingredient_suggestions_to_cache(query, suggestions, ingredient_cache):
     # ----------__INIT__.PY----------
 
 def init_cache(app):
-    """ initializing in-memory caches for recipes and ingredients """
-    caches = {
-        "recipe_cache": {},
-        "ingredient_cache": {}
-    }
+    """ initializing in-memory caches for recipes and ingredients, per worker or shared by all workers on the node """
+    shared = app.config.get("L1_CACHE_BACKEND") == "shared"
+    if shared:
+        from .shared_cache import create_shared_cache
 
-    for name, cache in caches.items():
+    for name in ("recipe_cache", "ingredient_cache"):
         if not hasattr(app, name):
-            setattr(app, name, cache)
+            setattr(app, name, create_shared_cache(app.config, name) if shared else {})
@@ -0,0 +1,267 @@
+# ---------- POPULARITY-DRIVEN CACHE WARMING ----------
+import logging
+import threading
+import time
+from collections import Counter
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .db_utils import db_connection
+
+logger = logging.getLogger(__name__)
+
+RESULTS = "results"
+SUGGESTIONS = "suggestions"
+
+# upstream answers meaning the quota is spent (402 daily points, 429 rate limit): no other key will get through
+QUOTA_STATUSES = (402, 429)
+
+
+class QueryStats:
+    """
+    counts how often each /results and /ingredient_suggestions key is requested
+    hits are buffered in memory and flushed to the shared sqlite db in batches,
+    so the hot path only pays for a dict update
+    """
+
+    def __init__(self, flush_every=100, flush_seconds=30, clock=time.time):
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._clock = clock
+        self._pending = Counter()
+        self._last_flush = clock()
+        self._lock = threading.Lock()
+
+    def record(self, namespace, key):
+        if not key:
+            return
+        with self._lock:
+            self._pending[(namespace, key)] += 1
+            due = sum(self._pending.values()) >= self.flush_every or self._clock() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = self._clock()
+        if not pending:
+            return
+        now = self._clock()
+        with db_connection() as conn:
+            _ensure_tables(conn)
+            conn.executemany("""
+                INSERT INTO query_stats (namespace, key, hits, last_hit) VALUES (?, ?, ?, ?)
+                ON CONFLICT(namespace, key) DO UPDATE SET hits=query_stats.hits + excluded.hits, last_hit=excluded.last_hit
+            """, [(namespace, key, hits, now) for (namespace, key), hits in pending.items()])
+            conn.commit()
+
+    def top(self, namespace, limit, since=None):
+        """the most requested keys of a namespace, optionally only those requested after `since`"""
+        with db_connection() as conn:
+            _ensure_tables(conn)
+            rows = conn.execute("""
+                SELECT key FROM query_stats WHERE namespace = ? AND last_hit >= ?
+                ORDER BY hits DESC LIMIT ?
+            """, (namespace, since or 0, limit)).fetchall()
+        return [row["key"] for row in rows]
+
+
+def _ensure_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS query_stats (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            hits INTEGER NOT NULL,
+            last_hit REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scheduler_leases (
+            name TEXT PRIMARY KEY,
+            expires_at REAL NOT NULL
+        )
+    """)
+    conn.commit()
+
+
+def tracking_queries():
+    """whether the current app counts requested keys"""
+    return getattr(current_app, "query_stats", None) is not None and current_app.config.get("QUERY_STATS_ENABLED", True)
+
+
+def record_query(namespace, key):
+    """recording a request for a cache key on the current app, if it tracks query stats"""
+    if tracking_queries():
+        current_app.query_stats.record(namespace, key)
+
+
+# ---------- REFRESH ----------
+
+def refresh_key(namespace, key, config, force=False, priority=None):
+    """
+    re-fetching one popular key from upstream when its cached copy is missing or close to expiring
+    keys are stored the way routes see them and are turned into cache keys here
+    returns True if upstream was called
+    """
+    from .api_client import fetch_and_cache_recipes, fetch_and_cache_ingredient_suggestions
+    from .upstream import PRIORITY_BACKGROUND, UpstreamError, UpstreamUnavailable
+    from .utils import get_cache_entry_age, normalize_ingredient, prepare_ingredient_query, save_negative_cache_entry
+
+    priority = priority or PRIORITY_BACKGROUND
+    if namespace == RESULTS:
+        cache_key = prepare_ingredient_query(key.split(","))
+        ttl = config.get("RESULTS_CACHE_TTL", 604800)
+    else:
+        cache_key = normalize_ingredient(key)
+        ttl = config.get("SUGGESTIONS_CACHE_TTL", 2592000)
+    if not cache_key:
+        return False
+
+    db_key = cache_key if namespace == RESULTS else f"ingredient_suggestions:{cache_key}"
+    age = get_cache_entry_age(db_key)
+    if not force and age is not None and age < ttl * config.get("CACHE_REFRESH_AHEAD", 0.8):
+        return False
+
+    if namespace == RESULTS:
+        try:
+            fetch_and_cache_recipes(cache_key, 10, config, priority=priority)
+        except UpstreamUnavailable:
+            raise
+        except UpstreamError as e:
+            # memoized like a failed search, so the key backs off instead of being retried every interval
+            save_negative_cache_entry(cache_key, e.status_code, config)
+            raise
+    else:
+        fetch_and_cache_ingredient_suggestions(cache_key, config, priority=priority)
+    return True
+
+
+def refresh_popular(app, top_k=None):
+    """refreshing the top-k keys of each namespace that are about to expire, returns how many were fetched"""
+    from .upstream import UpstreamError, UpstreamUnavailable
+
+    config = app.config
+    top_k = top_k or config.get("CACHE_REFRESH_TOP_K", 50)
+    since = time.time() - config.get("CACHE_REFRESH_WINDOW", 7 * 86400)
+    refreshed = 0
+    app.query_stats.flush()
+    for namespace in (RESULTS, SUGGESTIONS):
+        for key in app.query_stats.top(namespace, top_k, since):
+            try:
+                refreshed += refresh_key(namespace, key, config)
+            except UpstreamError as e:
+                if isinstance(e, UpstreamUnavailable) or e.status_code in QUOTA_STATUSES:
+                    # quota or breaker said no: stop and let the next run pick up where this one ended
+                    logger.warning("cache refresh stopped namespace=%s key=%r error=%s", namespace, key, e,
+                                   extra={"namespace": namespace, "key": key, "status": e.status_code})
+                    return refreshed
+                # this key is broken upstream, the others may not be
+                logger.warning("cache refresh failed namespace=%s key=%r error=%s", namespace, key, e,
+                               extra={"namespace": namespace, "key": key, "status": e.status_code})
+    return refreshed
+
+
+def acquire_lease(name, seconds):
+    """taking a node-wide lease so only one worker runs a periodic job per interval"""
+    now = time.time()
+    with db_connection() as conn:
+        _ensure_tables(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT expires_at FROM scheduler_leases WHERE name = ?", (name,)).fetchone()
+        if row and row["expires_at"] > now:
+            conn.rollback()
+            return False
+        conn.execute("""
+            INSERT INTO scheduler_leases (name, expires_at) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET expires_at=excluded.expires_at
+        """, (name, now + seconds))
+        conn.commit()
+    return True
+
+
+class RefreshScheduler:
+    """
+    background thread refreshing popular keys every `interval` seconds
+    started lazily on the first request so it runs in each worker, not in a pre-fork master
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None or not self.interval:
+                return
+            self._thread = threading.Thread(target=self._run, name="cache-refresh", daemon=True)
+            self._thread.start()
+
+    @property
+    def interval(self):
+        # read at start time so tests and the CLI can switch the scheduler off after create_app
+        return self.app.config.get("CACHE_REFRESH_INTERVAL", 600)
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self):
+        try:
+            with self.app.app_context():
+                self.app.query_stats.flush()
+                if acquire_lease("cache-refresh", self.interval):
+                    refresh_popular(self.app)
+        except Exception as e:
+            from .upstream import redact
+            logger.warning("cache refresh failed error=%s", redact(e), extra={"error": redact(e)})
+
+
+# ---------- CLI ----------
+
+@click.command("warm-cache")
+@click.option("--top", "top_k", type=int, default=None, help="Refresh the N most requested keys of each kind.")
+@click.option("--file", "pantry_file", type=click.File("r"), default=None,
+              help="Replay pantry strings from a file, one comma-separated list per line.")
+@click.option("--force", is_flag=True, help="Fetch even if the cached copy is still fresh.")
+@with_appcontext
+def warm_cache_command(top_k, pantry_file, force):
+    """Warm the recipe cache from query stats or a file of pantry strings."""
+    from .upstream import PRIORITY_USER, UpstreamError
+    from .utils import normalize_ingredients
+
+    app = current_app._get_current_object()
+    fetched = 0
+    try:
+        if pantry_file is not None:
+            for line in pantry_file:
+                key = ",".join(normalize_ingredients(line))
+                if key:
+                    # an operator is waiting on this, so it runs at user priority
+                    fetched += refresh_key(RESULTS, key, app.config, force=force, priority=PRIORITY_USER)
+        else:
+            fetched = refresh_popular(app, top_k)
+    except UpstreamError as e:
+        click.echo(f"Stopped early: {e}")
+    click.echo(f"Warmed {fetched} cache entries.")
+
+
+def init_warmer(app):
+    """ attaching query stats and the refresh scheduler to the app, and registering the CLI command """
+    if not hasattr(app, "query_stats"):
+        app.query_stats = QueryStats()
+    if not hasattr(app, "cache_refresher"):
+        app.cache_refresher = RefreshScheduler(app)
+    app.cli.add_command(warm_cache_command)
+
+    @app.before_request
+    def start_cache_refresher():
+        app.cache_refresher.start()
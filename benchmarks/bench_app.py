@@ -0,0 +1,447 @@
+"""
+end-to-end load test of the real app, served by gunicorn, against a local fake Spoonacular
+
+    python benchmarks/bench_app.py [--scenario cold_miss ...] [--requests 200] [--cold-requests 40]
+                                   [--concurrency 8] [--workers 4] [--latency-ms 50] [--jitter-ms 20]
+                                   [--error-rate 0.0] [--corpus 500] [--output FILE] [--compare FILE] [--json]
+
+the fake answers findByIngredients, recipe information and ingredient autocomplete from a corpus grown out of
+cached_response.json, after --latency-ms (+/- --jitter-ms) and with --error-rate of the calls failing
+the app runs with a throwaway database, so every run starts cold and recipes.db is never touched; the upstream
+rate limit and daily budget are lifted (export UPSTREAM_RATE_PER_SECOND / DAILY_POINT_BUDGET to keep them)
+
+scenarios, run in this order
+    cold_miss     /results for ingredient sets never asked before: page cache, L1 and L2 miss, so one search
+                  plus a details call per recipe go upstream
+    warm_hit      /results for a handful of ingredient sets requested once beforehand
+    detail_page   /recipe/<id> for a pool of corpus ids; the first visit to an id is a miss, repeats are hits
+    autocomplete  /ingredient_suggestions for 1-3 letter prefixes, answered locally or upstream
+
+throughput, p50/p95/p99, status codes, upstream calls and mean Server-Timing stages per scenario are written
+to benchmarks/results/bench_app-<commit>.json; --compare OLD.json prints the change against an earlier run
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SCENARIOS = ("cold_miss", "warm_hit", "detail_page", "autocomplete")
+SERVER_TIMING = re.compile(r"([\w-]+);dur=([0-9.]+)")
+
+# the fake's ingredient vocabulary: the seed list of create_db.py plus enough others for unique queries
+INGREDIENTS = [
+    "onion", "garlic", "tomato", "chicken", "beef", "egg", "milk", "cheese", "butter", "flour", "rice",
+    "potato", "carrot", "bell pepper", "spinach", "salt", "pepper", "sugar", "pasta", "olive oil", "vinegar",
+    "basil", "oregano", "cumin", "paprika", "lemon", "lime", "ginger", "soy sauce", "honey", "yogurt",
+    "cream", "mushroom", "zucchini", "eggplant", "broccoli", "cauliflower", "pea", "corn", "bean",
+    "chickpea", "lentil", "tofu", "shrimp", "salmon", "tuna", "bacon", "sausage", "pork", "lamb", "turkey",
+    "apple", "banana", "orange", "strawberry", "blueberry", "walnut", "almond", "peanut butter", "oat",
+    "bread", "tortilla", "noodle", "coconut milk", "chili", "cilantro", "parsley", "thyme", "rosemary",
+    "cinnamon", "vanilla", "chocolate", "celery", "cucumber", "lettuce", "kale", "avocado", "feta",
+]
+STEPS = ("Chop the {}.", "Add the {} to the pan.", "Stir in the {} and simmer for 5 minutes.", "Season the {} to taste.")
+
+
+# ---------- fake spoonacular ----------
+def build_corpus(size, seed=0):
+    """recipes in spoonacular's shape: the ids, titles and images of cached_response.json, repeated and varied"""
+    with open(os.path.join(ROOT, "cached_response.json")) as f:
+        seeds = json.load(f)["results"]
+    rng = random.Random(seed)
+    corpus = {}
+    for i in range(size):
+        base = seeds[i % len(seeds)]
+        recipe_id = base["id"] if i < len(seeds) else 9_000_000 + i
+        ingredients = rng.sample(INGREDIENTS, rng.randint(5, 14))
+        corpus[recipe_id] = {
+            "id": recipe_id,
+            "title": base["title"] if i < len(seeds) else f"{base['title']} {i // len(seeds) + 1}",
+            "image": base["image"].replace(str(base["id"]), str(recipe_id)),
+            "imageType": base.get("imageType", "jpg"),
+            "ingredients": ingredients,
+            "instructions": "<ol>" + "".join(f"<li>{rng.choice(STEPS).format(i)}</li>" for i in ingredients) + "</ol>",
+            "sourceUrl": f"https://example.com/recipes/{recipe_id}",
+        }
+    return corpus
+
+
+def search_result(recipe, wanted):
+    """one entry of a findByIngredients answer for the set of ingredients asked for"""
+    used = [{"name": i} for i in recipe["ingredients"] if i in wanted]
+    missed = [{"name": i} for i in recipe["ingredients"] if i not in wanted]
+    return {
+        "id": recipe["id"], "title": recipe["title"], "image": recipe["image"], "imageType": recipe["imageType"],
+        "usedIngredientCount": len(used), "missedIngredientCount": len(missed),
+        "usedIngredients": used, "missedIngredients": missed, "unusedIngredients": [], "likes": 0,
+    }
+
+
+def recipe_information(recipe):
+    """a recipe information answer"""
+    return {
+        "id": recipe["id"], "title": recipe["title"], "image": recipe["image"], "sourceUrl": recipe["sourceUrl"],
+        "instructions": recipe["instructions"], "readyInMinutes": 30, "servings": 4,
+        "extendedIngredients": [{"name": i, "original": f"1 {i}"} for i in recipe["ingredients"]],
+    }
+
+
+class FakeSpoonacular(ThreadingHTTPServer):
+    """the three spoonacular endpoints the app calls, with injected latency and errors, plus /__stats"""
+
+    daemon_threads = True
+
+    def __init__(self, address, corpus, latency=0.05, jitter=0.02, error_rate=0.0, error_status=503, seed=0):
+        super().__init__(address, FakeHandler)
+        self.corpus = corpus
+        self.ids = sorted(corpus)
+        self.vocabulary = sorted({i for r in corpus.values() for i in r["ingredients"]})
+        self.latency, self.jitter = latency, jitter
+        self.error_rate, self.error_status = error_rate, error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+
+    def delay_and_outcome(self, endpoint):
+        """how long to wait before answering and whether to fail, drawn under the lock so runs repeat"""
+        with self.lock:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            failed = self.random.random() < self.error_rate
+            self.calls[f"{endpoint}:{self.error_status if failed else 'ok'}"] += 1
+            used = sum(self.calls.values())
+        return delay, failed, used
+
+    def search(self, params):
+        wanted = {i.strip() for i in params.get("ingredients", "").split(",") if i.strip()}
+        number = min(int(params.get("number", 10)), len(self.ids))
+        # the same query always gets the same recipes
+        picked = random.Random(",".join(sorted(wanted))).sample(self.ids, number)
+        return 200, [search_result(self.corpus[recipe_id], wanted) for recipe_id in picked]
+
+    def details(self, recipe_id):
+        recipe = self.corpus.get(recipe_id)
+        if recipe is None:
+            return 404, {"status": "failure", "code": 404, "message": "A recipe with the id could not be found."}
+        return 200, recipe_information(recipe)
+
+    def autocomplete(self, params):
+        query = params.get("query", "").strip().lower()
+        number = int(params.get("number", 10))
+        names = [w for w in self.vocabulary if w.startswith(query)][:number]
+        return 200, [{"name": n, "image": f"{n.replace(' ', '-')}.png"} for n in names]
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    DETAILS = re.compile(r"^/recipes/(\d+)/information$")
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+
+        if url.path == "/__stats":
+            with server.lock:
+                return self._send(200, dict(server.calls))
+
+        details = self.DETAILS.match(url.path)
+        if url.path == "/recipes/findByIngredients":
+            endpoint, answer = "search", lambda: server.search(params)
+        elif details:
+            endpoint, answer = "details", lambda: server.details(int(details.group(1)))
+        elif url.path == "/food/ingredients/autocomplete":
+            endpoint, answer = "autocomplete", lambda: server.autocomplete(params)
+        else:
+            return self._send(404, {"status": "failure", "code": 404, "message": "unknown endpoint"})
+
+        delay, failed, used = server.delay_and_outcome(endpoint)
+        time.sleep(delay)
+        status, body = (server.error_status, {"status": "failure", "code": server.error_status}) if failed else answer()
+        self._send(status, body, {"X-API-Quota-Request": "1", "X-API-Quota-Used": str(used), "X-API-Quota-Left": "1000000"})
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve_fake(port, corpus, options):
+    FakeSpoonacular(("127.0.0.1", port), corpus, **options).serve_forever()
+
+
+# ---------- app under test ----------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url, timeout, proc=None):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"process exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def prepare_database(path):
+    """an empty cache with the ingredient vocabulary of recipes.db (read only), as create_db.py would leave it"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS cached_responses (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT UNIQUE NOT NULL, response TEXT NOT NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS ingredients (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL)")
+    try:
+        source = sqlite3.connect(f"file:{os.path.join(ROOT, 'recipes.db')}?mode=ro", uri=True)
+        names = [row[0] for row in source.execute("SELECT name FROM ingredients")]
+        source.close()
+    except sqlite3.Error:
+        names = INGREDIENTS[:25]
+    conn.executemany("INSERT OR IGNORE INTO ingredients (name) VALUES (?)", [(n,) for n in names])
+    conn.commit()
+    conn.close()
+
+
+def start_app(tmp, port, fake_url, workers):
+    database = os.path.join(tmp, "bench.db")
+    prepare_database(database)
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), SPOONACULAR_BASE_URL=fake_url,
+               DATABASE_PATH=database, DATABASE_URL=f"sqlite:///{database}")
+    for name, value in (("UPSTREAM_RATE_PER_SECOND", "100000"), ("UPSTREAM_RATE_BURST", "100000"),
+                        ("DAILY_POINT_BUDGET", "0"), ("PREFETCH_TOP_N", "0"), ("CACHE_REFRESH_INTERVAL", "0"),
+                        ("LOG_LEVEL", "WARNING"), ("NO_PROXY", "127.0.0.1,localhost")):
+        env.setdefault(name, value)
+    log = open(os.path.join(tmp, "gunicorn.log"), "w")
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+                            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        _wait_for(f"http://127.0.0.1:{port}/health", timeout=60, proc=proc)
+    except RuntimeError:
+        proc.kill()
+        with open(log.name) as f:
+            sys.stderr.write(f.read()[-4000:])
+        raise
+    return proc
+
+
+# ---------- load ----------
+def percentile(sorted_values, q):
+    """nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))]
+
+
+def fetch(url):
+    """one request like a browser would send it; returns (status, seconds, Server-Timing stages)"""
+    request = urllib.request.Request(url, headers={"Accept-Encoding": "gzip"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            status, timing = response.status, response.headers.get("Server-Timing", "")
+    except urllib.error.HTTPError as e:
+        e.read()
+        status, timing = e.code, e.headers.get("Server-Timing", "")
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        status, timing = "connection_error", ""
+    elapsed = time.perf_counter() - started
+    stages = defaultdict(float)
+    for stage, duration in SERVER_TIMING.findall(timing):
+        stages[stage] += float(duration)
+    return status, elapsed, stages
+
+
+def run_load(urls, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(fetch, urls))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed for _, elapsed, _ in outcomes)
+    stage_totals = defaultdict(float)
+    for _, _, stages in outcomes:
+        for stage, duration in stages.items():
+            stage_totals[stage] += duration
+    return {
+        "requests": len(urls),
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(urls) / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "status": {str(k): v for k, v in sorted(Counter(status for status, _, _ in outcomes).items(), key=str)},
+        "server_timing_ms_mean": {stage: round(total / len(urls), 2) for stage, total in sorted(stage_totals.items())},
+    }
+
+
+def _ingredient_sets(rng, count, seen):
+    sets = []
+    while len(sets) < count:
+        chosen = ",".join(sorted(rng.sample(INGREDIENTS, rng.randint(2, 4))))
+        if chosen not in seen:
+            seen.add(chosen)
+            sets.append(chosen)
+    return sets
+
+
+def scenario_urls(name, base, corpus, count, rng, seen):
+    """(priming urls, timed urls) of a scenario"""
+    if name == "cold_miss":
+        return [], [f"{base}/results?ingredients={urllib.parse.quote(s)}" for s in _ingredient_sets(rng, count, seen)]
+    if name == "warm_hit":
+        hot = [f"{base}/results?ingredients={urllib.parse.quote(s)}" for s in _ingredient_sets(rng, 10, seen)]
+        return hot, [rng.choice(hot) for _ in range(count)]
+    if name == "detail_page":
+        pool = rng.sample(sorted(corpus), min(50, len(corpus)))
+        return [], [f"{base}/recipe/{rng.choice(pool)}" for _ in range(count)]
+    if name == "autocomplete":
+        words = sorted({i for r in corpus.values() for i in r["ingredients"]})
+        prefixes = [rng.choice(words)[:rng.randint(1, 3)] for _ in range(count)]
+        return [], [f"{base}/ingredient_suggestions?query={urllib.parse.quote(p)}" for p in prefixes]
+    raise ValueError(f"unknown scenario {name}")
+
+
+def upstream_calls(fake_url):
+    with urllib.request.urlopen(f"{fake_url}/__stats", timeout=10) as response:
+        return Counter(json.load(response))
+
+
+def run(args):
+    corpus = build_corpus(args.corpus, seed=args.seed)
+    fake_port, app_port = _free_port(), _free_port()
+    fake_url, base = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+    options = {"latency": args.latency_ms / 1000, "jitter": args.jitter_ms / 1000, "error_rate": args.error_rate,
+               "error_status": args.error_status, "seed": args.seed}
+
+    # the fake gets its own process so its work doesn't skew the client's timings
+    fake = multiprocessing.get_context("fork").Process(target=_serve_fake, args=(fake_port, corpus, options), daemon=True)
+    fake.start()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            _wait_for(f"{fake_url}/__stats", timeout=10)
+            app = start_app(tmp, app_port, fake_url, args.workers)
+            try:
+                rng, seen = random.Random(args.seed), set()
+                for name in args.scenario:
+                    count = args.cold_requests if name == "cold_miss" else args.requests
+                    priming, timed = scenario_urls(name, base, corpus, count, rng, seen)
+                    for url in priming:
+                        fetch(url)
+                    before = upstream_calls(fake_url)
+                    results[name] = run_load(timed, args.concurrency)
+                    results[name]["upstream_calls"] = dict(sorted((upstream_calls(fake_url) - before).items()))
+            finally:
+                app.send_signal(signal.SIGTERM)
+                app.wait(timeout=30)
+        finally:
+            fake.terminate()
+            fake.join()
+    return results
+
+
+# ---------- reporting ----------
+def _commit():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD", "--", "app"], cwd=ROOT).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{sha}-dirty" if dirty else sha
+
+
+def _change(old, new):
+    if not old:
+        return ""
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def print_report(report, baseline=None):
+    print(f"commit {report['commit']}  workers {report['options']['workers']}  concurrency {report['options']['concurrency']}  "
+          f"upstream {report['options']['latency_ms']}+/-{report['options']['jitter_ms']} ms, {report['options']['error_rate']:.0%} errors")
+    print(f"{'scenario':<13} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  upstream calls / status")
+    for name, r in report["scenarios"].items():
+        calls = sum(r["upstream_calls"].values())
+        print(f"{name:<13} {r['throughput_rps']:>8.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}  {calls} / {r['status']}")
+        old = (baseline or {}).get("scenarios", {}).get(name)
+        if old:
+            print(f"{'  change':<13} {_change(old['throughput_rps'], r['throughput_rps']):>8} "
+                  f"{_change(old['p50_ms'], r['p50_ms']):>9} {_change(old['p95_ms'], r['p95_ms']):>9} {_change(old['p99_ms'], r['p99_ms']):>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="run only these (repeatable)")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("--cold-requests", type=int, default=40, help="timed requests for cold_miss, each ~21 upstream calls")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--corpus", type=int, default=500, help="recipes known to the fake")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file (default benchmarks/results/bench_app-<commit>.json)")
+    parser.add_argument("--compare", help="an earlier results file to compare against")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+    args.scenario = [s for s in SCENARIOS if s in (args.scenario or SCENARIOS)]
+
+    report = {
+        "benchmark": "bench_app",
+        "commit": _commit(),
+        "created_at": time.time(),
+        "options": {"workers": args.workers, "concurrency": args.concurrency, "requests": args.requests,
+                    "cold_requests": args.cold_requests, "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                    "error_rate": args.error_rate, "error_status": args.error_status, "corpus": args.corpus, "seed": args.seed},
+        "scenarios": run(args),
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_app-{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, baseline)
+        print(f"saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+measures gunicorn worker boot time and memory with and without --preload
+
+    python benchmarks/bench_boot.py [--workers 4] [--json]
+
+boot time is what each worker logs from fork to ready (see gunicorn.conf.py)
+RSS counts every page a worker maps; PSS splits shared copy-on-write pages between the processes
+sharing them, so it is the number that drops when preloading works (linux only, /proc/<pid>/smaps_rollup)
+"""
+import argparse
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOOTED = re.compile(r"worker (\d+) booted in ([0-9.]+)s")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _memory_kb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                fields[parts[0][:-1].lower()] = int(parts[1])
+    return fields
+
+
+def run(preload, workers, timeout=60):
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), PRELOAD_APP="true" if preload else "false")
+    env.pop("SHELFCHEF_PRELOAD", None)
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=ROOT, env=env, stderr=subprocess.PIPE, text=True,
+    )
+    boots = {}
+    try:
+        while len(boots) < workers:
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError("gunicorn did not boot in time")
+            line = proc.stderr.readline()
+            if not line:
+                raise RuntimeError(f"gunicorn exited with {proc.wait()}")
+            match = BOOTED.search(line)
+            if match:
+                boots[int(match.group(1))] = float(match.group(2))
+        ready = time.perf_counter() - started
+        urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=10).read()
+
+        memory = {pid: _memory_kb(pid) for pid in boots}
+        master = _memory_kb(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+    return {
+        "preload": preload,
+        "workers": workers,
+        "time_to_all_ready_s": round(ready, 3),
+        "worker_boot_s_mean": round(sum(boots.values()) / workers, 3),
+        "worker_rss_kb_mean": sum(m["rss"] for m in memory.values()) // workers,
+        "worker_pss_kb_mean": sum(m["pss"] for m in memory.values()) // workers,
+        "master_rss_kb": master["rss"],
+        "total_pss_kb": master["pss"] + sum(m["pss"] for m in memory.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    results = [run(False, args.workers), run(True, args.workers)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'':>10} {'all ready':>10} {'boot/worker':>12} {'RSS/worker':>11} {'PSS/worker':>11} {'total PSS':>10}")
+    for r in results:
+        print(f"{'preload' if r['preload'] else 'no preload':>10} {r['time_to_all_ready_s']:>9.2f}s "
+              f"{r['worker_boot_s_mean']:>11.3f}s {r['worker_rss_kb_mean'] // 1024:>8} MB "
+              f"{r['worker_pss_kb_mean'] // 1024:>8} MB {r['total_pss_kb'] // 1024:>7} MB")
+
+
+if __name__ == "__main__":
+    main()
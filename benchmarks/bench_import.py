@@ -0,0 +1,81 @@
+"""
+cold import time of the `app` package, measured with `python -X importtime`, checked against a budget
+
+    python benchmarks/bench_import.py [--runs 5] [--budget-ms 800] [--json]
+
+every run is a fresh interpreter; the median of the cumulative time of `app` is compared to the budget
+and the script exits with status 1 when it is over, so CI can gate on it
+IMPORT_BUDGET_MS overrides the default budget (slow CI machines)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", 800))
+
+
+def _parse(stderr):
+    """importtime lines look like `import time:  self [us] | cumulative | name`, nested names are indented"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us), len(name) - len(name.lstrip())))
+    return rows
+
+
+def measure(module="app"):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = _parse(result.stderr)
+    total_us = next(cumulative for name, _, cumulative, _ in reversed(rows) if name == module)
+    # biggest top-level packages pulled in, by cumulative time
+    packages = {}
+    for name, _, cumulative, _ in rows:
+        top = name.split(".")[0]
+        if top != module:
+            packages[top] = max(packages.get(top, 0), cumulative)
+    return total_us / 1000, packages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    totals, packages = [], {}
+    for _ in range(args.runs):
+        total_ms, run_packages = measure()
+        totals.append(total_ms)
+        for name, us in run_packages.items():
+            packages.setdefault(name, []).append(us)
+    median_ms = statistics.median(totals)
+    heaviest = sorted(((statistics.median(v) / 1000, k) for k, v in packages.items()), reverse=True)[:10]
+    over = median_ms > args.budget_ms
+
+    if args.json:
+        print(json.dumps({
+            "median_ms": round(median_ms, 1), "runs_ms": [round(t, 1) for t in totals],
+            "budget_ms": args.budget_ms, "over_budget": over,
+            "heaviest_ms": {name: round(ms, 1) for ms, name in heaviest},
+        }, indent=2))
+    else:
+        print(f"import app: median {median_ms:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+        for ms, name in heaviest:
+            print(f"  {name:<28} {ms:>8.1f} ms")
+        if over:
+            print("OVER BUDGET")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
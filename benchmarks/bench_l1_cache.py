@@ -0,0 +1,135 @@
+"""
+compares the L1 cache backends against the SQLite L2 for /results lookups
+
+    python benchmarks/bench_l1_cache.py [--keys 1000] [--workers 8] [--json]
+
+single process: lookups per second for a warm per-worker dict, the shared mmap cache and SQLite
+multi process: how many misses (= upstream or L2 calls) N workers pay to see the same hot keys
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.shared_cache import SharedMemoryCache  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _payload():
+    """ten recipes shaped like what get_processed_recipes keeps in the L1 cache"""
+    with open(os.path.join(ROOT, "cached_response.json")) as f:
+        results = json.load(f)["results"]
+    return [
+        {"id": r["id"], "name": r["title"], "image": r.get("image"), "ingredients": ["egg", "milk", "flour"],
+         "instructions": "", "missing_ingredients": 2, "sourceUrl": "", "matches": ["egg"], "missing_count": 2}
+        for r in results
+    ][:10]
+
+
+def _keys(n):
+    return [("egg", "milk", f"ingredient{i}") for i in range(n)]
+
+
+def _time_lookups(get, keys, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for key in keys:
+            get(key)
+    elapsed = time.perf_counter() - start
+    return rounds * len(keys) / elapsed
+
+
+def bench_single_process(tmp, n_keys, rounds):
+    payload = _payload()
+    keys = _keys(n_keys)
+
+    local = {key: payload for key in keys}
+
+    shared = SharedMemoryCache(os.path.join(tmp, "bench.cache"), size=64 * 1024 * 1024)
+    for key in keys:
+        shared[key] = payload
+
+    conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+    conn.execute("CREATE TABLE cached_responses (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT UNIQUE NOT NULL, response TEXT NOT NULL)")
+    conn.executemany("INSERT INTO cached_responses (query, response) VALUES (?, ?)",
+                     [(",".join(key), json.dumps(payload)) for key in keys])
+    conn.commit()
+
+    def sqlite_get(key):
+        row = conn.execute("SELECT response FROM cached_responses WHERE query = ?", (",".join(key),)).fetchone()
+        return json.loads(row[0])
+
+    results = {
+        "local_dict_ops": _time_lookups(local.__getitem__, keys, rounds),
+        "shared_mmap_ops": _time_lookups(shared.__getitem__, keys, rounds),
+        "sqlite_l2_ops": _time_lookups(sqlite_get, keys, rounds),
+        "local_dict_bytes_per_worker": sum(len(json.dumps(payload)) for _ in keys),
+        "shared_mmap_bytes_per_node": shared.bytes_used,
+    }
+    shared.close()
+    conn.close()
+    return results
+
+
+def _worker(path, backend, keys, misses):
+    """one simulated gunicorn worker: look every key up, fill the cache on a miss"""
+    cache = SharedMemoryCache(path, size=64 * 1024 * 1024) if backend == "shared" else {}
+    payload = _payload()
+    count = 0
+    for key in keys:
+        if key not in cache:
+            count += 1
+            cache[key] = payload
+    with misses.get_lock():
+        misses.value += count
+
+
+def bench_workers(tmp, n_keys, n_workers):
+    keys = _keys(n_keys)
+    ctx = multiprocessing.get_context("fork")
+    results = {}
+    for backend in ("local", "shared"):
+        path = os.path.join(tmp, f"workers-{backend}.cache")
+        misses = ctx.Value("i", 0)
+        # workers run one after another, like requests for the same hot keys landing on different workers
+        for _ in range(n_workers):
+            process = ctx.Process(target=_worker, args=(path, backend, keys, misses))
+            process.start()
+            process.join()
+        results[f"{backend}_misses"] = misses.value
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = bench_single_process(tmp, args.keys, args.rounds)
+        results.update(bench_workers(tmp, args.keys, args.workers))
+    results.update({"keys": args.keys, "workers": args.workers})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"lookups/s   local dict {results['local_dict_ops']:>12,.0f}")
+    print(f"            shared mmap {results['shared_mmap_ops']:>11,.0f}")
+    print(f"            sqlite L2 {results['sqlite_l2_ops']:>13,.0f}")
+    print(f"memory      local dict ~{results['local_dict_bytes_per_worker']:,} bytes per worker (json size)")
+    print(f"            shared mmap {results['shared_mmap_bytes_per_node']:,} bytes per node")
+    print(f"misses      {args.workers} workers x {args.keys} keys: local {results['local_misses']:,}, shared {results['shared_misses']:,}")
+
+
+if __name__ == "__main__":
+    main()
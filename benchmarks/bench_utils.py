@@ -0,0 +1,254 @@
+"""
+microbenchmarks of the helpers every /results and /recipe request runs, with a regression gate
+
+    python benchmarks/bench_utils.py [--sizes 10,1000,100000] [--bench build_recipe_dict ...] [--repeat 5]
+                                     [--budget 5] [--threshold 15] [--save-baseline] [--baseline FILE] [--json]
+
+inputs are generated (fixed seed) in the shapes the app sees: user spellings like " Tomatoes" and "chopped
+onions", spoonacular search and information answers from bench_app.py's corpus, my_recipes rows
+a size is the number of ingredients or recipes: per-item helpers are called once per item, list helpers once
+on the whole list; each sample loops until it takes at least 50 ms and the best of --repeat samples (fewer
+once --budget seconds are spent) is kept
+
+the run is compared with the baseline (benchmarks/results/bench_utils-baseline.json unless --baseline is
+given) and exits with status 1 when a benchmark is more than --threshold percent slower; --save-baseline
+stores this run as the new baseline. baselines are per machine, so they are kept out of git
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.storage import Recipe, _row_to_recipe  # noqa: E402
+from app.utils import (  # noqa: E402
+    build_recipe_dict, clean_instructions, format_instructions, matching_missing_for_recipe,
+    normalize_ingredient, prepare_ingredient_query, sort_recipes,
+)
+from bench_app import INGREDIENTS, RESULTS_DIR, build_corpus, recipe_information, search_result  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, "bench_utils-baseline.json")
+MIN_SAMPLE_SECONDS = 0.05
+
+
+# ---------- inputs ----------
+def ingredient_names(n, rng):
+    """ingredients as typed by users and sent by spoonacular: case, plurals, padding and modifiers vary"""
+    spellings = []
+    for name in INGREDIENTS:
+        spellings += [name, f"{name}s", name.title(), f" {name} ", f"fresh {name}", f"chopped {name}s"]
+    return [rng.choice(spellings) for _ in range(n)]
+
+
+def api_recipes(n, rng):
+    """(search entry, information answer) pairs for n recipes, as fetch_recipes_from_api gets them"""
+    wanted = set(rng.sample(INGREDIENTS, 4))
+    return [(search_result(r, wanted), recipe_information(r)) for r in build_corpus(n, seed=rng.random()).values()]
+
+
+def recipe_rows(n, rng):
+    """unsaved my_recipes rows, user recipes and recipes saved from the api"""
+    rows = []
+    for i in range(n):
+        ingredients = rng.sample(INGREDIENTS, rng.randint(3, 12))
+        source = rng.choice(("user", "api"))
+        rows.append(Recipe(
+            id=i + 1, name=f"Recipe {i}", ingredients=",".join(ingredients),
+            instructions=format_instructions([f"Add the {x}." for x in ingredients]),
+            source=source, api_id=rng.randint(1, 10**6) if source == "api" else None,
+        ))
+    return rows
+
+
+# ---------- benchmarks ----------
+# name -> setup(size, rng) returning the function to time; state a run changes is reset inside it
+def _normalize_cold(size, rng):
+    names = ingredient_names(size, rng)
+
+    def run():
+        normalize_ingredient.cache_clear()
+        for name in names:
+            normalize_ingredient(name)
+    return run
+
+
+def _normalize_warm(size, rng):
+    names = ingredient_names(size, rng)
+
+    def run():
+        for name in names:
+            normalize_ingredient(name)
+    return run
+
+
+def _prepare_query(size, rng):
+    names = ingredient_names(size, rng)
+    return lambda: prepare_ingredient_query(names)
+
+
+def _build_recipe_dict(size, rng):
+    pairs = api_recipes(size, rng)
+
+    def run():
+        for recipe_data, details in pairs:
+            build_recipe_dict(recipe_data, details)
+    return run
+
+
+def _clean_instructions(size, rng):
+    instructions = [details["instructions"] for _, details in api_recipes(size, rng)]
+
+    def run():
+        for raw in instructions:
+            clean_instructions(raw)
+    return run
+
+
+def _matching_missing(size, rng):
+    recipes = [build_recipe_dict(recipe_data, details) for recipe_data, details in api_recipes(size, rng)]
+    user_ingredients = sorted(rng.sample(INGREDIENTS, 4))
+    return lambda: matching_missing_for_recipe(user_ingredients, recipes)
+
+
+def _sort(sort_by):
+    def setup(size, rng):
+        recipes = [build_recipe_dict(recipe_data, details) for recipe_data, details in api_recipes(size, rng)]
+        enriched = matching_missing_for_recipe(sorted(rng.sample(INGREDIENTS, 4)), recipes)
+        # sort_recipes sorts in place, so every run gets a copy of the unsorted list, as get_processed_recipes does
+        return lambda: sort_recipes(enriched.copy(), sort_by)
+    return setup
+
+
+def _row_to_recipe_bench(size, rng):
+    rows = recipe_rows(size, rng)
+
+    def run():
+        for row in rows:
+            _row_to_recipe(row)
+    return run
+
+
+BENCHMARKS = {
+    "normalize_ingredient[cold]": _normalize_cold,
+    "normalize_ingredient[warm]": _normalize_warm,
+    "prepare_ingredient_query": _prepare_query,
+    "build_recipe_dict": _build_recipe_dict,
+    "clean_instructions": _clean_instructions,
+    "matching_missing_for_recipe": _matching_missing,
+    "sort_recipes[weighted]": _sort("weighted"),
+    "sort_recipes[matches]": _sort("matches"),
+    "sort_recipes[missing]": _sort("missing"),
+    "_row_to_recipe": _row_to_recipe_bench,
+}
+
+
+def measure(run, repeat, budget):
+    """
+    best seconds per call over up to `repeat` samples, each looping until it takes MIN_SAMPLE_SECONDS
+    sampling stops early once `budget` seconds are spent, a slow input (100k instructions) gets a single sample
+    """
+    loops, spent, samples = 1, 0.0, []
+    while len(samples) < repeat and (not samples or spent < budget):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - start
+        spent += elapsed
+        if elapsed < MIN_SAMPLE_SECONDS and not samples:
+            loops *= 10 if elapsed < MIN_SAMPLE_SECONDS / 10 else 2
+            continue
+        samples.append(elapsed / loops)
+    return min(samples)
+
+
+def run_benchmarks(names, sizes, repeat, budget, seed):
+    results = {}
+    for name in names:
+        # imports and first-call work (inflect, bs4) happen on a tiny input, outside the numbers
+        BENCHMARKS[name](1, random.Random(seed))()
+        for size in sizes:
+            seconds = measure(BENCHMARKS[name](size, random.Random(seed)), repeat, budget)
+            results[f"{name}@{size}"] = {"name": name, "size": size, "seconds": seconds, "ns_per_item": seconds / size * 1e9}
+    return results
+
+
+def find_regressions(results, baseline, threshold):
+    """{key: percent slower} for benchmarks slower than the baseline by more than threshold percent"""
+    regressions = {}
+    for key, result in results.items():
+        old = baseline.get("results", {}).get(key)
+        if old and old["seconds"] > 0:
+            change = (result["seconds"] - old["seconds"]) / old["seconds"] * 100
+            if change > threshold:
+                regressions[key] = change
+    return regressions
+
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,100000", help="comma separated input sizes")
+    parser.add_argument("--bench", action="append", choices=list(BENCHMARKS), help="run only these (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=5.0, help="seconds of sampling per benchmark and size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCH_REGRESSION_PCT", 15)),
+                        help="percent slower than the baseline that counts as a regression")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    report = {
+        "benchmark": "bench_utils",
+        "created_at": time.time(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.processor()},
+        "results": run_benchmarks(args.bench or list(BENCHMARKS), sizes, args.repeat, args.budget, args.seed),
+    }
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = find_regressions(report["results"], baseline, args.threshold)
+    report["regressions"] = regressions
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        if baseline and baseline.get("machine") != report["machine"]:
+            print("note: the baseline was recorded on another machine or python, changes may not mean much")
+        print(f"{'benchmark':<30} {'size':>7} {'per call':>11} {'per item':>10} {'vs baseline':>12}")
+        for key, r in report["results"].items():
+            old = baseline.get("results", {}).get(key)
+            change = f"{(r['seconds'] - old['seconds']) / old['seconds'] * 100:+.1f}%" if old else ""
+            flag = "  REGRESSION" if key in regressions else ""
+            print(f"{r['name']:<30} {r['size']:>7} {_format_time(r['seconds']):>11} {r['ns_per_item']:>8.0f}ns {change:>12}{flag}")
+        if args.save_baseline:
+            print(f"baseline saved to {args.baseline}")
+        elif not baseline:
+            print(f"no baseline at {args.baseline}, run with --save-baseline to record one")
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) more than {args.threshold:g}% slower than the baseline", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
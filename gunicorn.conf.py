@@ -0,0 +1,22 @@
+# gunicorn settings, used by the Dockerfile: gunicorn -c gunicorn.conf.py main:app
+import os
+import time
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+
+# load the app once in the master and fork workers from it: imports, vocabulary and warmed caches
+# are shared copy-on-write instead of being rebuilt by every worker (PRELOAD_APP=false to opt out)
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+if preload_app:
+    os.environ["SHELFCHEF_PRELOAD"] = "1"
+
+
+def post_fork(server, worker):
+    worker.boot_started = time.perf_counter()
+
+
+def post_worker_init(worker):
+    # parsed by benchmarks/bench_boot.py
+    worker.log.info("worker %s booted in %.3fs", worker.pid, time.perf_counter() - worker.boot_started)
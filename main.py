@@ -1,7 +1,8 @@
 from app import create_app
 import os
 
-app = create_app()
+# gunicorn.conf.py sets SHELFCHEF_PRELOAD when the app is loaded once in the master process
+app = create_app(preload=os.environ.get("SHELFCHEF_PRELOAD") == "1")
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
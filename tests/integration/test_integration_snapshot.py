@@ -0,0 +1,101 @@
+import sqlite3
+import pytest
+from app import create_app
+from app import snapshot
+from app.snapshot import export_snapshot, import_snapshot
+
+
+def _make_app(db_path):
+    app = create_app(testing=True)
+    app.config["DATABASE_PATH"] = str(db_path)
+    return app
+
+
+@pytest.fixture
+def source(tmp_path):
+    db_path = tmp_path / "source.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE cached_responses (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT UNIQUE NOT NULL, response TEXT NOT NULL)")
+    conn.execute("CREATE TABLE ingredients (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL)")
+    conn.executemany("INSERT INTO cached_responses (query, response) VALUES (?, ?)", [
+        ("egg,milk", '{"fetched_at": 1, "data": [{"id": 1}]}'),
+        ("recipe_details:1", '{"fetched_at": 1, "details": {"id": 1}}'),
+        ("ingredient_suggestions:tom", '{"fetched_at": 1, "data": [{"name": "tomato"}]}'),
+    ])
+    conn.executemany("INSERT INTO ingredients (name) VALUES (?)", [("egg",), ("milk",)])
+    conn.commit()
+    conn.close()
+    return _make_app(db_path)
+
+
+def _rows(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("name", ["cache.jsonl", "cache.jsonl.gz"])
+def test_snapshot_round_trip_into_empty_db(source, tmp_path, name):
+    path = tmp_path / name
+    with source.app_context():
+        assert export_snapshot(path) == 5
+
+    target_db = tmp_path / "target.db"
+    with _make_app(target_db).app_context():
+        assert import_snapshot(path) == 5
+
+    assert _rows(target_db, "SELECT query, response FROM cached_responses ORDER BY id") == \
+        _rows(tmp_path / "source.db", "SELECT query, response FROM cached_responses ORDER BY id")
+    assert _rows(target_db, "SELECT name FROM ingredients ORDER BY id") == [("egg",), ("milk",)]
+
+def test_import_keeps_existing_entries_when_asked(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "BATCH_SIZE", 2)  # several batches, still one transaction
+    path = tmp_path / "cache.jsonl"
+    with source.app_context():
+        export_snapshot(path)
+
+    target_db = tmp_path / "target.db"
+    conn = sqlite3.connect(target_db)
+    conn.execute("CREATE TABLE cached_responses (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT UNIQUE NOT NULL, response TEXT NOT NULL)")
+    conn.execute("INSERT INTO cached_responses (query, response) VALUES ('egg,milk', 'local')")
+    conn.commit()
+    conn.close()
+
+    with _make_app(target_db).app_context():
+        import_snapshot(path, overwrite=False)
+    assert _rows(target_db, "SELECT response FROM cached_responses WHERE query = 'egg,milk'") == [("local",)]
+
+    with _make_app(target_db).app_context():
+        import_snapshot(path)
+    assert _rows(target_db, "SELECT response FROM cached_responses WHERE query = 'egg,milk'") != [("local",)]
+
+def test_import_rolls_back_on_bad_snapshot(source, tmp_path):
+    path = tmp_path / "cache.jsonl"
+    with source.app_context():
+        export_snapshot(path)
+    with open(path, "a") as f:
+        f.write("not json\n")
+
+    target_db = tmp_path / "target.db"
+    with _make_app(target_db).app_context():
+        with pytest.raises(ValueError):
+            import_snapshot(path)
+    assert _rows(target_db, "SELECT name FROM sqlite_master WHERE name = 'cached_responses'") == []
+
+def test_import_rejects_files_without_header(tmp_path):
+    path = tmp_path / "cache.jsonl"
+    path.write_text('["c", "egg", "[]"]\n')
+    with _make_app(tmp_path / "target.db").app_context():
+        with pytest.raises(ValueError):
+            import_snapshot(path)
+
+def test_cli_commands(source, tmp_path):
+    path = tmp_path / "cache.jsonl.gz"
+    result = source.test_cli_runner().invoke(args=["cache-export", str(path)])
+    assert "Exported 5 rows" in result.output
+
+    target = _make_app(tmp_path / "target.db")
+    result = target.test_cli_runner().invoke(args=["cache-import", str(path)])
+    assert "Imported 5 rows" in result.output
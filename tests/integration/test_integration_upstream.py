@@ -0,0 +1,260 @@
+"""
+Integration tests for the upstream circuit breaker and cache-only degraded mode
+The Spoonacular API is replaced with a local fake that injects faults
+"""
+import json
+import sqlite3
+import time
+import pytest
+import requests
+from app import create_app
+from app.upstream import CircuitBreaker
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+
+    def json(self):
+        return self._payload
+
+
+class FakeUpstream:
+    """fake Spoonacular answering from canned payloads, with injectable errors and latency"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail_status = None
+        self.fail_times = None
+        self.raise_error = False
+        self.latency = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(url)
+        if timeout is not None and self.latency > timeout:
+            time.sleep(timeout)
+            raise requests.Timeout("read timed out")
+        if self.latency:
+            time.sleep(self.latency)
+        if self.raise_error:
+            raise requests.ConnectionError("connection refused")
+        if self.fail_status and (self.fail_times is None or self.fail_times > 0):
+            if self.fail_times is not None:
+                self.fail_times -= 1
+            return FakeResponse(self.fail_status, headers={"Retry-After": "0"})
+        if "findByIngredients" in url:
+            return FakeResponse(200, [{"id": 1, "title": "Tomato Soup", "usedIngredients": [{"name": "tomatoes"}], "missedIngredients": []}])
+        if "autocomplete" in url:
+            return FakeResponse(200, [{"name": "tomatoes"}])
+        return FakeResponse(200, {"title": "Tomato Soup", "instructions": "Simmer.", "extendedIngredients": [{"name": "tomatoes"}]})
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch):
+    fake = FakeUpstream()
+    monkeypatch.setattr(requests, "get", fake.get)
+    return fake
+
+
+@pytest.fixture
+def app(tmp_path, fake_upstream):
+    db_path = tmp_path / "cache.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE cached_responses (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT UNIQUE NOT NULL, response TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    app = create_app(testing=True)
+    app.config["DATABASE_PATH"] = str(db_path)
+    app.config["PAGE_CACHE_ENABLED"] = False  # repeated requests here exercise the data caches underneath
+    app.upstream.breaker = CircuitBreaker(window=4, min_calls=4, slow_call_seconds=0.05, open_seconds=60)
+    app.upstream._sleep = lambda seconds: None
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def trip_breaker(app):
+    for _ in range(4):
+        app.upstream.breaker.record(False, 0.01)
+    assert app.upstream.degraded
+
+
+# ---------- breaker driven by injected faults ----------
+def test_server_errors_open_breaker(client, app, fake_upstream):
+    fake_upstream.fail_status = 503
+    for i in range(4):
+        client.get(f"/recipe/{i}")
+
+    assert app.upstream.degraded
+    calls = len(fake_upstream.calls)
+    client.get("/recipe/99")
+    assert len(fake_upstream.calls) == calls
+
+def test_connection_errors_open_breaker(client, app, fake_upstream):
+    fake_upstream.raise_error = True
+    for i in range(4):
+        client.get(f"/recipe/{i}")
+    assert app.upstream.degraded
+
+def test_slow_upstream_opens_breaker(client, app, fake_upstream):
+    fake_upstream.latency = 0.06
+    for i in range(4):
+        client.get(f"/recipe/{i}")
+    assert app.upstream.degraded
+
+
+# ---------- degraded mode ----------
+def test_results_served_from_cache_while_open(client, app, fake_upstream):
+    client.get("/results?ingredients=tomato")
+    trip_breaker(app)
+    app.recipe_cache.clear()
+    fake_upstream.calls.clear()
+
+    resp = client.get("/results?ingredients=tomato")
+    assert resp.status_code == 200
+    assert b"Tomato Soup" in resp.data
+    assert b"may be stale" in resp.data
+    assert "Warning" in resp.headers
+    assert fake_upstream.calls == []
+
+def test_results_from_memory_are_marked_stale_while_open(client, app, fake_upstream):
+    client.get("/results?ingredients=tomato")
+    trip_breaker(app)
+    fake_upstream.calls.clear()
+
+    resp = client.get("/results?ingredients=tomato")
+    assert b"Tomato Soup" in resp.data
+    assert b"may be stale" in resp.data
+    assert "Warning" in resp.headers
+    assert fake_upstream.calls == []
+
+def test_results_cache_miss_while_open(client, app, fake_upstream):
+    trip_breaker(app)
+    resp = client.get("/results?ingredients=basil")
+
+    assert resp.status_code == 200
+    assert b"No recipes found" in resp.data
+    assert b"may be stale" in resp.data
+    assert fake_upstream.calls == []
+
+def test_results_miss_while_open_is_not_negative_cached(client, app, fake_upstream):
+    trip_breaker(app)
+    client.get("/results?ingredients=basil")
+
+    with app.app_context():
+        from app.utils import get_cached_response
+        assert get_cached_response("basil") is None
+
+def test_recipe_detail_served_from_cache_while_open(client, app, fake_upstream):
+    client.get("/recipe/5")
+    trip_breaker(app)
+    fake_upstream.calls.clear()
+
+    resp = client.get("/recipe/5")
+    assert resp.status_code == 200
+    assert b"Tomato Soup" in resp.data
+    assert b"may be stale" in resp.data
+    assert fake_upstream.calls == []
+
+def test_recipe_detail_fresh_cache_skips_upstream(client, fake_upstream):
+    client.get("/recipe/5")
+    client.get("/recipe/5")
+    assert len(fake_upstream.calls) == 1
+
+def test_suggestions_served_from_db_cache_while_open(client, app, fake_upstream):
+    with app.app_context():
+        from app.utils import save_cached_response
+        save_cached_response("ingredient_suggestions:tom", json.dumps(["tomato"]))
+    trip_breaker(app)
+
+    resp = client.get("/ingredient_suggestions?query=tom")
+    assert resp.get_json() == ["tomato"]
+    assert "Warning" in resp.headers
+    assert fake_upstream.calls == []
+
+def test_healthy_upstream_has_no_stale_marker(client, fake_upstream):
+    resp = client.get("/results?ingredients=tomato")
+    assert b"Tomato Soup" in resp.data
+    assert b"may be stale" not in resp.data
+    assert "Warning" not in resp.headers
+
+
+# ---------- quota ----------
+def test_spent_budget_degrades_to_cache(client, app, fake_upstream):
+    client.get("/results?ingredients=tomato")
+    app.upstream.quota.daily_budget = 1
+    app.recipe_cache.clear()
+    fake_upstream.calls.clear()
+
+    cached = client.get("/results?ingredients=tomato")
+    assert b"Tomato Soup" in cached.data
+
+    missed = client.get("/results?ingredients=basil")
+    assert b"No recipes found" in missed.data
+    assert b"may be stale" in missed.data
+    assert fake_upstream.calls == []
+
+def test_spent_budget_serves_expired_detail_copy(client, app, fake_upstream):
+    client.get("/recipe/5")
+    app.config["DETAIL_CACHE_TTL"] = -1
+    app.upstream.quota.daily_budget = 1
+    fake_upstream.calls.clear()
+
+    resp = client.get("/recipe/5")
+    assert resp.status_code == 200
+    assert b"may be stale" in resp.data
+    assert fake_upstream.calls == []
+
+
+# ---------- deadline ----------
+def test_results_render_partial_when_deadline_hits(client, app, fake_upstream):
+    app.config["RESULTS_DEADLINE"] = 0.05
+    fake_upstream.latency = 0.03
+
+    resp = client.get("/results?ingredients=tomato")
+    assert resp.status_code == 200
+    assert b"Tomato Soup" in resp.data
+    assert b"some results may be missing" in resp.data
+    assert app.recipe_cache == {}
+    with app.app_context():
+        from app.utils import get_cached_response
+        assert get_cached_response("tomato") is None
+
+def test_results_deadline_during_search_is_not_negative_cached(client, app, fake_upstream):
+    app.config["RESULTS_DEADLINE"] = 0.01
+    fake_upstream.raise_error = True
+    fake_upstream.latency = 0.02
+
+    resp = client.get("/results?ingredients=tomato")
+    assert b"No recipes found" in resp.data
+    with app.app_context():
+        from app.utils import get_cached_response
+        assert get_cached_response("tomato") is None
+
+
+# ---------- retries ----------
+def test_transient_errors_are_retried(client, app, fake_upstream):
+    fake_upstream.fail_status = 503
+    fake_upstream.fail_times = 2
+
+    resp = client.get("/results?ingredients=tomato")
+    assert b"Tomato Soup" in resp.data
+    assert fake_upstream.fail_times == 0
+
+
+# ---------- detail prefetch ----------
+def test_results_prefetch_makes_detail_page_a_cache_hit(client, app, fake_upstream):
+    app.config["PREFETCH_TOP_N"] = 3
+    client.get("/results?ingredients=tomato").close()
+    app.prefetcher.wait_idle(timeout=5)
+    fake_upstream.calls.clear()
+
+    resp = client.get("/recipe/1")
+    assert b"Tomato Soup" in resp.data
+    assert fake_upstream.calls == []
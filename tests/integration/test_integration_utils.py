@@ -17,8 +17,10 @@ from app.utils import (
     fetch_recipe_details,
     fetch_ingredient_suggestions_from_api,
     get_ingredient_suggestions_from_cache,
-    save_ingredient_suggestions_to_cache
+    save_ingredient_suggestions_to_cache,
+    save_negative_cache_entry
 )
+from app.upstream import UpstreamError
 
 
 # ----------  db tests ---------- #
@@ -124,6 +126,50 @@ def test_save_recipes_to_cache(in_memory_db):
     result = get_recipes_from_cache("tomato,cheese")
     assert result == recipes
 
+def test_get_recipes_from_cache_real_empty_result_is_a_hit(in_memory_db):
+    save_recipes_to_cache("durian", [])
+    assert get_recipes_from_cache("durian") == []
+
+def test_get_recipes_from_cache_live_negative_entry(in_memory_db):
+    """a live negative entry is served as an empty result"""
+    save_negative_cache_entry("bad,query", 500, {})
+    assert get_recipes_from_cache("bad,query") == []
+
+def test_get_recipes_from_cache_expired_negative_entry(in_memory_db):
+    """an expired negative entry is a miss so the query goes upstream again"""
+    save_cached_response("bad,query", json.dumps({"negative": True, "failures": 1, "expires_at": 0}))
+    assert get_recipes_from_cache("bad,query") is None
+
+def test_save_negative_cache_entry_backs_off(in_memory_db):
+    config = {"NEGATIVE_CACHE_TTL": 10, "NEGATIVE_CACHE_MAX_TTL": 35}
+    ttls = [save_negative_cache_entry("bad,query", 503, config) for _ in range(4)]
+    assert ttls == [10, 20, 35, 35]
+
+    entry = json.loads(get_cached_response("bad,query"))
+    assert entry["failures"] == 4
+    assert entry["status"] == 503
+
+def test_negative_entry_keeps_the_last_good_answer(in_memory_db):
+    """a failure after a good entry expired must not leave the degraded mode with nothing to serve"""
+    save_cached_response("tomato", json.dumps({"fetched_at": 0, "data": [{"id": 1}]}))
+    save_negative_cache_entry("tomato", 500, {})
+    save_negative_cache_entry("tomato", 500, {})
+
+    assert get_recipes_from_cache("tomato", max_age=60) == []
+    assert get_recipes_from_cache("tomato") == [{"id": 1}]
+
+def test_negative_entry_serves_a_still_fresh_answer(in_memory_db):
+    """a failed refresh-ahead must not hide results younger than the caller's max_age"""
+    save_recipes_to_cache("tomato", [{"id": 1}])
+    save_negative_cache_entry("tomato", 500, {})
+
+    assert get_recipes_from_cache("tomato", max_age=60) == [{"id": 1}]
+
+def test_save_recipes_to_cache_clears_negative_entry(in_memory_db):
+    save_negative_cache_entry("tomato", 500, {})
+    save_recipes_to_cache("tomato", [{"id": 1}])
+    assert get_recipes_from_cache("tomato") == [{"id": 1}]
+
 
 # ----------  validate_recipe_form tests ----------
 def test_validate_recipe_form_all_valid():
@@ -221,6 +267,15 @@ def test_get_processed_recipes_doesnt_modify_cache():
     
     assert len(result2) == 2
 
+def test_get_processed_recipes_skips_empty_results_in_memory():
+    """empty answers may be short-lived negative entries, so they are not kept in memory"""
+    cache = {}
+    with patch("app.api_client.search_recipes", return_value=[]):
+        result = get_processed_recipes(["tomato"], "matches", cache)
+
+    assert result == []
+    assert ("tomato",) not in cache
+
 
 # ---------- fetch_recipe_or_404 tests ----------
 def test_fetch_recipe_or_404_success():
@@ -353,8 +408,9 @@ def test_fetch_recipes_from_api_failure():
     response = Mock()
     response.status_code = 500
     mock_requester.get.return_value = response
-    result = fetch_recipes_from_api("tomato", 10, config, mock_requester)
-    assert result == []
+    with pytest.raises(UpstreamError) as exc:
+        fetch_recipes_from_api("tomato", 10, config, mock_requester)
+    assert exc.value.status_code == 500
 
 def test_fetch_recipes_from_api_details_failure():
     """handling recipe details fetch failure"""
@@ -79,9 +79,52 @@ def test_search_recipes_api_call(mock_save, mock_api, mock_cache):
     mock_save.assert_called_once()
 
 
+@patch("app.api_client.get_recipes_from_cache")
+@patch("app.api_client.fetch_recipes_from_api")
+@patch("app.api_client.save_recipes_to_cache")
+def test_search_recipes_cached_empty_result_is_a_hit(mock_save, mock_api, mock_cache):
+    mock_cache.return_value = []
+    recipes = api_client.search_recipes(["durian"], config={"API_KEY": "test_key"})
+
+    assert recipes == []
+    mock_api.assert_not_called()
+
+
+@patch("app.api_client.get_recipes_from_cache")
+@patch("app.api_client.fetch_recipes_from_api")
+@patch("app.api_client.save_recipes_to_cache")
+@patch("app.api_client.save_negative_cache_entry")
+def test_search_recipes_upstream_failure_saves_negative_entry(mock_negative, mock_save, mock_api, mock_cache):
+    mock_cache.return_value = None
+    mock_api.side_effect = api_client.UpstreamError("boom", 503)
+    mock_negative.return_value = 30
+
+    mock_config = {"API_KEY": "test_key"}
+    recipes = api_client.search_recipes(["cheese"], config=mock_config)
+    assert recipes == []
+    mock_negative.assert_called_once_with("cheese", 503, mock_config)
+    mock_save.assert_not_called()
+
+
+@patch("app.api_client.get_recipes_from_cache")
+@patch("app.api_client.fetch_recipes_from_api")
+@patch("app.api_client.save_negative_cache_entry")
+def test_search_recipes_rate_limited_serves_expired_entry(mock_negative, mock_api, mock_cache):
+    from app.quota import QuotaExceeded
+    stale = [{"id": 1, "name": "Old Soup"}]
+    mock_cache.side_effect = lambda query, max_age=None: None if max_age else stale
+    mock_api.side_effect = QuotaExceeded("rate limited")
+
+    recipes = api_client.search_recipes(["soup"], config={"API_KEY": "test_key"})
+    assert recipes == stale
+    mock_negative.assert_not_called()
+
+
 # ------ get_recipe_details tests ------- #
+@patch("app.api_client.save_recipe_details_to_cache")
+@patch("app.api_client.get_recipe_details_from_cache", return_value=None)
 @patch("app.api_client.fetch_recipe_details")
-def test_get_recipe_details_success(mock_fetch):
+def test_get_recipe_details_success(mock_fetch, mock_cache, mock_save):
     mock_fetch.return_value = {
         "title": "Salad",
         "instructions": "Mix it",
@@ -97,13 +140,49 @@ def test_get_recipe_details_success(mock_fetch):
     assert result["image"] == "salad.png"  
 
 
+@patch("app.api_client.save_recipe_details_to_cache")
+@patch("app.api_client.get_recipe_details_from_cache", return_value=None)
 @patch("app.api_client.fetch_recipe_details")
-def test_get_recipe_details_failure(mock_fetch):
+def test_get_recipe_details_failure(mock_fetch, mock_cache, mock_save):
     mock_fetch.return_value = None
     mock_config = {"SPOONACULAR_API_KEY": "test_key"}
     
     result = api_client.get_recipe_details(999, config=mock_config)
     assert result is None
+    mock_save.assert_not_called()
+
+
+@patch("app.api_client.get_recipe_details_from_cache")
+@patch("app.api_client.fetch_recipe_details")
+def test_get_recipe_details_uses_fresh_cache(mock_fetch, mock_cache):
+    mock_cache.return_value = {"title": "Soup", "extendedIngredients": [{"name": "leeks"}]}
+    mock_config = {"API_KEY": "test_key", "DETAIL_CACHE_TTL": 60}
+
+    result = api_client.get_recipe_details(7, config=mock_config)
+    assert result["name"] == "Soup"
+    assert result["ingredients"] == ["leek"]
+    mock_cache.assert_called_once_with(7, 60)
+    mock_fetch.assert_not_called()
+
+
+# ------ prefetch_recipe_details tests ------- #
+@patch("app.api_client.save_recipe_details_to_cache")
+@patch("app.api_client.get_recipe_details_from_cache", return_value=None)
+@patch("app.api_client.fetch_recipe_details")
+def test_prefetch_recipe_details_fetches_at_background_priority(mock_fetch, mock_cache, mock_save):
+    mock_fetch.return_value = {"title": "Soup"}
+    mock_config = {"API_KEY": "test_key"}
+
+    assert api_client.prefetch_recipe_details(7, config=mock_config) is True
+    assert mock_fetch.call_args[1]["priority"] == api_client.PRIORITY_BACKGROUND
+    mock_save.assert_called_once_with(7, {"title": "Soup"})
+
+
+@patch("app.api_client.get_recipe_details_from_cache", return_value={"title": "Soup"})
+@patch("app.api_client.fetch_recipe_details")
+def test_prefetch_recipe_details_skips_fresh_ids(mock_fetch, mock_cache):
+    assert api_client.prefetch_recipe_details(7, config={"API_KEY": "test_key"}) is False
+    mock_fetch.assert_not_called()
 
 
 # ------ get_ingredient_suggestions tests ------- #
@@ -0,0 +1,57 @@
+import re
+import pytest
+from app import create_app
+from app.assets import AssetManifest
+
+
+@pytest.fixture
+def app():
+    return create_app(testing=True)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# ---------- manifest ----------
+def test_fingerprint_follows_file_content(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "site.css").write_text("body { color: red; }")
+    first = AssetManifest(str(tmp_path)).fingerprinted("css/site.css")
+
+    (tmp_path / "css" / "site.css").write_text("body { color: blue; }")
+    second = AssetManifest(str(tmp_path)).fingerprinted("css/site.css")
+
+    assert re.fullmatch(r"css/site\.[0-9a-f]{12}\.css", first)
+    assert first != second
+
+def test_lookup_rejects_unknown_hashes(tmp_path):
+    (tmp_path / "app.js").write_text("console.log(1)")
+    manifest = AssetManifest(str(tmp_path))
+    assert manifest.lookup("app.000000000000.js") is None
+    assert manifest.lookup(manifest.fingerprinted("app.js"))[0] == "app.js"
+
+
+# ---------- serving ----------
+def test_pages_link_fingerprinted_assets_instead_of_inline_styles(client):
+    html = client.get("/").get_data(as_text=True)
+    assert "<style>" not in html
+    assert re.search(r'href="/assets/css/shelfchef\.[0-9a-f]{12}\.css"', html)
+    assert re.search(r'src="/assets/js/ingredient_search\.[0-9a-f]{12}\.js"', html)
+
+def test_assets_are_served_immutable(app, client):
+    with app.test_request_context():
+        url = app.jinja_env.globals["asset_url"]("css/shelfchef.css")
+    resp = client.get(url)
+
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/css"
+    assert resp.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert b".page-results" in resp.data
+
+    revalidated = client.get(url, headers={"If-None-Match": resp.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+def test_unknown_asset_is_404(client):
+    assert client.get("/assets/css/shelfchef.000000000000.css").status_code == 404
@@ -0,0 +1,117 @@
+import json
+import time
+import pytest
+from unittest.mock import patch
+from app import create_app
+from app.cache_stats import stats, L1, L2, PAGE, RESULTS, DETAILS
+from app.page_cache import PageCache
+from app.shared_cache import SharedMemoryCache
+from app.utils import get_processed_recipes, get_recipes_from_cache, get_recipe_details_from_cache
+
+RECIPES = [{"id": 1, "name": "Tomato Soup", "image": None, "ingredients": ["tomato"], "missing_ingredients": 0}]
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(testing=True)
+    app.config["DATABASE_PATH"] = str(tmp_path / "stats.db")
+    with app.app_context():
+        from app.db_utils import db_connection
+        with db_connection() as conn:
+            conn.execute("CREATE TABLE cached_responses (query TEXT PRIMARY KEY, response TEXT)")
+            conn.commit()
+    stats.clear()
+    return app
+
+
+def _cache(app, key, entry):
+    from app.db_utils import db_connection
+    with app.app_context(), db_connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO cached_responses VALUES (?, ?)", (key, json.dumps(entry)))
+        conn.commit()
+
+
+# ---------- lookups ----------
+def test_l1_hits_and_misses_are_counted(app):
+    with app.app_context(), patch("app.api_client.search_recipes", return_value=RECIPES):
+        get_processed_recipes(["tomato"], "weighted", app.recipe_cache)
+        get_processed_recipes(["tomato"], "weighted", app.recipe_cache)
+
+    assert stats.snapshot()[L1][RESULTS] == {"miss": 1, "hit": 1}
+
+def test_l2_lookups_tell_expired_from_missing(app):
+    _cache(app, "tomato", {"fetched_at": time.time() - 100, "data": RECIPES})
+    _cache(app, "recipe_details:1", {"fetched_at": time.time() - 100, "details": {"title": "Soup"}})
+    with app.app_context():
+        assert get_recipes_from_cache("tomato", max_age=1000) == RECIPES
+        assert get_recipes_from_cache("tomato", max_age=10) is None
+        assert get_recipes_from_cache("rice") is None
+        assert get_recipe_details_from_cache(1) == {"title": "Soup"}
+
+    counts = stats.snapshot()[L2]
+    assert counts[RESULTS] == {"hit": 1, "expired": 1, "miss": 1}
+    assert counts[DETAILS] == {"hit": 1}
+
+
+# ---------- evictions ----------
+def test_page_cache_reports_lru_and_ttl_evictions():
+    now = [0]
+    cache = PageCache(max_entries=1, ttl=10, clock=lambda: now[0])
+    evicted = []
+    cache.on_evict = evicted.append
+
+    cache.put(("main.results", (), ()), b"a", "text/html")
+    cache.put(("main.results", (), (("ingredients", "egg"),)), b"b", "text/html")
+    now[0] = 20
+    cache.get(("main.results", (), (("ingredients", "egg"),)))
+
+    assert evicted == [("main.results", (), ()), ("main.results", (), (("ingredients", "egg"),))]
+
+def test_shared_cache_reports_entries_dropped_by_a_reset(tmp_path):
+    cache = SharedMemoryCache(str(tmp_path / "l1.cache"), size=64 * 1024, slots=8)
+    dropped = []
+    cache.on_evict = dropped.append
+    for i in range(7):  # the index is full at 0.7 * 8 slots
+        cache[f"key{i}"] = i
+
+    assert dropped == [6]
+    assert len(cache) == 1
+
+
+# ---------- endpoint ----------
+def test_cache_stats_endpoint_reports_ratios_and_sizes(app):
+    _cache(app, "tomato", {"fetched_at": time.time(), "data": RECIPES})
+    _cache(app, "recipe_details:1", {"fetched_at": time.time(), "details": {"title": "Soup"}})
+    client = app.test_client()
+    client.get("/results?ingredients=tomato")
+    client.get("/results?ingredients=tomato")
+
+    layers = client.get("/cache/stats").get_json()["layers"]
+
+    assert layers[PAGE][RESULTS]["hit_ratio"] == 0.5
+    assert layers[PAGE][RESULTS]["entries"] == 1
+    assert layers[L2][RESULTS]["hit"] == 1
+    assert layers[L2][DETAILS]["entries"] == 1
+    assert layers[L1][RESULTS]["entries"] == 1
+    assert layers[L1][RESULTS]["bytes"] > 0
+
+def test_l2_is_measured_at_most_once_per_refresh_window(app):
+    client = app.test_client()
+    with patch("app.cache_stats.l2_sizes", return_value={RESULTS: (3, 30)}) as measure:
+        client.get("/cache/stats")
+        layers = client.get("/cache/stats").get_json()["layers"]
+        app.cache_size_gauges.get(L2, RESULTS, 0)
+
+    assert measure.call_count == 1
+    assert layers[L2][RESULTS]["entries"] == 3
+
+def test_l2_bytes_are_extrapolated_from_a_sample(app):
+    from app.cache_stats import l2_sizes
+    for i in range(5):
+        _cache(app, f"ingredient{i}", {"data": "x" * 10})
+    _cache(app, "recipe_details:1", {"details": {}})
+    with app.app_context(), patch("app.cache_stats.L2_BYTES_SAMPLE", 2):
+        sizes = l2_sizes()
+
+    assert sizes[RESULTS] == (5, 5 * len(json.dumps({"data": "x" * 10})))
+    assert sizes[DETAILS] == (1, len(json.dumps({"details": {}})))
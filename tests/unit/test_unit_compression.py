@@ -0,0 +1,93 @@
+import gzip
+import pytest
+from unittest.mock import patch
+from werkzeug.http import parse_accept_header
+from app import create_app
+from app import compression
+from app.compression import choose_encoding
+
+RECIPES = [{"id": i, "name": f"Tomato Soup {i}", "image": None, "matches": ["tomato"], "missing_count": 0} for i in range(5)]
+
+
+@pytest.fixture
+def app():
+    return create_app(testing=True)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _accept(value):
+    return parse_accept_header(value)
+
+
+# ---------- negotiation ----------
+def test_choose_encoding_prefers_brotli_when_installed():
+    with patch.object(compression, "_brotli", return_value=object()):
+        assert choose_encoding(_accept("gzip, br")) == "br"
+    with patch.object(compression, "_brotli", return_value=None):
+        assert choose_encoding(_accept("gzip, br")) == "gzip"
+
+def test_choose_encoding_honours_q_zero():
+    assert choose_encoding(_accept("gzip;q=0, identity")) is None
+    assert choose_encoding(_accept("")) is None
+
+
+# ---------- middleware ----------
+def test_html_page_is_gzipped(client):
+    with patch("app.routes.get_processed_recipes", return_value=RECIPES):
+        plain = client.get("/results?ingredients=tomato")
+        resp = client.get("/results?ingredients=tomato", headers={"Accept-Encoding": "gzip"})
+
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert gzip.decompress(resp.data) == plain.data
+    assert int(resp.headers["Content-Length"]) == len(resp.data) < len(plain.data)
+
+def test_client_without_accept_encoding_gets_identity(client):
+    resp = client.get("/")
+    assert "Content-Encoding" not in resp.headers
+
+def test_small_bodies_are_not_compressed(client):
+    with patch("app.routes.get_ingredient_suggestions", return_value=["tomato"]):
+        resp = client.get("/ingredient_suggestions?query=tom", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in resp.headers
+
+def test_other_content_types_are_not_compressed(app, client):
+    @app.route("/binary")
+    def binary():
+        return app.response_class(b"\0" * 5000, mimetype="application/octet-stream")
+
+    resp = client.get("/binary", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in resp.headers
+
+def test_cached_pages_are_compressed_once(app, client):
+    with patch("app.routes.get_processed_recipes", return_value=RECIPES), \
+         patch.object(compression, "compress", wraps=compression.compress) as compress:
+        first = client.get("/results?ingredients=tomato", headers={"Accept-Encoding": "gzip"})
+        second = client.get("/results?ingredients=tomato", headers={"Accept-Encoding": "gzip"})
+
+    assert compress.call_count == 1
+    assert first.data == second.data
+    assert len(app.compressed_cache) == 1
+
+def test_compressed_page_has_a_strong_etag_per_encoding(client):
+    with patch("app.routes.get_processed_recipes", return_value=RECIPES):
+        plain = client.get("/results?ingredients=tomato")
+        gzipped = client.get("/results?ingredients=tomato", headers={"Accept-Encoding": "gzip"})
+
+    assert gzipped.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+    assert not gzipped.headers["ETag"].startswith("W/")
+
+def test_compressed_page_still_revalidates(client):
+    with patch("app.routes.get_processed_recipes", return_value=RECIPES):
+        first = client.get("/results?ingredients=tomato", headers={"Accept-Encoding": "gzip"})
+        with patch.object(compression, "compress") as compress:
+            resp = client.get("/results?ingredients=tomato",
+                              headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["ETag"]})
+    assert resp.status_code == 304
+    assert resp.data == b""
+    assert resp.headers["ETag"] == first.headers["ETag"]
+    compress.assert_not_called()
@@ -0,0 +1,51 @@
+import json
+import subprocess
+import sys
+import threading
+import os
+from app.lazy import lazy_import
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_lazy_import_returns_loaded_module_as_is():
+    assert lazy_import("json") is json
+
+def test_importing_app_does_not_load_heavy_dependencies():
+    # a fresh interpreter, since the test session has long imported everything
+    code = (
+        "import sys, json, app\n"
+        "loaded = [m for m in ('inflect', 'bs4', 'typeguard', 'dotenv', 'prometheus_flask_exporter')"
+        " if m in sys.modules]\n"
+        "print(json.dumps({'loaded': loaded, 'requests': type(sys.modules['requests']).__name__}))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    state = json.loads(result.stdout)
+
+    assert state["loaded"] == []
+    assert state["requests"] == "_LazyModule"
+
+def test_concurrent_first_access_waits_for_the_load(tmp_path, monkeypatch):
+    # a module slow enough that other threads arrive while the first one executes it
+    (tmp_path / "slow_module.py").write_text("import time\ntime.sleep(0.2)\nVALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "slow_module", raising=False)
+    module = lazy_import("slow_module")
+    barrier = threading.Barrier(8)
+    values, errors = [], []
+
+    def read():
+        barrier.wait()
+        try:
+            values.append(module.VALUE)
+        except AttributeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert values == [1] * 8
@@ -0,0 +1,89 @@
+import sys
+import tracemalloc
+import pytest
+from unittest.mock import patch
+from app import create_app
+from app.memory import RssGuard, current_rss, deep_sizeof, estimate_mapping_size
+
+TOKEN = "let-me-look"
+
+
+@pytest.fixture
+def app():
+    app = create_app(testing=True)
+    app.config["PROFILING_TOKEN"] = TOKEN
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# ---------- sizes ----------
+def test_deep_sizeof_follows_containers_once():
+    shared = ["tomato"] * 100
+    one = deep_sizeof({"a": shared})
+    two = deep_sizeof({"a": shared, "b": shared})
+    assert one > sys.getsizeof(shared)
+    assert two - one < sys.getsizeof(shared)  # the list is counted once
+
+def test_mapping_size_is_extrapolated_from_a_sample():
+    cache = {("egg", str(i)): [{"id": i, "name": f"Recipe {i:05d}"}] for i in range(2000)}
+    estimate = estimate_mapping_size(cache, sample=50)
+    exact = deep_sizeof(cache)
+    assert abs(estimate - exact) / exact < 0.1
+
+def test_current_rss_is_positive():
+    assert current_rss() > 0
+
+
+# ---------- recycling ----------
+def test_rss_guard_checks_every_n_requests_and_fires_once():
+    guard = RssGuard(100, every=3, rss=lambda: 200)
+    assert [guard.over_limit() for _ in range(6)] == [False, False, True, False, False, False]
+
+def test_rss_guard_is_off_without_a_limit():
+    guard = RssGuard(0, every=1, rss=lambda: 10**12)
+    assert guard.over_limit() is False
+
+def test_bloated_gunicorn_worker_is_recycled_after_the_response(app, client):
+    app.rss_guard = RssGuard(1, every=1, rss=lambda: 2)
+    with patch("app.memory._recycle_worker") as recycle:
+        resp = client.get("/", environ_base={"SERVER_SOFTWARE": "gunicorn/21.2.0"})
+        recycle.assert_not_called()
+        resp.close()
+    recycle.assert_called_once()
+
+def test_other_servers_only_log(app, client):
+    app.rss_guard = RssGuard(1, every=1, rss=lambda: 2)
+    with patch("app.memory._recycle_worker") as recycle:
+        client.get("/").close()
+    recycle.assert_not_called()
+
+
+# ---------- endpoints ----------
+def test_memory_stats_needs_token(client):
+    assert client.get("/memory/stats").status_code == 404
+    stats = client.get("/memory/stats", headers={"X-Profile": TOKEN}).get_json()
+    assert stats["rss_bytes"] > 0
+    assert set(stats["caches"]) == {"recipe_cache", "ingredient_cache", "page_cache", "compressed_cache"}
+
+def test_allocations_start_report_and_stop(client):
+    was_tracing = tracemalloc.is_tracing()
+    try:
+        first = client.get("/memory/allocations", headers={"X-Profile": TOKEN}).get_json()
+        assert first["started"] is True or was_tracing
+        baseline = client.get("/memory/allocations?limit=5", headers={"X-Profile": TOKEN}).get_json()
+        assert baseline["traced_bytes"] > 0
+        assert 0 < len(baseline["top"]) <= 5
+
+        leak = [bytearray(1024) for _ in range(200)]
+        report = client.get("/memory/allocations", headers={"X-Profile": TOKEN}).get_json()
+        assert any("test_unit_memory.py" in growth["site"][0] and growth["bytes_diff"] >= 200 * 1024
+                   for growth in report["growth"])
+        del leak
+    finally:
+        stopped = client.get("/memory/allocations?stop=1", headers={"X-Profile": TOKEN}).get_json()
+    assert stopped == {"tracing": False}
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,146 @@
+import pytest
+from unittest.mock import patch
+from app import create_app
+from app.page_cache import PageCache, invalidate_pages
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# ---------- PageCache ----------
+def test_page_cache_expires_entries():
+    clock = FakeClock()
+    cache = PageCache(ttl=10, clock=clock)
+    cache.put("k", b"<html>", "text/html")
+    clock.now = 11
+    assert cache.get("k") is None
+
+def test_page_cache_evicts_least_recently_used():
+    cache = PageCache(max_entries=2)
+    cache.put("a", b"a", "text/html")
+    cache.put("b", b"b", "text/html")
+    cache.get("a")
+    cache.put("c", b"c", "text/html")
+
+    assert cache.get("b") is None
+    assert cache.get("a").body == b"a"
+
+def test_page_cache_invalidates_by_data_key():
+    cache = PageCache()
+    cache.put("weighted", b"1", "text/html", ["egg,milk"])
+    cache.put("matches", b"2", "text/html", ["egg,milk"])
+    cache.put("other", b"3", "text/html", ["rice"])
+
+    cache.invalidate("egg,milk")
+    assert len(cache) == 1
+    assert cache.get("other") is not None
+
+def test_etag_is_strong_and_content_based():
+    cache = PageCache()
+    first = cache.put("a", b"same", "text/html")
+    second = cache.put("b", b"same", "text/html")
+    assert first.etag == second.etag
+    assert cache.put("c", b"different", "text/html").etag != first.etag
+
+
+# ---------- routes ----------
+RECIPES = [{"id": 1, "name": "Tomato Soup", "image": None, "matches": ["tomato"], "missing_count": 0}]
+
+
+@pytest.fixture
+def app():
+    return create_app(testing=True)
+
+
+def test_results_page_is_rendered_once(app):
+    client = app.test_client()
+    with patch("app.routes.get_processed_recipes", return_value=RECIPES) as process:
+        first = client.get("/results?ingredients=tomato")
+        second = client.get("/results?ingredients=tomato&sort_by=weighted&utm_source=x")
+
+    assert process.call_count == 1
+    assert first.data == second.data
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert first.headers["Cache-Control"] == "public, max-age=60"
+
+def test_ingredient_spellings_share_one_page(app):
+    client = app.test_client()
+    with patch("app.routes.get_processed_recipes", return_value=RECIPES) as process:
+        client.get("/results?ingredients=tomato,cheese")
+        client.get("/results?ingredients=cheese, tomato")
+        client.get("/results?ingredients=Tomato,Cheese")
+
+    assert process.call_count == 1
+    assert len(app.page_cache) == 1
+
+def test_shared_page_does_not_echo_another_spelling(app):
+    client = app.test_client()
+    with patch("app.routes.get_processed_recipes", return_value=RECIPES):
+        client.get("/results?ingredients=Egg, MILK")
+        page = client.get("/results?ingredients=milk,egg").get_data(as_text=True)
+
+    assert "Egg, MILK" not in page
+    assert "Search Results for: egg, milk" in page
+
+def test_recipe_page_links_back_with_the_normalized_list(app):
+    client = app.test_client()
+    recipe = {"id": 1, "title": "Soup", "image": None, "ingredients": ["egg"], "instructions": []}
+    with patch("app.routes.fetch_recipe_or_404", return_value=recipe):
+        client.get("/recipe/1?ingredients=Egg, MILK")
+        page = client.get("/recipe/1?ingredients=milk,egg").get_data(as_text=True)
+
+    assert "Egg" not in page
+    assert "ingredients=egg,milk" in page or "ingredients=egg%2Cmilk" in page
+
+def test_results_answers_if_none_match_with_304(app):
+    client = app.test_client()
+    with patch("app.routes.get_processed_recipes", return_value=RECIPES):
+        etag = client.get("/results?ingredients=tomato").headers["ETag"]
+        resp = client.get("/results?ingredients=tomato", headers={"If-None-Match": etag})
+
+    assert resp.status_code == 304
+    assert resp.data == b""
+
+def test_results_page_dropped_when_data_entry_is_rewritten(app):
+    client = app.test_client()
+    with patch("app.routes.get_processed_recipes", return_value=RECIPES) as process:
+        client.get("/results?ingredients=tomatoes")
+        with app.app_context():
+            invalidate_pages("tomato")
+        client.get("/results?ingredients=tomatoes")
+
+    assert process.call_count == 2
+
+def test_empty_results_are_not_cached(app):
+    client = app.test_client()
+    with patch("app.routes.get_processed_recipes", return_value=[]) as process:
+        client.get("/results?ingredients=basil")
+        resp = client.get("/results?ingredients=basil")
+
+    assert process.call_count == 2
+    assert resp.headers["Cache-Control"] == "no-store"
+    assert "ETag" not in resp.headers
+
+def test_missing_recipe_is_not_cached(app):
+    client = app.test_client()
+    with patch("app.routes.fetch_recipe_or_404", side_effect=ValueError) as fetch:
+        client.get("/recipe/9")
+        resp = client.get("/recipe/9")
+
+    assert resp.status_code == 404
+    assert fetch.call_count == 2
+
+def test_page_cache_can_be_disabled(app):
+    app.config["PAGE_CACHE_ENABLED"] = False
+    client = app.test_client()
+    with patch("app.routes.get_processed_recipes", return_value=RECIPES) as process:
+        client.get("/results?ingredients=tomato")
+        resp = client.get("/results?ingredients=tomato")
+
+    assert process.call_count == 2
+    assert "ETag" not in resp.headers
@@ -0,0 +1,118 @@
+import threading
+import pytest
+from unittest.mock import patch
+from app import create_app
+from app.prefetch import DetailPrefetcher
+
+
+@pytest.fixture
+def app():
+    return create_app(testing=True)
+
+
+# ---------- scheduling ----------
+def test_prefetcher_runs_in_app_context(app):
+    seen = []
+    def fake_prefetch(recipe_id):
+        from flask import current_app
+        seen.append((recipe_id, current_app.name))
+
+    prefetcher = DetailPrefetcher(app)
+    with patch("app.api_client.prefetch_recipe_details", side_effect=fake_prefetch):
+        prefetcher.schedule([1, 2])
+        prefetcher.wait_idle(timeout=2)
+
+    assert sorted(seen) == [(1, app.name), (2, app.name)]
+
+def test_prefetcher_skips_ids_already_queued(app):
+    release = threading.Event()
+    calls = []
+    def slow_prefetch(recipe_id):
+        calls.append(recipe_id)
+        release.wait(2)
+
+    prefetcher = DetailPrefetcher(app, max_workers=1)
+    with patch("app.api_client.prefetch_recipe_details", side_effect=slow_prefetch):
+        prefetcher.schedule([1, 2])
+        prefetcher.schedule([1, 2])
+        release.set()
+        prefetcher.wait_idle(timeout=2)
+
+    assert sorted(calls) == [1, 2]
+
+def test_prefetcher_bounds_pending_queue(app):
+    release = threading.Event()
+    calls = []
+    def slow_prefetch(recipe_id):
+        calls.append(recipe_id)
+        release.wait(2)
+
+    prefetcher = DetailPrefetcher(app, max_workers=1, max_pending=2)
+    with patch("app.api_client.prefetch_recipe_details", side_effect=slow_prefetch):
+        prefetcher.schedule([1, 2, 3, 4])
+        release.set()
+        prefetcher.wait_idle(timeout=2)
+
+    assert sorted(calls) == [1, 2]
+
+def test_prefetcher_survives_errors(app):
+    prefetcher = DetailPrefetcher(app)
+    with patch("app.api_client.prefetch_recipe_details", side_effect=RuntimeError("boom")):
+        prefetcher.schedule([1])
+        prefetcher.wait_idle(timeout=2)
+    assert prefetcher._pending == {}
+
+def test_results_route_skips_prefetch_in_testing(app):
+    app.prefetcher.schedule = lambda ids: pytest.fail("prefetch scheduled")
+    with patch("app.routes.get_processed_recipes", return_value=[{"id": 1, "name": "Soup", "matches": [], "missing_count": 0}]):
+        resp = app.test_client().get("/results?ingredients=tomato")
+    assert resp.status_code == 200
+
+
+# ---------- upstream calls ----------
+class FakeResponse:
+    def __init__(self, payload):
+        self.status_code = 200
+        self.headers = {}
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+def test_cold_search_details_are_not_fetched_again_by_prefetch(tmp_path):
+    app = create_app(testing=True)
+    app.config["DATABASE_PATH"] = str(tmp_path / "prefetch.db")
+    app.config["PREFETCH_TOP_N"] = 3
+    with app.app_context():
+        from app.db_utils import db_connection
+        with db_connection() as conn:
+            conn.execute("CREATE TABLE cached_responses (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT UNIQUE NOT NULL, response TEXT NOT NULL)")
+            conn.commit()
+
+    urls = []
+    def fake_get(url, params=None, timeout=None):
+        urls.append(url)
+        if url == app.config["API_URL"]:
+            return FakeResponse([{"id": i, "title": f"Recipe {i}", "usedIngredients": [{"name": "egg"}], "missedIngredients": []}
+                                 for i in (1, 2)])
+        return FakeResponse({"title": "Recipe", "instructions": "Cook.", "extendedIngredients": [{"name": "egg"}]})
+
+    with patch("requests.get", side_effect=fake_get):
+        resp = app.test_client().get("/results?ingredients=egg")
+        resp.close()  # the prefetch is queued when the response is closed
+        assert resp.status_code == 200
+        app.prefetcher.wait_idle(timeout=2)
+
+    details_urls = [u for u in urls if u != app.config["API_URL"]]
+    assert sorted(details_urls) == [app.config["RECIPE_DETAILS_URL"].format(id=i) for i in (1, 2)]
+
+def test_prefetch_failures_are_logged_without_the_api_key(app, caplog):
+    prefetcher = DetailPrefetcher(app)
+    error = RuntimeError("GET https://api.test/recipes/1/information?apiKey=secret123 failed")
+    with patch("app.api_client.prefetch_recipe_details", side_effect=error):
+        prefetcher.schedule([1])
+        prefetcher.wait_idle(timeout=2)
+
+    assert "prefetch failed recipe_id=1" in caplog.text
+    assert "secret123" not in caplog.text
@@ -0,0 +1,84 @@
+import gc
+import json
+import os
+import time
+import pytest
+from unittest.mock import patch
+from app import create_app
+from app.preload import _after_fork, preload_app, warm_l1_from_l2
+from app.shared_cache import SharedMemoryCache
+from app.warmer import RESULTS, SUGGESTIONS
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(testing=True)
+    app.config["DATABASE_PATH"] = str(tmp_path / "preload.db")
+    from app.db_utils import db_connection
+    with app.app_context(), db_connection() as conn:
+        conn.execute("CREATE TABLE cached_responses (query TEXT PRIMARY KEY, response TEXT)")
+        conn.executemany("INSERT INTO cached_responses VALUES (?, ?)", [
+            ("egg,milk", json.dumps({"fetched_at": time.time(), "data": [{"id": 1, "ingredients": ["egg", "flour"]}]})),
+            ("ingredient_suggestions:tom", json.dumps({"fetched_at": time.time(), "data": ["tomato"]})),
+            ("rice", json.dumps({"fetched_at": 0, "data": [{"id": 2, "ingredients": ["rice"]}]})),
+        ])
+        conn.commit()
+        for namespace, key in ((RESULTS, "egg,milk"), (RESULTS, "rice"), (SUGGESTIONS, "tom")):
+            app.query_stats.record(namespace, key)
+        app.query_stats.flush()
+    return app
+
+
+def test_warm_l1_from_l2_loads_fresh_popular_entries(app):
+    with app.app_context():
+        assert warm_l1_from_l2(app, 10) == 2
+
+    assert app.recipe_cache[("egg", "milk")][0]["matches"] == ["egg"]
+    assert ("rice",) not in app.recipe_cache  # expired in L2, left for the first request to refresh
+    assert app.ingredient_cache["tom"] == ["tomato"]
+
+def test_preload_app_loads_vocabulary_once(app):
+    with patch("app.preload.get_common_ingredients_from_db", return_value=["egg", "tomato"]), \
+         patch("app.preload.os.register_at_fork") as register:
+        try:
+            preload_app(app)
+        finally:
+            gc.unfreeze()
+
+    assert app.ingredient_vocabulary == ("egg", "tomato")
+    register.assert_called_once()
+    with app.app_context():
+        from app.storage import get_common_ingredients_from_db
+        assert get_common_ingredients_from_db() == ["egg", "tomato"]
+
+def test_preload_app_boots_without_cache_tables(app, tmp_path):
+    app.config["DATABASE_PATH"] = str(tmp_path / "missing" / "nope.db")
+    with patch("app.preload.os.register_at_fork"):
+        try:
+            preload_app(app)
+        finally:
+            gc.unfreeze()
+    assert app.recipe_cache == {}
+
+def test_workers_forked_after_preload_do_not_share_the_cache_lock(app, tmp_path):
+    # opened in the "master", like init_cache does with PRELOAD_APP and L1_CACHE_BACKEND=shared
+    app.recipe_cache = SharedMemoryCache(str(tmp_path / "l1.cache"), size=4 * 1024 * 1024, slots=16384)
+    app.ingredient_cache = SharedMemoryCache(str(tmp_path / "l1-ingredients.cache"), size=64 * 1024, slots=64)
+    workers, writes = 4, 2000
+    pids = []
+    for worker in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _after_fork(app)
+                for i in range(writes):
+                    app.recipe_cache[f"{worker}-{i}"] = i
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    cache = app.recipe_cache
+    assert len(cache) == workers * writes
+    assert all(cache.get(f"{w}-{i}") == i for w in range(workers) for i in range(writes))
@@ -0,0 +1,142 @@
+import pstats
+import sys
+import threading
+import time
+import pytest
+from app import create_app
+from app.profiling import ProfileRateLimiter, SamplingProfiler, StackSampler, collapse_stack
+
+TOKEN = "let-me-profile"
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(testing=True)
+    app.config.update(PROFILING_TOKEN=TOKEN, PROFILE_DIR=str(tmp_path))
+    app.profile_limiter.min_interval = 0
+
+    @app.route("/slow")
+    def slow():
+        time.sleep(0.05)
+        return "done"
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# ---------- building blocks ----------
+def test_collapse_stack_lists_callers_first():
+    def inner():
+        return collapse_stack(sys._getframe())
+    stack = inner()
+    assert stack.endswith("test_unit_profiling.test_collapse_stack_lists_callers_first;"
+                          "test_unit_profiling.test_collapse_stack_lists_callers_first.<locals>.inner")
+
+def test_stack_sampler_sees_the_busy_thread():
+    done = threading.Event()
+    worker = threading.Thread(target=done.wait)
+    worker.start()
+    sampler = StackSampler(worker.ident, interval=0.001)
+    sampler.start()
+    time.sleep(0.05)
+    sampler.stop()
+    done.set()
+    worker.join()
+
+    assert sampler.counts
+    assert all("threading.Event.wait" in stack for stack in sampler.counts)
+
+def test_rate_limiter_allows_one_per_interval():
+    now = [0]
+    limiter = ProfileRateLimiter(10, clock=lambda: now[0])
+    assert limiter.allow() is True
+    assert limiter.allow() is False
+    now[0] = 11
+    assert limiter.allow() is True
+
+
+# ---------- requests ----------
+def test_requests_without_the_token_are_not_profiled(app, client):
+    assert "X-Profile" not in client.get("/slow", headers={"X-Profile": "guess"}).headers
+    app.config["PROFILING_TOKEN"] = None
+    assert "X-Profile" not in client.get("/slow", headers={"X-Profile": TOKEN}).headers
+
+def test_token_in_the_query_string_is_ignored(client):
+    assert "X-Profile" not in client.get(f"/slow?__profile={TOKEN}").headers
+
+def test_profiled_request_stores_a_pstats_file(client, tmp_path):
+    resp = client.get("/slow", headers={"X-Profile": TOKEN})
+    name = resp.headers["X-Profile"]
+    assert name.endswith(".prof")
+    assert resp.headers["Cache-Control"] == "no-store"
+
+    download = client.get(f"/profiling/{name}", headers={"X-Profile": TOKEN})
+    assert download.status_code == 200
+    stats = pstats.Stats(str(tmp_path / name))
+    assert any(func[2] == "slow" for func in stats.stats)
+
+def test_collapsed_stacks_on_request(client, tmp_path):
+    resp = client.get("/slow?__profile_format=collapsed", headers={"X-Profile": TOKEN})
+    name = resp.headers["X-Profile"]
+    assert name.endswith(".collapsed")
+    lines = (tmp_path / name).read_text().splitlines()
+    assert any("test_unit_profiling.app.<locals>.slow" in line for line in lines)
+
+def test_profiling_is_rate_limited(app, client):
+    app.profile_limiter.min_interval = 60
+    assert client.get("/slow", headers={"X-Profile": TOKEN}).headers["X-Profile"].endswith(".prof")
+    assert client.get("/slow", headers={"X-Profile": TOKEN}).headers["X-Profile"] == "rate-limited"
+
+def test_download_needs_the_token(client):
+    name = client.get("/slow", headers={"X-Profile": TOKEN}).headers["X-Profile"]
+    assert client.get(f"/profiling/{name}").status_code == 404
+    assert client.get("/profiling/..%2Fsecrets", headers={"X-Profile": TOKEN}).status_code == 404
+
+
+# ---------- continuous sampling ----------
+def _busy_thread():
+    done = threading.Event()
+    worker = threading.Thread(target=done.wait)
+    worker.start()
+    return worker, done
+
+def test_sampler_only_samples_tracked_threads(app):
+    sampler = SamplingProfiler(app)
+    worker, done = _busy_thread()
+    sampler.sample_once()
+    assert sampler.report()["samples"] == 0
+
+    sampler.track(worker.ident)
+    sampler.sample_once()
+    sampler.sample_once()
+    done.set()
+    worker.join()
+
+    report = sampler.report()
+    assert report["samples"] == 2
+    assert report["top_self"][0]["function"] == "threading.Condition.wait"
+    assert {"function": "threading.Event.wait", "samples": 2, "percent": 100.0} in report["top_total"]
+
+def test_sampler_folds_new_stacks_past_the_limit(app):
+    sampler = SamplingProfiler(app, max_stacks=1)
+    sampler.track(threading.get_ident())
+    sampler.sample_once()
+    (lambda: sampler.sample_once())()
+    assert sampler.collapsed().splitlines()[-1] == "[other] 1"
+
+def test_hot_report_endpoint(app, client):
+    sampler = app.sampling_profiler
+    sampler.track(threading.get_ident())
+    sampler.sample_once()
+
+    assert client.get("/profiling/hot").status_code == 404
+    report = client.get("/profiling/hot?limit=5&reset=1", headers={"X-Profile": TOKEN}).get_json()
+    assert report["samples"] == 1
+    assert len(report["top_total"]) <= 5
+    assert client.get("/profiling/hot", headers={"X-Profile": TOKEN}).get_json()["samples"] == 0
+
+    stacks = client.get("/profiling/stacks", headers={"X-Profile": TOKEN})
+    assert stacks.mimetype == "text/plain"
@@ -0,0 +1,143 @@
+import pytest
+from unittest.mock import patch
+from flask import Flask
+from prometheus_client import REGISTRY
+from app import quota as quota_module
+from app.quota import QuotaManager, QuotaExceeded
+from app.upstream import PRIORITY_USER, PRIORITY_DETAIL, PRIORITY_BACKGROUND
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["DATABASE_PATH"] = str(tmp_path / "quota.db")
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_quota(clock, **config):
+    options = {"UPSTREAM_RATE_PER_SECOND": 1, "UPSTREAM_RATE_BURST": 10, "DAILY_POINT_BUDGET": 100,
+               "RATE_LIMIT_MAX_WAIT": 0, "QUOTA_RESERVES": {"user": 0.0, "detail": 0.2, "background": 0.5}}
+    options.update(config)
+    return QuotaManager(options, clock=clock, sleep=clock.sleep)
+
+
+# ---------- token bucket ----------
+def test_bucket_allows_burst_then_limits(app, clock):
+    quota = make_quota(clock)
+    for _ in range(10):
+        quota.acquire("search", PRIORITY_USER)
+    with pytest.raises(QuotaExceeded):
+        quota.acquire("search", PRIORITY_USER)
+
+def test_bucket_refills_over_time(app, clock):
+    quota = make_quota(clock)
+    for _ in range(10):
+        quota.acquire("search")
+    clock.now += 2
+    quota.acquire("search")
+    quota.acquire("search")
+    with pytest.raises(QuotaExceeded):
+        quota.acquire("search")
+
+def test_bucket_waits_for_token_within_max_wait(app, clock):
+    quota = make_quota(clock, RATE_LIMIT_MAX_WAIT=1.5)
+    for _ in range(10):
+        quota.acquire("search")
+    quota.acquire("search")
+    assert clock.sleeps == [1.0]
+
+def test_bucket_is_shared_between_managers(app, clock):
+    """two workers pointing at the same db draw from one bucket"""
+    worker_a = make_quota(clock)
+    worker_b = make_quota(clock)
+    for _ in range(5):
+        worker_a.acquire("search")
+        worker_b.acquire("search")
+    with pytest.raises(QuotaExceeded):
+        worker_a.acquire("search")
+
+
+# ---------- priority classes ----------
+def test_background_keeps_out_of_reserved_tokens(app, clock):
+    quota = make_quota(clock)
+    for _ in range(5):
+        quota.acquire("details", PRIORITY_BACKGROUND)
+    with pytest.raises(QuotaExceeded):
+        quota.acquire("details", PRIORITY_BACKGROUND)
+    quota.acquire("details", PRIORITY_DETAIL)
+    quota.acquire("search", PRIORITY_USER)
+
+def test_user_calls_can_use_reserved_budget(app, clock):
+    quota = make_quota(clock, DAILY_POINT_BUDGET=5, UPSTREAM_RATE_BURST=100)
+    quota.acquire("details", PRIORITY_DETAIL)
+    quota.acquire("details", PRIORITY_DETAIL)
+    quota.acquire("details", PRIORITY_DETAIL)
+    quota.acquire("details", PRIORITY_DETAIL)
+    with pytest.raises(QuotaExceeded):
+        quota.acquire("details", PRIORITY_DETAIL)
+    quota.acquire("search", PRIORITY_USER)
+
+
+# ---------- daily budget ----------
+def test_budget_uses_endpoint_costs(app, clock):
+    quota = make_quota(clock, QUOTA_POINT_COSTS={"search": 2.5}, DAILY_POINT_BUDGET=10)
+    quota.acquire("search")
+    quota.acquire("search")
+    assert quota.remaining_budget() == 5
+
+def test_budget_exhausted_raises(app, clock):
+    quota = make_quota(clock, DAILY_POINT_BUDGET=2)
+    quota.acquire("search")
+    quota.acquire("search")
+    with pytest.raises(QuotaExceeded):
+        quota.acquire("search")
+
+def test_budget_disabled(app, clock):
+    quota = make_quota(clock, DAILY_POINT_BUDGET=0)
+    assert quota.remaining_budget() is None
+    quota.acquire("search")
+
+def test_budget_gauge_exported(app, clock):
+    quota = make_quota(clock, DAILY_POINT_BUDGET=50)
+    quota.export_budget(app)
+    quota.acquire("search")
+    assert REGISTRY.get_sample_value("spoonacular_budget_remaining_points") == 49
+
+def test_budget_gauge_reads_the_shared_budget_before_any_call(app, clock):
+    make_quota(clock, DAILY_POINT_BUDGET=50).acquire("search")
+    restarted = make_quota(clock, DAILY_POINT_BUDGET=50)
+    restarted.export_budget(app)
+    assert REGISTRY.get_sample_value("spoonacular_budget_remaining_points") == 49
+
+def test_budget_gauge_does_not_write_to_the_db(app, clock, tmp_path):
+    quota = make_quota(clock, DAILY_POINT_BUDGET=50)
+    quota.export_budget(app)
+    assert REGISTRY.get_sample_value("spoonacular_budget_remaining_points") == 50
+    assert not (tmp_path / "quota.db").exists() or (tmp_path / "quota.db").stat().st_size == 0
+
+def test_quota_tables_are_created_once(app, clock):
+    quota = make_quota(clock)
+    with patch("app.quota._ensure_tables", wraps=quota_module._ensure_tables) as ensure:
+        quota.acquire("search")
+        quota.acquire("search")
+        quota.remaining_budget()
+    assert ensure.call_count == 1
@@ -1,3 +1,4 @@
+import re
 import pytest
 from unittest.mock import patch, MagicMock
 from app import create_app
@@ -162,6 +163,23 @@ def test_ingredient_suggestions_returns_json(client):
         assert isinstance(resp.get_json(), list)
 
 
+# ----------- ingredient vocabulary route tests ------------
+def test_ingredient_vocabulary_is_versioned_and_immutable(client):
+    with patch("app.api_client.get_common_ingredients_from_db", return_value=["tomato", "egg", "egg"]):
+        page = client.get("/").get_data(as_text=True)
+        url = re.search(r'data-vocabulary-url="([^"]+)"', page).group(1)
+        resp = client.get(url)
+
+    assert resp.get_json() == ["egg", "tomato"]
+    assert resp.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert client.get(url, headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+
+def test_outdated_ingredient_vocabulary_redirects_to_current(client):
+    with patch("app.api_client.get_common_ingredients_from_db", return_value=["tomato"]):
+        resp = client.get("/ingredient_vocabulary/000000000000.json")
+    assert resp.status_code == 302
+    assert re.search(r"/ingredient_vocabulary/[0-9a-f]{12}\.json$", resp.headers["Location"])
+
 # ----------- health route tests ------------
 
 def test_health_unit_ok(client):
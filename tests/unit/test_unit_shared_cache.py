@@ -0,0 +1,128 @@
+import multiprocessing
+import pytest
+from unittest.mock import Mock, patch
+from app.shared_cache import SharedMemoryCache
+from app.utils import init_cache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "l1.cache")
+
+
+def _small(path, **kwargs):
+    kwargs.setdefault("size", 64 * 1024)
+    kwargs.setdefault("slots", 64)
+    return SharedMemoryCache(path, **kwargs)
+
+
+# ---------- mapping behaviour ----------
+def test_set_get_and_contains(path):
+    cache = _small(path)
+    cache[("egg", "milk")] = [{"id": 1, "name": "Pancakes"}]
+
+    assert ("egg", "milk") in cache
+    assert cache[("egg", "milk")] == [{"id": 1, "name": "Pancakes"}]
+    assert cache.get("missing") is None
+    assert "missing" not in cache
+    with pytest.raises(KeyError):
+        cache["missing"]
+
+def test_overwrite_keeps_one_entry(path):
+    cache = _small(path)
+    cache["tom"] = ["tomato"]
+    cache["tom"] = ["tomato", "tomatillo"]
+
+    assert cache["tom"] == ["tomato", "tomatillo"]
+    assert len(cache) == 1
+
+def test_clear(path):
+    cache = _small(path)
+    cache["a"] = 1
+    cache.clear()
+    assert len(cache) == 0
+    assert "a" not in cache
+
+def test_resets_when_index_is_full(path):
+    cache = _small(path, slots=8)
+    for i in range(7):
+        cache[f"k{i}"] = i
+
+    assert cache.resets == 1
+    assert cache["k6"] == 6
+    assert len(cache) == 1
+
+def test_resets_when_data_region_is_full(path):
+    cache = _small(path, size=64 * 1024)
+    value = "x" * 20000
+    for i in range(5):
+        cache[f"k{i}"] = value
+
+    assert cache.resets >= 1
+    assert cache["k4"] == value
+
+def test_oversized_values_are_skipped(path):
+    cache = _small(path, size=4096, slots=8)
+    cache["small"] = 1
+    cache["big"] = "x" * 10000
+    assert "big" not in cache
+    assert cache["small"] == 1
+
+
+# ---------- decoded values ----------
+def test_repeated_hits_skip_decoding(path):
+    cache = _small(path)
+    cache["egg"] = [{"id": 1}]
+    first = cache["egg"]
+    with patch("app.shared_cache.json.loads") as loads:
+        assert cache["egg"] is first
+    loads.assert_not_called()
+
+def test_rewritten_entry_is_decoded_again(path):
+    writer, reader = _small(path), _small(path)
+    writer["egg"] = [1]
+    assert reader["egg"] == [1]
+    writer["egg"] = [2]
+    assert reader["egg"] == [2]
+
+def test_reset_invalidates_decoded_values(path):
+    # after a reset the same offset holds other bytes, the generation tells them apart
+    writer, reader = _small(path), _small(path)
+    writer["egg"] = [1]
+    assert reader["egg"] == [1]
+    writer.clear()
+    writer["egg"] = [2]
+    assert reader["egg"] == [2]
+
+
+# ---------- sharing ----------
+def test_second_handle_sees_entries(path):
+    writer = _small(path)
+    reader = _small(path)
+    writer["egg"] = [1, 2]
+    assert reader["egg"] == [1, 2]
+
+def test_changed_geometry_starts_empty(path):
+    _small(path)["egg"] = 1
+    assert "egg" not in _small(path, slots=128)
+
+def _write_from_child(path):
+    _small(path)["from-child"] = {"pid": "child"}
+
+def test_entries_are_shared_across_processes(path):
+    cache = _small(path)
+    process = multiprocessing.get_context("fork").Process(target=_write_from_child, args=(path,))
+    process.start()
+    process.join(10)
+
+    assert cache["from-child"] == {"pid": "child"}
+
+
+# ---------- init_cache ----------
+def test_init_cache_uses_shared_backend(tmp_path):
+    app = Mock(spec=["config"])
+    app.config = {"L1_CACHE_BACKEND": "shared", "SHARED_CACHE_DIR": str(tmp_path), "SHARED_CACHE_SIZE_MB": 1, "SHARED_CACHE_SLOTS": 64}
+    init_cache(app)
+
+    assert isinstance(app.recipe_cache, SharedMemoryCache)
+    assert app.ingredient_cache.path == str(tmp_path / "shelfchef-ingredient_cache.cache")
@@ -0,0 +1,83 @@
+import pytest
+from flask import Flask
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from app import create_app
+from app.db_utils import db_connection
+from app.sql_metrics import normalize_sql, statement_labels
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["DATABASE_PATH"] = str(tmp_path / "sql.db")
+    app.config["SLOW_QUERY_MS"] = 0
+    with app.app_context(), db_connection() as conn:
+        conn.execute("CREATE TABLE fruits (name TEXT)")
+        conn.executemany("INSERT INTO fruits VALUES (?)", [("apple",), ("pear",), ("plum",)])
+        conn.commit()
+    return app
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+# ---------- normalization ----------
+def test_normalize_sql_strips_values_and_whitespace():
+    sql = """SELECT *  FROM recipes
+             WHERE name = 'O''Brien' AND id IN (1, 2, 3) AND score > -1.5 AND t2.x = :x LIMIT 10"""
+    assert normalize_sql(sql) == "SELECT * FROM recipes WHERE name = ? AND id IN (?...) AND score > ? AND t2.x = ? LIMIT ?"
+
+@pytest.mark.parametrize("sql, labels", [
+    ("SELECT response FROM cached_responses WHERE query = ?", ("select", "cached_responses")),
+    ("INSERT OR IGNORE INTO ingredients (name) VALUES (?)", ("insert", "ingredients")),
+    ("CREATE TABLE IF NOT EXISTS query_stats (key TEXT)", ("create", "query_stats")),
+    ("BEGIN IMMEDIATE", ("begin", "-")),
+])
+def test_statement_labels(sql, labels):
+    assert statement_labels(sql) == labels
+
+
+# ---------- sqlite3 ----------
+def test_raw_queries_record_latency_and_rows_fetched(app):
+    labels = {"db": "sqlite3", "operation": "select", "table": "fruits"}
+    count, rows = _sample("shelfchef_sql_seconds_count", **labels), _sample("shelfchef_sql_rows_sum", **labels)
+
+    with app.app_context(), db_connection() as conn:
+        assert len(conn.execute("SELECT name FROM fruits").fetchall()) == 3
+        assert [row["name"] for row in conn.execute("SELECT name FROM fruits WHERE name != 'pear'")] == ["apple", "plum"]
+        conn.execute("SELECT name FROM fruits").fetchone()  # left open, recorded when the connection closes
+
+    assert _sample("shelfchef_sql_seconds_count", **labels) == count + 3
+    assert _sample("shelfchef_sql_rows_sum", **labels) == rows + 3 + 2 + 1
+
+def test_writes_record_rows_changed(app):
+    labels = {"db": "sqlite3", "operation": "update", "table": "fruits"}
+    rows = _sample("shelfchef_sql_rows_sum", **labels)
+    with app.app_context(), db_connection() as conn:
+        conn.execute("UPDATE fruits SET name = upper(name) WHERE name LIKE 'p%'")
+    assert _sample("shelfchef_sql_rows_sum", **labels) == rows + 2
+
+def test_slow_queries_are_logged_without_values(app, caplog):
+    app.config["SLOW_QUERY_MS"] = 0.000001
+    with app.app_context(), caplog.at_level("WARNING", logger="app.sql_metrics"), db_connection() as conn:
+        conn.execute("SELECT name FROM fruits WHERE name = 'apple'").fetchall()
+
+    record = caplog.records[-1]
+    assert record.sql == "SELECT name FROM fruits WHERE name = ?"
+    assert record.rows == 1
+    assert "apple" not in caplog.text
+
+
+# ---------- SQLAlchemy ----------
+def test_sqlalchemy_statements_are_recorded():
+    app = create_app(testing=True)
+    labels = {"db": "sqlalchemy", "operation": "select", "table": "my_recipes"}
+    count = _sample("shelfchef_sql_seconds_count", **labels)
+
+    from app.storage import db
+    with app.app_context():
+        db.session.execute(text("SELECT id FROM my_recipes")).fetchall()
+
+    assert _sample("shelfchef_sql_seconds_count", **labels) == count + 1
@@ -0,0 +1,61 @@
+import pytest
+from unittest.mock import patch
+from prometheus_client import REGISTRY
+from app import create_app
+from app.timing import Span, span, server_timing_header
+
+RECIPES = [{"id": 1, "name": "Tomato Soup", "image": None, "ingredients": ["tomato"], "missing_ingredients": 0}]
+
+
+@pytest.fixture
+def app():
+    return create_app(testing=True)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _span(stage, duration, outcome=None):
+    s = Span(stage, outcome)
+    s.duration = duration
+    return s
+
+
+# ---------- header ----------
+def test_server_timing_header_sums_repeated_stages():
+    header = server_timing_header([
+        _span("l1", 0.001, "miss"),
+        _span("upstream_details", 0.2, 200),
+        _span("upstream_details", 0.3, 200),
+        _span("sort", 0.0005),
+    ], total=0.6)
+
+    assert header == ('l1;dur=1.00;desc="miss", upstream_details;dur=500.00;desc="200 x2", '
+                      'sort;dur=0.50, total;dur=600.00')
+
+def test_span_is_observed_outside_a_request():
+    before = REGISTRY.get_sample_value("shelfchef_stage_seconds_count", {"stage": "unit_test", "outcome": "hit"}) or 0
+    with span("unit_test") as s:
+        s.outcome = "hit"
+    after = REGISTRY.get_sample_value("shelfchef_stage_seconds_count", {"stage": "unit_test", "outcome": "hit"})
+    assert after == before + 1
+
+
+# ---------- requests ----------
+def test_results_reports_cache_outcomes_and_stages(client):
+    with patch("app.api_client.get_recipes_from_cache", return_value=RECIPES):
+        first = client.get("/results?ingredients=tomato")
+        second = client.get("/results?ingredients=tomato")
+
+    timing = first.headers["Server-Timing"]
+    for entry in ('page_cache;', 'desc="miss"', "l1;", "sort;", "render;", "total;dur="):
+        assert entry in timing
+    assert 'page_cache;' in second.headers["Server-Timing"]
+    assert 'desc="hit"' in second.headers["Server-Timing"]
+    assert "render;" not in second.headers["Server-Timing"]
+
+def test_server_timing_can_be_disabled(app, client):
+    app.config["SERVER_TIMING_ENABLED"] = False
+    assert "Server-Timing" not in client.get("/").headers
@@ -0,0 +1,442 @@
+import time
+import pytest
+import requests
+from unittest.mock import Mock
+from prometheus_client import REGISTRY
+from app.upstream import (
+    CircuitBreaker, UpstreamClient, UpstreamError, UpstreamUnavailable,
+    Deadline, DeadlineExceeded, Hedger, RetryPolicy, is_failure_status, parse_retry_after,
+    request_timeout, upstream_get
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock, **kwargs):
+    options = dict(window=4, min_calls=4, error_rate=0.5, slow_call_seconds=1.0,
+                   slow_call_rate=0.5, open_seconds=10, clock=clock)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+
+# ---------- circuit breaker states ----------
+def test_breaker_starts_closed():
+    breaker = make_breaker(FakeClock())
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request() is True
+
+def test_breaker_opens_on_error_rate():
+    breaker = make_breaker(FakeClock())
+    for success in (True, True, False, False):
+        breaker.record(success, 0.1)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow_request() is False
+
+def test_breaker_waits_for_min_calls():
+    breaker = make_breaker(FakeClock())
+    for _ in range(3):
+        breaker.record(False, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_breaker_opens_on_slow_calls():
+    breaker = make_breaker(FakeClock())
+    for latency in (0.1, 0.1, 2.0, 2.0):
+        breaker.record(True, latency)
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_breaker_half_open_allows_single_probe():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(False, 0.1)
+
+    clock.now = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+
+def test_breaker_half_open_probe_success_closes():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    clock.now = 10
+    breaker.allow_request()
+    breaker.record(True, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_breaker_half_open_probe_failure_reopens():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    clock.now = 10
+    breaker.allow_request()
+    breaker.record(False, 0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow_request() is False
+
+
+# ---------- client ----------
+@pytest.mark.parametrize("status, expected", [(200, False), (404, False), (429, True), (500, True), (503, True)])
+def test_is_failure_status(status, expected):
+    assert is_failure_status(status) is expected
+
+def test_client_passes_timeout():
+    client = UpstreamClient({"UPSTREAM_TIMEOUT": 1.5})
+    requester = Mock()
+    requester.get.return_value = Mock(status_code=200)
+
+    client.get("http://api.test", {"q": 1}, requester)
+    requester.get.assert_called_once_with("http://api.test", params={"q": 1}, timeout=1.5)
+
+def test_client_wraps_request_exceptions():
+    client = UpstreamClient({"UPSTREAM_RETRY_ATTEMPTS": 1})
+    requester = Mock()
+    requester.get.side_effect = requests.ConnectionError("refused")
+
+    with pytest.raises(UpstreamError):
+        client.get("http://api.test", requester=requester)
+
+def test_client_open_breaker_skips_upstream():
+    client = UpstreamClient({"CIRCUIT_BREAKER_MIN_CALLS": 2, "CIRCUIT_BREAKER_WINDOW": 2, "UPSTREAM_RETRY_ATTEMPTS": 1})
+    requester = Mock()
+    requester.get.return_value = Mock(status_code=503)
+    client.get("http://api.test", requester=requester)
+    client.get("http://api.test", requester=requester)
+
+    assert client.degraded is True
+    with pytest.raises(UpstreamUnavailable):
+        client.get("http://api.test", requester=requester)
+    assert requester.get.call_count == 2
+
+def test_upstream_get_without_app_context():
+    requester = Mock()
+    requester.get.return_value = Mock(status_code=200)
+    response = upstream_get("http://api.test", {"q": 1}, requester)
+    assert response.status_code == 200
+
+
+# ---------- deadline ----------
+def test_deadline_remaining_and_expired():
+    clock = FakeClock()
+    deadline = Deadline(5, clock=clock)
+    assert deadline.remaining() == 5
+    clock.now = 7
+    assert deadline.remaining() == 0
+    assert deadline.expired is True
+
+def test_request_timeout_capped_by_deadline():
+    clock = FakeClock()
+    deadline = Deadline(2, clock=clock)
+    assert request_timeout(5) == 5
+    assert request_timeout(5, deadline) == 2
+    assert request_timeout(1, deadline) == 1
+
+def test_client_uses_remaining_budget_as_timeout():
+    clock = FakeClock()
+    deadline = Deadline(2, clock=clock)
+    client = UpstreamClient({"UPSTREAM_TIMEOUT": 5})
+    requester = Mock()
+    requester.get.return_value = Mock(status_code=200)
+
+    client.get("http://api.test", requester=requester, deadline=deadline)
+    assert requester.get.call_args[1]["timeout"] == 2
+
+def test_client_expired_deadline_skips_upstream():
+    clock = FakeClock()
+    deadline = Deadline(1, clock=clock)
+    clock.now = 2
+    client = UpstreamClient({})
+    requester = Mock()
+
+    with pytest.raises(DeadlineExceeded):
+        client.get("http://api.test", requester=requester, deadline=deadline)
+    requester.get.assert_not_called()
+
+def test_client_timeout_from_deadline_does_not_trip_breaker():
+    clock = FakeClock()
+    deadline = Deadline(1, clock=clock)
+    client = UpstreamClient({"CIRCUIT_BREAKER_MIN_CALLS": 1, "CIRCUIT_BREAKER_WINDOW": 1})
+    requester = Mock()
+
+    def slow_get(*args, **kwargs):
+        clock.now = 2
+        raise requests.Timeout("read timed out")
+    requester.get.side_effect = slow_get
+
+    with pytest.raises(DeadlineExceeded):
+        client.get("http://api.test", requester=requester, deadline=deadline)
+    assert client.degraded is False
+
+def test_deadline_cut_probe_leaves_breaker_half_open():
+    clock, deadline_clock = FakeClock(), FakeClock()
+    client = UpstreamClient({})
+    client.breaker = make_breaker(clock)
+    for _ in range(4):
+        client.breaker.record(False, 0.1)
+    clock.now = 10
+    deadline = Deadline(1, clock=deadline_clock)
+    requester = Mock()
+
+    def slow_get(*args, **kwargs):
+        deadline_clock.now = 2
+        raise requests.Timeout("read timed out")
+    requester.get.side_effect = slow_get
+
+    with pytest.raises(DeadlineExceeded):
+        client.get("http://api.test", requester=requester, deadline=deadline)
+    # neither closed by a probe that never finished nor left without a probe slot
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.breaker.allow_request() is True
+
+
+# ---------- hedging ----------
+class SlowFirstRequester:
+    """the first call stalls, later calls answer right away"""
+
+    def __init__(self, stall=0.3):
+        self.stall = stall
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        if self.calls == 1:
+            time.sleep(self.stall)
+            return Mock(status_code=200, name="primary")
+        return Mock(status_code=200, name="hedge")
+
+
+def hedged_client(**config):
+    options = {"UPSTREAM_HEDGING": True, "UPSTREAM_HEDGE_MIN_SAMPLES": 5, "UPSTREAM_HEDGE_MAX_RATE": 0.5}
+    options.update(config)
+    client = UpstreamClient(options)
+    for _ in range(10):
+        client.hedger.record("details", 0.01, False)
+    return client
+
+
+def sample(name, endpoint):
+    return REGISTRY.get_sample_value(name, {"endpoint": endpoint}) or 0
+
+def test_hedger_needs_min_samples():
+    hedger = Hedger(min_samples=3)
+    hedger.record("details", 0.1, False)
+    assert hedger.hedge_delay("details") is None
+
+def test_hedger_delay_is_quantile():
+    hedger = Hedger(min_samples=1, quantile=0.95)
+    for i in range(1, 101):
+        hedger.record("details", i / 100, False)
+    assert hedger.hedge_delay("details") == 0.96
+
+def test_hedger_caps_hedge_rate():
+    hedger = Hedger(max_rate=0.1)
+    for _ in range(9):
+        hedger.record("details", 0.1, False)
+    assert hedger.allow_hedge() is True
+    hedger.record("details", 0.1, True)
+    assert hedger.allow_hedge() is False
+
+def test_hedging_disabled_by_default():
+    assert UpstreamClient({}).hedger is None
+
+def test_slow_call_is_hedged_and_hedge_wins():
+    client = hedged_client()
+    requester = SlowFirstRequester()
+    fired = sample("spoonacular_hedges_fired_total", "details")
+    won = sample("spoonacular_hedges_won_total", "details")
+
+    start = time.monotonic()
+    response = client.get("http://api.test", requester=requester, endpoint="details")
+    assert time.monotonic() - start < 0.25
+    assert response._mock_name == "hedge"
+    assert requester.calls == 2
+    assert sample("spoonacular_hedges_fired_total", "details") == fired + 1
+    assert sample("spoonacular_hedges_won_total", "details") == won + 1
+
+def test_fast_call_is_not_hedged():
+    client = hedged_client()
+    requester = Mock()
+    requester.get.return_value = Mock(status_code=200)
+    client.get("http://api.test", requester=requester, endpoint="details")
+    assert requester.get.call_count == 1
+
+def test_autocomplete_is_never_hedged():
+    client = hedged_client()
+    for _ in range(10):
+        client.hedger.record("autocomplete", 0.01, False)
+    requester = SlowFirstRequester(stall=0.05)
+    client.get("http://api.test", requester=requester, endpoint="autocomplete")
+    assert requester.calls == 1
+
+def test_hedge_rate_cap_blocks_hedge():
+    client = hedged_client(UPSTREAM_HEDGE_MAX_RATE=0.0)
+    requester = SlowFirstRequester(stall=0.05)
+    response = client.get("http://api.test", requester=requester, endpoint="details")
+    assert response._mock_name == "primary"
+    assert requester.calls == 1
+
+def test_hedge_needs_quota():
+    client = hedged_client()
+    client.quota = Mock()
+    client.quota.acquire.side_effect = [None, UpstreamUnavailable("spent")]
+    requester = SlowFirstRequester(stall=0.05)
+
+    response = client.get("http://api.test", requester=requester, endpoint="details")
+    assert response._mock_name == "primary"
+    assert requester.calls == 1
+
+
+# ---------- retries ----------
+def response(status, retry_after=None):
+    return Mock(status_code=status, headers={"Retry-After": retry_after} if retry_after else {})
+
+
+def retrying_client(**config):
+    sleeps = []
+    options = {"UPSTREAM_RETRY_ATTEMPTS": 3, "UPSTREAM_RETRY_BASE_DELAY": 0.1, "UPSTREAM_RETRY_MAX_DELAY": 1.0}
+    options.update(config)
+    client = UpstreamClient(options, sleep=sleeps.append)
+    return client, sleeps
+
+def test_retry_policy_full_jitter_bounds():
+    policy = RetryPolicy(base_delay=0.1, max_delay=0.3, rand=lambda low, high: high)
+    assert [policy.backoff(n) for n in (1, 2, 3, 4)] == [0.1, 0.2, 0.3, 0.3]
+    policy = RetryPolicy(base_delay=0.1, rand=lambda low, high: low)
+    assert policy.backoff(3) == 0
+
+def test_retry_policy_only_idempotent_methods():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.can_retry("GET", 1) is True
+    assert policy.can_retry("GET", 3) is False
+    assert policy.can_retry("POST", 1) is False
+
+def test_retry_policy_honors_retry_after():
+    policy = RetryPolicy(max_delay=2.0)
+    assert policy.delay(1, "1.5") == 1.5
+    assert policy.delay(1, "30") is None
+
+@pytest.mark.parametrize("value, expected", [("3", 3.0), ("-1", 0.0), ("", None), (None, None), ("soon", None)])
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+def test_parse_retry_after_http_date():
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+def test_client_retries_transient_status():
+    client, sleeps = retrying_client()
+    requester = Mock()
+    requester.get.side_effect = [response(503), response(429, "0.5"), response(200)]
+    before = REGISTRY.get_sample_value("spoonacular_retries_total", {"endpoint": "details", "reason": "429"}) or 0
+
+    result = client.get("http://api.test", requester=requester, endpoint="details")
+    assert result.status_code == 200
+    assert requester.get.call_count == 3
+    assert sleeps[1] == 0.5
+    assert REGISTRY.get_sample_value("spoonacular_retries_total", {"endpoint": "details", "reason": "429"}) == before + 1
+
+def test_client_gives_up_after_max_attempts():
+    client, sleeps = retrying_client()
+    requester = Mock()
+    requester.get.return_value = response(503)
+
+    assert client.get("http://api.test", requester=requester).status_code == 503
+    assert requester.get.call_count == 3
+    assert len(sleeps) == 2
+
+def test_client_does_not_retry_client_errors():
+    client, sleeps = retrying_client()
+    requester = Mock()
+    requester.get.return_value = response(404)
+    client.get("http://api.test", requester=requester)
+    assert requester.get.call_count == 1
+
+def test_client_retries_connection_errors():
+    client, sleeps = retrying_client()
+    requester = Mock()
+    requester.get.side_effect = [requests.ConnectionError("reset"), response(200)]
+    assert client.get("http://api.test", requester=requester).status_code == 200
+
+def test_client_skips_long_retry_after():
+    client, sleeps = retrying_client()
+    requester = Mock()
+    requester.get.return_value = response(429, "60")
+    assert client.get("http://api.test", requester=requester).status_code == 429
+    assert requester.get.call_count == 1
+
+def test_client_retry_respects_deadline():
+    client, sleeps = retrying_client()
+    requester = Mock()
+    requester.get.return_value = response(503, "0.5")
+    clock = FakeClock()
+    deadline = Deadline(0.4, clock=clock)
+
+    assert client.get("http://api.test", requester=requester, deadline=deadline).status_code == 503
+    assert requester.get.call_count == 1
+
+def test_client_retries_spend_quota():
+    client, sleeps = retrying_client()
+    client.quota = Mock(max_wait=0)
+    requester = Mock()
+    requester.get.side_effect = [response(503), response(200)]
+
+    client.get("http://api.test", requester=requester)
+    assert client.quota.acquire.call_count == 2
+
+
+# ---------- instrumentation ----------
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_client_records_status_size_and_quota_headers():
+    client = UpstreamClient({})
+    requester = Mock()
+    requester.get.return_value = Mock(status_code=200, content=b"[1, 2, 3]",
+                                      headers={"X-API-Quota-Request": "1.5", "X-API-Quota-Used": "42", "X-API-Quota-Left": "108"})
+    before_ok = _sample("spoonacular_responses_total", endpoint="autocomplete", status="200")
+    before_points = _sample("spoonacular_points_charged_total", endpoint="autocomplete")
+    before_bytes = _sample("spoonacular_response_bytes_sum", endpoint="autocomplete")
+
+    client.get("http://api.test", requester=requester, endpoint="autocomplete")
+
+    assert _sample("spoonacular_responses_total", endpoint="autocomplete", status="200") == before_ok + 1
+    assert _sample("spoonacular_points_charged_total", endpoint="autocomplete") == before_points + 1.5
+    assert _sample("spoonacular_response_bytes_sum", endpoint="autocomplete") == before_bytes + 9
+    assert _sample("spoonacular_quota_points_left") == 108
+    assert _sample("spoonacular_quota_points_used") == 42
+    assert _sample("spoonacular_requests_in_flight", endpoint="autocomplete") == 0
+
+def test_failed_call_is_counted_and_logged_with_timing(caplog):
+    client = UpstreamClient({"UPSTREAM_RETRY_ATTEMPTS": 1})
+    requester = Mock()
+    requester.get.side_effect = requests.ConnectionError("refused")
+    before = _sample("spoonacular_responses_total", endpoint="autocomplete", status="error")
+
+    with caplog.at_level("WARNING", logger="app.upstream"), pytest.raises(UpstreamError):
+        client.get("http://api.test", {"apiKey": "secret"}, requester, endpoint="autocomplete")
+
+    assert _sample("spoonacular_responses_total", endpoint="autocomplete", status="error") == before + 1
+    record = caplog.records[-1]
+    assert record.endpoint == "autocomplete" and record.status == "error"
+    assert record.duration_ms >= 0
+    assert "secret" not in caplog.text
+
+def test_api_key_is_redacted_from_request_errors(caplog):
+    client = UpstreamClient({"UPSTREAM_RETRY_ATTEMPTS": 1})
+    requester = Mock()
+    requester.get.side_effect = requests.ConnectionError("Max retries exceeded with url: /search?query=tom&apiKey=secret&number=10")
+
+    with caplog.at_level("WARNING", logger="app.upstream"), pytest.raises(UpstreamError) as error:
+        client.get("http://api.test", requester=requester, endpoint="autocomplete")
+
+    assert "secret" not in str(error.value)
+    assert "secret" not in caplog.text
+    assert "apiKey=***&number=10" in caplog.text
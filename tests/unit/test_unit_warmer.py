@@ -0,0 +1,143 @@
+import json
+import time
+import pytest
+from unittest.mock import patch
+from app import create_app
+from app.warmer import QueryStats, RESULTS, SUGGESTIONS, acquire_lease, refresh_key, refresh_popular
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(testing=True)
+    app.config["DATABASE_PATH"] = str(tmp_path / "warmer.db")
+    app.config["QUERY_STATS_ENABLED"] = True
+    with app.app_context():
+        from app.db_utils import db_connection
+        with db_connection() as conn:
+            conn.execute("CREATE TABLE cached_responses (query TEXT PRIMARY KEY, response TEXT)")
+            conn.commit()
+    return app
+
+
+def _cache(app, key, payload, age):
+    entry = {"fetched_at": time.time() - age, "data": payload}
+    from app.db_utils import db_connection
+    with app.app_context(), db_connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO cached_responses VALUES (?, ?)", (key, json.dumps(entry)))
+        conn.commit()
+
+
+# ---------- query stats ----------
+def test_query_stats_buffers_until_flush(app):
+    stats = QueryStats(flush_every=100)
+    with app.app_context():
+        stats.record(RESULTS, "egg,milk")
+        stats.record(RESULTS, "egg,milk")
+        stats.record(RESULTS, "rice")
+        assert stats.top(RESULTS, 10) == []
+
+        stats.flush()
+        assert stats.top(RESULTS, 10) == ["egg,milk", "rice"]
+        assert stats.top(SUGGESTIONS, 10) == []
+
+def test_query_stats_flushes_after_batch_size(app):
+    stats = QueryStats(flush_every=3)
+    with app.app_context():
+        for _ in range(3):
+            stats.record(SUGGESTIONS, "tom")
+        assert stats.top(SUGGESTIONS, 10) == ["tom"]
+
+def test_results_route_records_queries(app):
+    client = app.test_client()
+    with patch("app.routes.get_processed_recipes", return_value=[]):
+        client.get("/results?ingredients=Egg, milk")
+    with app.app_context():
+        app.query_stats.flush()
+        assert app.query_stats.top(RESULTS, 10) == ["egg,milk"]
+
+def test_page_cache_hits_are_counted(app):
+    client = app.test_client()
+    recipes = [{"id": 1, "name": "Omelette", "image": None, "matches": ["egg"], "missing_count": 0}]
+    with patch("app.routes.get_processed_recipes", return_value=recipes) as process:
+        for _ in range(3):
+            client.get("/results?ingredients=egg,milk")
+    assert process.call_count == 1
+    with app.app_context():
+        app.query_stats.flush()
+        from app.db_utils import db_connection
+        with db_connection() as conn:
+            row = conn.execute("SELECT hits FROM query_stats WHERE namespace = ? AND key = ?", (RESULTS, "egg,milk")).fetchone()
+    assert row["hits"] == 3
+
+
+# ---------- refresh ----------
+def test_refresh_key_skips_fresh_entries(app):
+    _cache(app, "egg,milk", [{"id": 1}], age=10)
+    with app.app_context(), patch("app.api_client.fetch_and_cache_recipes") as fetch:
+        assert refresh_key(RESULTS, "egg,milk", app.config) is False
+    fetch.assert_not_called()
+
+def test_refresh_key_refreshes_entries_close_to_expiry(app):
+    app.config["RESULTS_CACHE_TTL"] = 100
+    _cache(app, "egg,milk", [{"id": 1}], age=90)
+    with app.app_context(), patch("app.api_client.fetch_and_cache_recipes") as fetch:
+        assert refresh_key(RESULTS, "egg,milk", app.config) is True
+    assert fetch.call_args.args[0] == "egg,milk"
+    assert fetch.call_args.kwargs["priority"] == "background"
+
+def test_refresh_key_uses_suggestion_cache_key(app):
+    _cache(app, "ingredient_suggestions:tom", [{"name": "tomato"}], age=10)
+    with app.app_context(), patch("app.api_client.fetch_and_cache_ingredient_suggestions") as fetch:
+        assert refresh_key(SUGGESTIONS, "tom", app.config) is False
+        assert refresh_key(SUGGESTIONS, "tom", app.config, force=True) is True
+    assert fetch.call_args.args[0] == "tom"
+
+def test_refresh_popular_stops_when_quota_runs_out(app):
+    from app.quota import QuotaExceeded
+    with app.app_context():
+        for key in ("egg", "rice", "milk"):
+            app.query_stats.record(RESULTS, key)
+        with patch("app.api_client.fetch_and_cache_recipes", side_effect=[None, QuotaExceeded("budget")]) as fetch:
+            assert refresh_popular(app) == 1
+    assert fetch.call_count == 2
+
+def test_refresh_popular_skips_keys_upstream_rejects(app):
+    from app.upstream import UpstreamError
+    with app.app_context():
+        for key in ("egg", "rice", "milk"):
+            app.query_stats.record(RESULTS, key)
+        with patch("app.api_client.fetch_and_cache_recipes",
+                   side_effect=[UpstreamError("bad request", 400), None, None]) as fetch:
+            assert refresh_popular(app) == 2
+        assert fetch.call_count == 3
+
+        # the failure is memoized, so the next pass leaves the key alone until it expires
+        failed = fetch.call_args_list[0].args[0]
+        with patch("app.api_client.fetch_and_cache_recipes") as fetch:
+            assert refresh_key(RESULTS, failed, app.config) is False
+        fetch.assert_not_called()
+
+def test_refresh_popular_stops_when_upstream_reports_quota_spent(app):
+    from app.upstream import UpstreamError
+    with app.app_context():
+        for key in ("egg", "rice"):
+            app.query_stats.record(RESULTS, key)
+        with patch("app.api_client.fetch_and_cache_recipes", side_effect=UpstreamError("quota", 402)) as fetch:
+            assert refresh_popular(app) == 0
+    assert fetch.call_count == 1
+
+def test_lease_is_taken_by_one_worker(app):
+    with app.app_context():
+        assert acquire_lease("cache-refresh", 60) is True
+        assert acquire_lease("cache-refresh", 60) is False
+
+
+# ---------- CLI ----------
+def test_warm_cache_cli_replays_pantry_file(app, tmp_path):
+    pantry = tmp_path / "pantry.txt"
+    pantry.write_text("Egg, milk\n\nrice\n")
+    runner = app.test_cli_runner()
+    with patch("app.api_client.fetch_and_cache_recipes") as fetch:
+        result = runner.invoke(args=["warm-cache", "--file", str(pantry)])
+    assert "Warmed 2 cache entries." in result.output
+    assert [c.args[0] for c in fetch.call_args_list] == ["egg,milk", "rice"]